@@ -0,0 +1,18 @@
+# Generated by Django 4.2.17 on 2026-10-19 05:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_auditlog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organization',
+            name='timezone',
+            field=models.CharField(default='UTC', max_length=64),
+        ),
+    ]
@@ -1,3 +1,7 @@
+import zoneinfo
+
+from django.utils import timezone
+
 from accounts.models import UserOrganization, AuditLog
 
 
@@ -38,6 +42,16 @@ def resolve_org(request):
     return org, org_role
 
 
+def get_org_timezone(org):
+    """The organization's timezone, falling back to settings.TIME_ZONE."""
+    if org and org.timezone:
+        try:
+            return zoneinfo.ZoneInfo(org.timezone)
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            pass
+    return timezone.get_default_timezone()
+
+
 def log_audit(request, action, instance, changes=None):
     """Log an action to the audit trail."""
     org, _ = resolve_org(request)
@@ -98,3 +112,20 @@ class OrgQuerysetMixin:
     def perform_destroy(self, instance):
         log_audit(self.request, 'delete', instance)
         super().perform_destroy(instance)
+
+
+class OrgTimezoneMixin:
+    """
+    Mixin for views that activates the current organization's timezone for
+    the request, so date windows, filters and time buckets follow the org's
+    local days.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        org, _ = resolve_org(request)
+        timezone.activate(get_org_timezone(org))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        timezone.deactivate()
+        return super().finalize_response(request, response, *args, **kwargs)
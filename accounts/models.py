@@ -8,6 +8,8 @@ class Organization(models.Model):
     slug = models.SlugField(max_length=100, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # IANA name; analytics windows and time buckets follow the org's local days
+    timezone = models.CharField(max_length=64, default='UTC')
 
     # Shopify credentials per org
     shopify_store = models.CharField(max_length=255, blank=True, default='')
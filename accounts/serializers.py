@@ -1,3 +1,5 @@
+import zoneinfo
+
 from django.contrib.auth.models import User, Group
 from rest_framework import serializers
 from .models import Organization, UserOrganization
@@ -78,10 +80,18 @@ class UpdateUserSerializer(serializers.Serializer):
 
 
 class CreateOrgSerializer(serializers.ModelSerializer):
+    def validate_timezone(self, value):
+        try:
+            zoneinfo.ZoneInfo(value)
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            raise serializers.ValidationError("Invalid timezone")
+        return value
+
     class Meta:
         model = Organization
-        fields = ('name', 'slug', 'shopify_store', 'shopify_access_token', 'shopify_webhook_secret')
+        fields = ('name', 'slug', 'timezone', 'shopify_store', 'shopify_access_token', 'shopify_webhook_secret')
         extra_kwargs = {
+            'timezone': {'required': False},
             'shopify_store': {'required': False},
             'shopify_access_token': {'required': False},
             'shopify_webhook_secret': {'required': False},
@@ -8,6 +8,7 @@ from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
 from .models import Organization, UserOrganization, AuditLog
 from .mixins import resolve_org
+from stash_pro.db_router import ReplicaReadMixin
 from .permissions import IsOwnerGroup
 from .serializers import (
     get_user_role, get_user_orgs,
@@ -257,7 +258,7 @@ class OrganizationListCreateView(APIView):
         return Response(OrgSerializer(org).data, status=status.HTTP_201_CREATED)
 
 
-class AuditLogView(APIView):
+class AuditLogView(ReplicaReadMixin, APIView):
     """View audit logs for the current organization."""
     permission_classes = [IsAuthenticated]
 
@@ -1,3 +1,16 @@
 from django.contrib import admin
+from .models import MonthlySnapshot, ReportJob
 
-# Register your models here.
+
+@admin.register(MonthlySnapshot)
+class MonthlySnapshotAdmin(admin.ModelAdmin):
+    list_display = ("organization", "month", "revenue", "cost_of_goods_sold", "expenses", "is_stale", "closed_at")
+    list_filter = ("organization", "is_stale")
+    date_hierarchy = "month"
+
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "organization", "kind", "status", "attempts", "created_at", "finished_at")
+    list_filter = ("kind", "status")
+    readonly_fields = ("params_hash", "result", "error")
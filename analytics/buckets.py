@@ -0,0 +1,91 @@
+"""
+Time buckets for sales and analytics series.
+
+Truncation happens in the database, in the current timezone (views activate
+the organization's timezone through OrgTimezoneMixin), and series are
+zero-filled here so a response carries one point per bucket at the
+requested granularity.
+"""
+import datetime
+
+from django.db.models import DateField
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+GRANULARITIES = ['day', 'week', 'month', 'quarter', 'year']
+
+
+def parse_granularity(value, default='day'):
+    """Validate a granularity query param; raises ValueError when unknown."""
+    if not value:
+        return default
+    if value not in GRANULARITIES:
+        raise ValueError(f"Invalid granularity. Valid options are: {', '.join(GRANULARITIES)}")
+    return value
+
+
+def bucket(field, granularity, is_date=False):
+    """
+    Expression truncating a field to the first day of its bucket, as a date.
+    Datetime fields are truncated in the current timezone.
+    """
+    tzinfo = None if is_date else timezone.get_current_timezone()
+    return Trunc(field, granularity, output_field=DateField(), tzinfo=tzinfo)
+
+
+def bucket_start(value, granularity):
+    """First day of the bucket containing a date (weeks start on Monday)."""
+    if isinstance(value, datetime.datetime):
+        value = timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    if granularity == 'week':
+        return value - datetime.timedelta(days=value.weekday())
+    if granularity == 'month':
+        return value.replace(day=1)
+    if granularity == 'quarter':
+        return value.replace(month=(value.month - 1) // 3 * 3 + 1, day=1)
+    if granularity == 'year':
+        return value.replace(month=1, day=1)
+    return value
+
+
+def next_bucket(start, granularity):
+    if granularity == 'day':
+        return start + datetime.timedelta(days=1)
+    if granularity == 'week':
+        return start + datetime.timedelta(days=7)
+    months = {'month': 1, 'quarter': 3, 'year': 12}[granularity]
+    year, month = divmod(start.month - 1 + months, 12)
+    return start.replace(year=start.year + year, month=month + 1, day=1)
+
+
+def bucket_label(start, granularity):
+    """Human-readable bucket name: 2026-10-19, 2026-10, 2026-Q4 or 2026."""
+    if granularity == 'month':
+        return start.strftime('%Y-%m')
+    if granularity == 'quarter':
+        return f"{start.year}-Q{(start.month - 1) // 3 + 1}"
+    if granularity == 'year':
+        return str(start.year)
+    return start.strftime('%Y-%m-%d')
+
+
+def bucket_range(first, last, granularity):
+    """Bucket starts covering the dates first..last inclusive."""
+    current = bucket_start(first, granularity)
+    while current <= last:
+        yield current
+        current = next_bucket(current, granularity)
+
+
+def fill_series(rows_by_bucket, granularity, first=None, last=None):
+    """
+    Zero-fill a series. rows_by_bucket maps bucket start -> row; returns
+    (bucket start, row or None) pairs for every bucket between first and
+    last, which default to the earliest and latest buckets with data.
+    """
+    if first is None or last is None:
+        if not rows_by_bucket:
+            return []
+        first = first or min(rows_by_bucket)
+        last = last or max(rows_by_bucket)
+    return [(start, rows_by_bucket.get(start)) for start in bucket_range(first, last, granularity)]
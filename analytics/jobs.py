@@ -0,0 +1,123 @@
+"""
+DB-backed queue for analytics reports.
+
+submit_report queues a job (or returns the identical one already in flight),
+the run_report_jobs command claims queued jobs one at a time and stores the
+rendered result on the row for the status/result endpoints to serve.
+"""
+import hashlib
+import json
+import logging
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from accounts.mixins import get_org_timezone
+from stash_pro.db_router import use_replica
+from .models import ReportJob
+from .reports import run_report, validate_params
+
+logger = logging.getLogger(__name__)
+
+# Tries at queueing a report when a concurrent submit wins the in-flight slot
+SUBMIT_ATTEMPTS = 3
+# Runs of one job before a job that keeps killing its worker is failed
+MAX_ATTEMPTS = 3
+
+
+def params_hash(kind, params):
+    payload = json.dumps({'kind': kind, 'params': params}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def submit_report(org, user, kind, params):
+    """
+    Queue a report, or return the queued/running job for the same org, kind
+    and params. Returns (job, created); raises ValueError on bad params.
+    """
+    params = validate_params(kind, params)
+    digest = params_hash(kind, params)
+    in_flight = ReportJob.objects.filter(
+        organization=org, kind=kind, params_hash=digest, status__in=ReportJob.IN_FLIGHT,
+    )
+
+    for attempt in range(SUBMIT_ATTEMPTS):
+        job = in_flight.first()
+        if job:
+            return job, False
+        try:
+            with transaction.atomic():
+                job = ReportJob.objects.create(
+                    organization=org, requested_by=user, kind=kind, params=params, params_hash=digest,
+                )
+            return job, True
+        except IntegrityError:
+            # Another request queued the same report in the meantime: return
+            # it on the next pass, or queue again if it has already finished
+            if attempt == SUBMIT_ATTEMPTS - 1:
+                raise
+
+
+def claim_next_job(stale_after=None):
+    """
+    Lock and mark the oldest queued job as running; None when the queue is
+    empty. Running jobs older than stale_after (a worker died) are retried,
+    up to MAX_ATTEMPTS runs in all; after that they are marked failed.
+    """
+    ready = Q(status=ReportJob.Status.QUEUED)
+    if stale_after:
+        ready |= Q(status=ReportJob.Status.RUNNING, started_at__lt=timezone.now() - stale_after)
+
+    while True:
+        with transaction.atomic():
+            job = (
+                ReportJob.objects.select_for_update(skip_locked=True)
+                .filter(ready).order_by('created_at', 'id').first()
+            )
+            if not job:
+                return None
+            if job.status == ReportJob.Status.RUNNING and job.attempts >= MAX_ATTEMPTS:
+                logger.error("Report job %s stopped its worker %s times; giving up", job.pk, job.attempts)
+                job.status = ReportJob.Status.FAILED
+                job.error = f"The report did not finish after {job.attempts} attempts"
+                job.finished_at = timezone.now()
+                job.save(update_fields=['status', 'error', 'finished_at'])
+                continue
+            job.status = ReportJob.Status.RUNNING
+            job.started_at = timezone.now()
+            job.attempts += 1
+            job.save(update_fields=['status', 'started_at', 'attempts'])
+        return job
+
+
+def run_job(job):
+    """Compute a claimed job's report and store its result or error."""
+    try:
+        with timezone.override(get_org_timezone(job.organization)), use_replica(job.requested_by):
+            data = run_report(job.kind, job.organization, job.params)
+        # Store exactly what the API would have rendered
+        job.result = json.loads(json.dumps(data, cls=JSONEncoder))
+        job.status = ReportJob.Status.DONE
+        job.error = ''
+    except Exception as e:
+        logger.exception("Report job %s failed", job.pk)
+        job.status = ReportJob.Status.FAILED
+        job.error = str(e)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['result', 'status', 'error', 'finished_at'])
+    return job
+
+
+def run_pending_jobs(limit=None, stale_after=timedelta(minutes=30)):
+    """Drain the queue (up to limit jobs); returns the number of jobs run."""
+    count = 0
+    while limit is None or count < limit:
+        job = claim_next_job(stale_after)
+        if not job:
+            break
+        run_job(job)
+        count += 1
+    return count
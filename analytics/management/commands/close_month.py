@@ -0,0 +1,75 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import Organization
+from sales.models import Sale
+from expense.models import Expenses
+from inventory.models import Product
+from analytics.models import MonthlySnapshot
+from analytics.snapshots import close_month, current_month, month_start, next_month
+
+
+class Command(BaseCommand):
+    help = "Freeze monthly P&L snapshots for completed months."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--org', help='Organization slug (default: all organizations)')
+        parser.add_argument('--month', help='Month to close as YYYY-MM (default: last month)')
+        parser.add_argument(
+            '--backfill', action='store_true',
+            help='Close every completed month since the organization\'s first activity '
+                 'that has no snapshot yet, and refresh stale ones',
+        )
+
+    def handle(self, *args, **options):
+        orgs = Organization.objects.all()
+        if options['org']:
+            orgs = orgs.filter(slug=options['org'])
+            if not orgs.exists():
+                raise CommandError(f"Organization '{options['org']}' not found")
+
+        open_month = current_month()
+        if options['month']:
+            try:
+                month = datetime.datetime.strptime(options['month'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError('--month must be in YYYY-MM format')
+            if month >= open_month:
+                raise CommandError(f"{options['month']} is still open and cannot be closed")
+        else:
+            month = month_start(open_month - datetime.timedelta(days=1))
+
+        for org in orgs:
+            months = self._backfill_months(org, open_month) if options['backfill'] else [month]
+            for m in months:
+                snapshot = close_month(org, m)
+                self.stdout.write(
+                    f"{org.slug} {m:%Y-%m}: revenue={snapshot.revenue} "
+                    f"expenses={snapshot.expenses} sales={snapshot.sales_count}"
+                )
+
+        self.stdout.write(self.style.SUCCESS('Done'))
+
+    def _backfill_months(self, org, open_month):
+        first_dates = [
+            Sale.objects.filter(organization=org).order_by('sale_date').values_list('sale_date', flat=True).first(),
+            Expenses.objects.filter(organization=org).order_by('date').values_list('date', flat=True).first(),
+            Product.objects.filter(organization=org, bought_at__isnull=False)
+            .order_by('bought_at').values_list('bought_at', flat=True).first(),
+        ]
+        first_dates = [d for d in first_dates if d]
+        if not first_dates:
+            return []
+
+        fresh = set(
+            MonthlySnapshot.objects.filter(organization=org, is_stale=False)
+            .values_list('month', flat=True)
+        )
+        months = []
+        m = min(month_start(d) for d in first_dates)
+        while m < open_month:
+            if m not in fresh:
+                months.append(m)
+            m = next_month(m)
+        return months
@@ -0,0 +1,45 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from analytics.jobs import run_pending_jobs
+from analytics.snapshots import refresh_stale_snapshots
+
+# Stale snapshots recomputed between queue checks, so jobs are not held up
+SNAPSHOTS_PER_PASS = 50
+
+
+class Command(BaseCommand):
+    help = "Run queued analytics report jobs and recompute stale monthly snapshots."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit instead of polling')
+        parser.add_argument('--max-jobs', type=int, help='Exit after running this many jobs')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when there is nothing to do')
+        parser.add_argument(
+            '--stale-after', type=int, default=30,
+            help='Minutes after which a running job is considered abandoned and retried',
+        )
+
+    def handle(self, *args, **options):
+        stale_after = timedelta(minutes=options['stale_after'])
+        remaining = options['max_jobs']
+        total = refreshed = 0
+
+        while True:
+            ran = run_pending_jobs(limit=remaining, stale_after=stale_after)
+            total += ran
+            # Analytics reads skip stale snapshots; bring them back up to date
+            refreshed_now = refresh_stale_snapshots(limit=SNAPSHOTS_PER_PASS)
+            refreshed += refreshed_now
+            if remaining is not None:
+                remaining -= ran
+                if remaining <= 0:
+                    break
+            if options['once']:
+                break
+            if not ran and not refreshed_now:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'Ran {total} report job(s), refreshed {refreshed} snapshot(s)'))
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.17 on 2026-10-19 05:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('accounts', '0005_auditlog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cost_of_goods_sold', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('user_payouts', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('org_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('inventory_bought', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('expenses', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('expenses_by_type', models.JSONField(blank=True, default=dict)),
+                ('units_sold', models.PositiveIntegerField(default=0)),
+                ('sales_count', models.PositiveIntegerField(default=0)),
+                ('is_stale', models.BooleanField(default=False)),
+                ('closed_at', models.DateTimeField()),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_snapshots', to='accounts.organization')),
+            ],
+            options={
+                'ordering': ['month'],
+                'unique_together': {('organization', 'month')},
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.17 on 2026-10-19 05:57
+
+from django.db import migrations, models
+
+
+def mark_snapshots_stale(apps, schema_editor):
+    # Existing snapshots have no counts; read live until run_report_jobs recomputes them
+    MonthlySnapshot = apps.get_model('analytics', 'MonthlySnapshot')
+    MonthlySnapshot.objects.update(is_stale=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_reportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='monthlysnapshot',
+            name='expense_counts_by_type',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(mark_snapshots_stale, migrations.RunPython.noop),
+    ]
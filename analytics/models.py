@@ -1,3 +1,90 @@
+from django.contrib.auth.models import User
 from django.db import models
+from django.utils.translation import gettext_lazy as _
 
-# Create your models here.
+from accounts.models import Organization
+
+
+class MonthlySnapshot(models.Model):
+    """
+    Frozen P&L totals for one organization and one closed calendar month.
+
+    Rows are written by the close_month command and marked stale when a
+    back-dated sale, expense or product lands in the month, or a product
+    sold in it changes price. Analytics computes stale months live until
+    the run_report_jobs worker recomputes the row (refresh_stale_snapshots).
+    """
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='monthly_snapshots')
+    month = models.DateField()  # First day of the month
+
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cost_of_goods_sold = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    user_payouts = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    org_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    inventory_bought = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    expenses = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    expenses_by_type = models.JSONField(default=dict, blank=True)
+    expense_counts_by_type = models.JSONField(default=dict, blank=True)
+    units_sold = models.PositiveIntegerField(default=0)
+    sales_count = models.PositiveIntegerField(default=0)
+
+    is_stale = models.BooleanField(default=False)
+    closed_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('organization', 'month')
+        ordering = ['month']
+
+    def __str__(self):
+        return f"{self.organization} {self.month:%Y-%m}{' (stale)' if self.is_stale else ''}"
+
+
+class ReportJob(models.Model):
+    """
+    A queued analytics report. Submitted through the reports endpoints,
+    picked up by the run_report_jobs worker, and kept with its result so
+    clients can poll for it. Identical in-flight requests share one job.
+    """
+
+    class Kind(models.TextChoices):
+        OVERALL = "overall", _("Overall")
+        USERS = "users", _("Users")
+        PRODUCTS = "products", _("Products")
+
+    class Status(models.TextChoices):
+        QUEUED = "queued", _("Queued")
+        RUNNING = "running", _("Running")
+        DONE = "done", _("Done")
+        FAILED = "failed", _("Failed")
+
+    IN_FLIGHT = (Status.QUEUED, Status.RUNNING)
+
+    organization = models.ForeignKey(
+        Organization, on_delete=models.CASCADE, related_name='report_jobs', null=True, blank=True,
+    )
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='report_jobs')
+    kind = models.CharField(max_length=32, choices=Kind.choices)
+    params = models.JSONField(default=dict, blank=True)
+    params_hash = models.CharField(max_length=64, db_index=True)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.QUEUED, db_index=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    attempts = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            # Backstop for the dedupe in submit_report under concurrent submits
+            models.UniqueConstraint(
+                fields=['organization', 'kind', 'params_hash'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='unique_in_flight_report_job',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} report #{self.pk} ({self.status})"
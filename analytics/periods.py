@@ -0,0 +1,159 @@
+"""
+Date windows shared by the analytics endpoints and SaleViewSet.daily_sales.
+
+A window is a half-open [start, stop) pair of aware datetimes; (None, None)
+means all time.
+"""
+import calendar
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.db.models import Q, Case, When, Value, CharField
+from django.utils.timezone import now, make_aware, localtime
+
+VALID_DURATIONS = ['current_month', 'last_month', 'current_year']
+COMPARE_MODES = ['previous_period', 'previous_year']
+
+
+def parse_custom_date(date_str):
+    """Parse a date string in YYYY-MM-DD format"""
+    try:
+        parsed_date = datetime.strptime(date_str, "%Y-%m-%d")
+        return make_aware(parsed_date)
+    except (ValueError, TypeError):
+        return None
+
+
+def get_date_range(duration):
+    """Get the [start, stop) window for a preset duration."""
+    current_date = now()
+    month_start = make_aware(datetime(current_date.year, current_date.month, 1))
+
+    if duration == "last_month":
+        start_date = (month_start - timedelta(days=1)).replace(day=1)
+        stop_date = month_start
+    elif duration == "current_year":
+        # Current year from January 1st to current date
+        start_date = make_aware(datetime(current_date.year, 1, 1))
+        stop_date = current_date
+    else:  # "current_month" (default)
+        # Current month from 1st to current date
+        start_date = month_start
+        stop_date = current_date
+
+    return start_date, stop_date
+
+
+def resolve_window(query_params):
+    """
+    Resolve start_date/end_date or duration query params into
+    (duration, start, stop). Custom dates take priority; an invalid or
+    missing duration means all time. Raises ValueError when start_date is
+    after end_date.
+    """
+    custom_start = parse_custom_date(query_params.get('start_date'))
+    custom_end = parse_custom_date(query_params.get('end_date'))
+    duration = query_params.get('duration')
+
+    if custom_start and custom_end:
+        if custom_start > custom_end:
+            raise ValueError("start_date must be before or equal to end_date")
+        # Include the whole end day
+        return "custom", custom_start, custom_end + timedelta(days=1)
+
+    if duration in VALID_DURATIONS:
+        start, stop = get_date_range(duration)
+        return duration, start, stop
+
+    return "all", None, None
+
+
+def display_end(stop):
+    """Last instant inside the window, for YYYY-MM-DD display."""
+    return stop - timedelta(microseconds=1) if stop else None
+
+
+def shift_months(value, months):
+    """Move an aware datetime by whole months, clamping the day."""
+    local = localtime(value)
+    month_index = local.year * 12 + local.month - 1 + months
+    year, month = divmod(month_index, 12)
+    day = min(local.day, calendar.monthrange(year, month + 1)[1])
+    return local.replace(year=year, month=month + 1, day=day)
+
+
+def _is_month_start(value):
+    local = localtime(value)
+    return local.day == 1 and local.time() == datetime.min.time()
+
+
+def comparison_window(duration, start, stop, mode):
+    """
+    The window to compare [start, stop) against.
+
+    previous_year shifts the window back twelve months. previous_period
+    steps back one calendar unit for the presets (current_month and
+    last_month one month, current_year one year, so to-date windows compare
+    at the same point), by the number of months spanned for custom ranges
+    made of whole months, and by its own length otherwise.
+    """
+    if mode == 'previous_year' or duration == 'current_year':
+        return shift_months(start, -12), shift_months(stop, -12)
+
+    if duration in ('current_month', 'last_month'):
+        return shift_months(start, -1), shift_months(stop, -1)
+
+    if _is_month_start(start) and _is_month_start(stop):
+        start_local, stop_local = localtime(start), localtime(stop)
+        months = (stop_local.year - start_local.year) * 12 + stop_local.month - start_local.month
+        return shift_months(start, -months), shift_months(stop, -months)
+
+    length = stop - start
+    return start - length, start
+
+
+def window_q(field, start, stop):
+    """Filter for a datetime field inside [start, stop); open ends are unbounded."""
+    q = Q()
+    if start:
+        q &= Q(**{f'{field}__gte': start})
+    if stop:
+        q &= Q(**{f'{field}__lt': stop})
+    return q
+
+
+def period_case(conditions):
+    """
+    CASE expression labelling each row with the first window it falls in,
+    so one grouped query can aggregate several periods side by side.
+    conditions maps label -> Q.
+    """
+    if len(conditions) == 1:
+        label, = conditions
+        return Value(label, output_field=CharField())
+    return Case(
+        *[When(q, then=Value(label)) for label, q in conditions.items()],
+        output_field=CharField(),
+    )
+
+
+def any_of(conditions):
+    """Filter matching rows in any of the labelled windows."""
+    combined = Q()
+    for q in conditions.values():
+        combined |= q
+    return combined
+
+
+def deltas(current, previous, fields):
+    """Absolute and percentage change per field; percent is None when previous is zero."""
+    result = {}
+    for field in fields:
+        cur = Decimal(str(current.get(field) or 0))
+        prev = Decimal(str(previous.get(field) or 0))
+        change = cur - prev
+        result[field] = {
+            'change': float(change),
+            'percent': float(change / prev * 100) if prev else None,
+        }
+    return result
@@ -0,0 +1,361 @@
+"""
+Report computations behind the analytics endpoints.
+
+Each report takes an organization and its query params and returns the
+response payload, so the views can run it inline and the report job worker
+(run_report_jobs) can run it in the background. Bad params raise ValueError
+from validate_params before anything is computed or queued.
+"""
+from datetime import date, datetime, time, timedelta
+
+from django.db.models import Sum, F, Count, Q
+from django.utils.timezone import now, make_aware
+
+from accounts.models import UserOrganization
+from sales.models import Sale
+from inventory.models import Product, Lot
+from .buckets import parse_granularity, bucket, bucket_label, fill_series
+from .periods import COMPARE_MODES, resolve_window, display_end, comparison_window, deltas
+from .snapshots import pnl_totals_by_period
+
+COMPARED_METRICS = ['inventory_bought', 'sales', 'cost_of_goods_sold', 'profit', 'expenses']
+
+# Query params each report reads; anything else is ignored (and not hashed)
+REPORT_PARAMS = {
+    'overall': ('start_date', 'end_date', 'duration', 'compare'),
+    'users': ('start_date', 'end_date', 'granularity'),
+    'products': ('granularity',),
+}
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def _date_range(params):
+    """start_date/end_date params as dates; raises ValueError for a bad date."""
+    dates = []
+    for key in ('start_date', 'end_date'):
+        value = _parse_date(params.get(key))
+        if params.get(key) and value is None:
+            raise ValueError(f"Invalid {key}. Use YYYY-MM-DD")
+        dates.append(value)
+    return dates
+
+
+def _overall_options(params):
+    duration, start_date, stop_date = resolve_window(params)
+    compare = params.get('compare')
+    if compare:
+        if compare not in COMPARE_MODES:
+            raise ValueError(f"Invalid compare mode. Valid options are: {', '.join(COMPARE_MODES)}")
+        if not start_date:
+            raise ValueError("compare requires a date range or duration")
+    return duration, start_date, stop_date, compare
+
+
+def clean_params(kind, params):
+    """The params a report reads, as a plain dict of strings."""
+    if kind not in REPORT_PARAMS:
+        raise ValueError(f"Invalid report kind. Valid options are: {', '.join(REPORT_PARAMS)}")
+    return {key: str(params[key]) for key in REPORT_PARAMS[kind] if params.get(key) not in (None, '')}
+
+
+def validate_params(kind, params):
+    """Raise ValueError when a report would reject its params."""
+    params = clean_params(kind, params)
+    if kind == 'overall':
+        _overall_options(params)
+    else:
+        parse_granularity(params.get('granularity'), default='month')
+        if kind == 'users':
+            _date_range(params)
+    return params
+
+
+def summarize(totals):
+    """Response fields derived from one window's P&L totals."""
+    cogs = totals['cost_of_goods_sold']
+    profit = totals['revenue'] - cogs
+    return {
+        "inventory_bought": totals['inventory_bought'],
+        "sales": totals['revenue'],
+        "cost_of_goods_sold": cogs,
+        "profit": profit,
+        "profit_margin": (profit / cogs if cogs else 0) * 100,
+        "expenses": totals['expenses'],
+    }
+
+
+def overall_report(org, params):
+    """P&L totals, unsold inventory and top products; org None means all orgs."""
+    duration, start_date, stop_date, compare = _overall_options(params)
+    end_date = display_end(stop_date)
+
+    sales_queryset = Sale.objects.all()
+    if org:
+        sales_queryset = sales_queryset.filter(organization=org)
+    if start_date and stop_date:
+        sales_queryset = sales_queryset.filter(
+            sale_date__gte=start_date,
+            sale_date__lt=stop_date
+        )
+
+    # 1, 2, 4. Inventory bought, sales, COGS and expenses: closed months
+    # come from monthly snapshots, the rest from live aggregates. Both
+    # windows of a comparison share the same grouped queries.
+    windows = {'current': (start_date, stop_date)}
+    if compare:
+        windows['previous'] = comparison_window(duration, start_date, stop_date, compare)
+    period_totals = pnl_totals_by_period(org, windows)
+
+    # 5. Profit
+    current = summarize(period_totals['current'])
+
+    # 3. Total Unsold Inventory (this doesn't change based on duration)
+    unsold_qs = Product.objects.filter(available_quantity__gt=0)
+    if org:
+        unsold_qs = unsold_qs.filter(organization=org)
+    total_unsold_inventory = unsold_qs.aggregate(
+        total_value=Sum(F('available_quantity') * F('price'))
+    )['total_value'] or 0
+
+    # 6. Top products by revenue (within date range)
+    top_products_qs = sales_queryset.values(
+        'product__id', 'product__name', 'product__price'
+    ).annotate(
+        revenue=Sum(F('quantity_sold') * F('sale_price')),
+        cogs=Sum(F('quantity_sold') * F('product__price')),
+        units_sold=Sum('quantity_sold'),
+    ).order_by('-revenue')[:5]
+
+    top_products = [
+        {
+            'id': p['product__id'],
+            'name': p['product__name'],
+            'revenue': float(p['revenue'] or 0),
+            'cogs': float(p['cogs'] or 0),
+            'profit': float((p['revenue'] or 0) - (p['cogs'] or 0)),
+            'units_sold': p['units_sold'],
+        }
+        for p in top_products_qs
+    ]
+
+    # Prepare Response Data
+    data = {
+        "duration": duration,
+        "start_date": start_date.strftime("%Y-%m-%d") if start_date else None,
+        "end_date": end_date.strftime("%Y-%m-%d") if end_date else None,
+        **current,
+        "total_unsold_inventory": total_unsold_inventory,
+        "top_products": top_products,
+    }
+
+    if compare:
+        prev_start, prev_stop = windows['previous']
+        previous = summarize(period_totals['previous'])
+        data["comparison"] = {
+            "mode": compare,
+            "start_date": prev_start.strftime("%Y-%m-%d"),
+            "end_date": display_end(prev_stop).strftime("%Y-%m-%d"),
+            **previous,
+            "deltas": deltas(current, previous, COMPARED_METRICS),
+        }
+
+    return data
+
+
+def _user_bucket_entry(start, row, granularity):
+    return {
+        'period': bucket_label(start, granularity),
+        'start': start.strftime('%Y-%m-%d'),
+        'revenue': float(row['revenue'] or 0) if row else 0.0,
+        'payout': float(row['payout'] or 0) if row else 0.0,
+        'org_share': float(row['org_share'] or 0) if row else 0.0,
+        'units': (row['units'] or 0) if row else 0,
+        # Kept for clients written against the monthly-only response: the
+        # month the bucket starts in
+        'month': start.strftime('%Y-%m'),
+    }
+
+
+def user_report(org, params):
+    """Per-user analytics: who bought how much, monthly, payouts."""
+    granularity = parse_granularity(params.get('granularity'), default='month')
+    start_date, end_date = _date_range(params)
+
+    # Get all org members
+    memberships = UserOrganization.objects.filter(organization=org).select_related('user')
+
+    users_data = []
+    for m in memberships:
+        user = m.user
+
+        # Lots funded by this user
+        lots_qs = Lot.objects.filter(organization=org, funded_by='user', funded_by_user=user)
+        sales_qs = Sale.objects.filter(organization=org, funded_by_user=user, is_refunded=False)
+
+        if start_date:
+            lots_qs = lots_qs.filter(bought_on__gte=start_date)
+            sales_qs = sales_qs.filter(sale_date__date__gte=start_date)
+        if end_date:
+            lots_qs = lots_qs.filter(bought_on__lte=end_date)
+            sales_qs = sales_qs.filter(sale_date__date__lte=end_date)
+
+        lots_total = lots_qs.aggregate(total=Sum('total_price'))['total'] or 0
+        lots_count = lots_qs.count()
+        products_bought = Product.objects.filter(lot__in=lots_qs).count()
+
+        sales_agg = sales_qs.aggregate(
+            total_revenue=Sum(F('quantity_sold') * F('sale_price')),
+            total_payout=Sum('user_payout'),
+            total_org_revenue=Sum('org_revenue'),
+            units_sold=Sum('quantity_sold'),
+        )
+
+        # Breakdown per bucket (monthly by default), zero-filled
+        monthly = sales_qs.annotate(
+            bucket=bucket('sale_date', granularity)
+        ).values('bucket').annotate(
+            revenue=Sum(F('quantity_sold') * F('sale_price')),
+            payout=Sum('user_payout'),
+            org_share=Sum('org_revenue'),
+            units=Sum('quantity_sold'),
+        ).order_by('bucket')
+        series = fill_series(
+            {row['bucket']: row for row in monthly}, granularity,
+            start_date, end_date,
+        )
+
+        users_data.append({
+            'user_id': user.id,
+            'username': user.username,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'role': m.role,
+            'investment': {
+                'lots_count': lots_count,
+                'lots_total': float(lots_total),
+                'products_bought': products_bought,
+            },
+            'sales': {
+                'total_revenue': float(sales_agg['total_revenue'] or 0),
+                'total_payout': float(sales_agg['total_payout'] or 0),
+                'total_org_revenue': float(sales_agg['total_org_revenue'] or 0),
+                'units_sold': sales_agg['units_sold'] or 0,
+            },
+            'monthly': [_user_bucket_entry(start, row, granularity) for start, row in series],
+        })
+
+    return users_data
+
+
+def product_report(org, params):
+    """Product analytics: top sellers, aging, categories, listed/unlisted."""
+    granularity = parse_granularity(params.get('granularity'), default='month')
+
+    products = Product.objects.filter(organization=org)
+    sales = Sale.objects.filter(organization=org, is_refunded=False)
+
+    # Category breakdown
+    by_category = products.values('category').annotate(
+        total=Count('id'),
+        available=Count('id', filter=Q(available_quantity__gt=0)),
+        sold=Count('id', filter=Q(available_quantity=0)),
+        total_value=Sum(F('available_quantity') * F('price')),
+    ).order_by('-total')
+
+    # Sub-category breakdown
+    by_subcategory = products.values('sub_category').annotate(
+        total=Count('id'),
+        available=Count('id', filter=Q(available_quantity__gt=0)),
+        sold=Count('id', filter=Q(available_quantity=0)),
+    ).order_by('-total')
+
+    # Top selling products (by units)
+    top_sellers = sales.values(
+        'product__id', 'product__name', 'product__category', 'product__price'
+    ).annotate(
+        units_sold=Sum('quantity_sold'),
+        revenue=Sum(F('quantity_sold') * F('sale_price')),
+    ).order_by('-units_sold')[:10]
+
+    # Aging inventory: available products grouped by age
+    today = now().date()
+    aging = {
+        '0_30': products.filter(available_quantity__gt=0, created_at__date__gte=today - timedelta(days=30)).count(),
+        '31_60': products.filter(available_quantity__gt=0, created_at__date__gte=today - timedelta(days=60), created_at__date__lt=today - timedelta(days=30)).count(),
+        '61_90': products.filter(available_quantity__gt=0, created_at__date__gte=today - timedelta(days=90), created_at__date__lt=today - timedelta(days=60)).count(),
+        '90_plus': products.filter(available_quantity__gt=0, created_at__date__lt=today - timedelta(days=90)).count(),
+    }
+
+    # Slow movers: available products older than 60 days with no sales
+    slow_movers = products.filter(
+        available_quantity__gt=0,
+        created_at__date__lt=today - timedelta(days=60),
+    ).exclude(
+        sales__isnull=False, sales__is_refunded=False
+    ).values('id', 'name', 'price', 'category', 'created_at')[:20]
+
+    # Summary
+    total_products = products.count()
+    available = products.filter(available_quantity__gt=0).count()
+    sold = products.filter(available_quantity=0).count()
+    total_inventory_value = products.filter(available_quantity__gt=0).aggregate(
+        val=Sum(F('available_quantity') * F('price'))
+    )['val'] or 0
+
+    # Sales trend by category (monthly by default), zero-filled per category
+    trend_rows = sales.annotate(
+        month=bucket('sale_date', granularity)
+    ).values('month', 'product__category').annotate(
+        units=Sum('quantity_sold'),
+        revenue=Sum(F('quantity_sold') * F('sale_price')),
+    ).order_by('month')
+    by_bucket = {}
+    for row in trend_rows:
+        by_bucket.setdefault(row['month'], {})[row['product__category']] = row
+    categories = sorted({c for rows in by_bucket.values() for c in rows}, key=lambda c: c or '')
+    monthly_by_category = [
+        {
+            # Local midnight the bucket starts, as TruncMonth used to return
+            'month': make_aware(datetime.combine(start, time.min)),
+            'period': bucket_label(start, granularity),
+            'product__category': category,
+            'units': rows[category]['units'] if rows and category in rows else 0,
+            'revenue': rows[category]['revenue'] if rows and category in rows else 0,
+        }
+        for start, rows in fill_series(by_bucket, granularity)
+        for category in categories
+    ]
+
+    return {
+        'summary': {
+            'total_products': total_products,
+            'available': available,
+            'sold': sold,
+            'inventory_value': float(total_inventory_value),
+        },
+        'by_category': list(by_category),
+        'by_subcategory': list(by_subcategory),
+        'top_sellers': list(top_sellers),
+        'aging': aging,
+        'slow_movers': list(slow_movers),
+        'granularity': granularity,
+        'monthly_by_category': monthly_by_category,
+    }
+
+
+REPORTS = {
+    'overall': overall_report,
+    'users': user_report,
+    'products': product_report,
+}
+
+
+def run_report(kind, org, params):
+    """Run a report by kind; params are validated first."""
+    return REPORTS[kind](org, validate_params(kind, params))
@@ -0,0 +1,67 @@
+"""
+Keep monthly snapshots honest: any write that changes the P&L of a closed
+month marks that month's snapshot stale.
+
+Only the fields that feed the snapshot are tracked, so routine saves such
+as shipping status updates or available_quantity changes never touch it. A
+product price change also invalidates the months of that product's sales,
+whose cost of goods sold it feeds.
+Bulk operations (bulk_create, queryset.update) bypass these signals and
+must call invalidate_months themselves.
+"""
+from django.db.models.signals import post_init, post_save, post_delete
+
+from sales.models import Sale
+from expense.models import Expenses
+from inventory.models import Product
+from .snapshots import invalidate_months, invalidate_product_sales
+
+# model -> (date field, fields that feed the snapshot)
+TRACKED_MODELS = {
+    Sale: ('sale_date', ('sale_date', 'quantity_sold', 'sale_price', 'product_id', 'user_payout', 'org_revenue')),
+    Expenses: ('date', ('date', 'amount', 'type')),
+    Product: ('bought_at', ('bought_at', 'stock', 'price')),
+}
+
+
+def _tracked_state(instance):
+    _, fields = TRACKED_MODELS[type(instance)]
+    deferred = instance.get_deferred_fields()
+    if any(field in deferred for field in fields):
+        return None
+    return tuple(getattr(instance, field) for field in fields)
+
+
+def remember_state(sender, instance, **kwargs):
+    instance._snapshot_state = _tracked_state(instance)
+
+
+def invalidate_on_save(sender, instance, created, **kwargs):
+    date_field, fields = TRACKED_MODELS[sender]
+    old_state = getattr(instance, '_snapshot_state', None)
+    new_state = _tracked_state(instance)
+    instance._snapshot_state = new_state
+
+    if not created and old_state is not None and old_state == new_state:
+        return
+
+    dates = [getattr(instance, date_field)]
+    if old_state is not None:
+        dates.append(old_state[fields.index(date_field)])
+    invalidate_months(instance.organization_id, dates)
+
+    # Sales cost the product's current price, in whatever month they fell
+    if sender is Product and old_state is not None and old_state[fields.index('price')] != instance.price:
+        invalidate_product_sales(instance.organization_id, [instance.pk])
+
+
+def invalidate_on_delete(sender, instance, **kwargs):
+    date_field, _ = TRACKED_MODELS[sender]
+    invalidate_months(instance.organization_id, [getattr(instance, date_field)])
+
+
+def connect():
+    for model in TRACKED_MODELS:
+        post_init.connect(remember_state, sender=model, dispatch_uid=f'snapshot_init_{model.__name__}')
+        post_save.connect(invalidate_on_save, sender=model, dispatch_uid=f'snapshot_save_{model.__name__}')
+        post_delete.connect(invalidate_on_delete, sender=model, dispatch_uid=f'snapshot_delete_{model.__name__}')
@@ -0,0 +1,392 @@
+"""
+Monthly P&L snapshots.
+
+Closed months never change, so long-range analytics read their totals from
+MonthlySnapshot and only run live aggregates for what is left over: the open
+month, partial months at the edges of the range, months nobody closed yet
+and stale months, until the run_report_jobs worker recomputes them.
+"""
+import datetime
+from decimal import Decimal
+
+from django.db.models import Sum, F, Count, Q
+from django.utils import timezone
+from django.utils.timezone import now, make_aware, localtime, is_aware
+
+from accounts.mixins import get_org_timezone
+from stash_pro.db_router import use_primary
+from sales.models import Sale
+from expense.models import Expenses
+from inventory.models import Product
+from .buckets import bucket
+from .models import MonthlySnapshot
+from .periods import window_q, period_case, any_of
+
+ZERO = Decimal('0')
+
+# Widest UTC offset in use; a datetime can fall in a neighbouring month in
+# some organization's local time when it is this close to a month boundary.
+MAX_UTC_OFFSET = datetime.timedelta(hours=14)
+
+TOTAL_FIELDS = (
+    'revenue', 'cost_of_goods_sold', 'user_payouts', 'org_revenue',
+    'inventory_bought', 'expenses', 'units_sold', 'sales_count',
+)
+
+
+# ---- Month helpers ----
+
+def month_start(value):
+    """First day of the month containing a date or datetime."""
+    if isinstance(value, datetime.datetime):
+        value = localtime(value).date() if is_aware(value) else value.date()
+    return value.replace(day=1)
+
+
+def next_month(month):
+    return (month.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+def month_floor(month):
+    """Aware datetime at midnight on the first of the month."""
+    return make_aware(datetime.datetime(month.year, month.month, 1))
+
+
+def current_month():
+    return month_start(now())
+
+
+def _month_ranges(months):
+    """Merge a collection of months into contiguous [first, stop) ranges."""
+    ranges = []
+    for month in sorted(months):
+        if ranges and ranges[-1][1] == month:
+            ranges[-1][1] = next_month(month)
+        else:
+            ranges.append([month, next_month(month)])
+    return ranges
+
+
+# ---- Live aggregation ----
+
+def _date_q(field, start, stop):
+    """Same window as _datetime_q for a DateField: a day counts from its midnight."""
+    q = Q()
+    if start:
+        start_day = localtime(start).date()
+        if localtime(start).time() != datetime.time.min:
+            start_day += datetime.timedelta(days=1)
+        q &= Q(**{f'{field}__gte': start_day})
+    if stop:
+        stop_local = localtime(stop)
+        if stop_local.time() == datetime.time.min:
+            q &= Q(**{f'{field}__lt': stop_local.date()})
+        else:
+            q &= Q(**{f'{field}__lte': stop_local.date()})
+    return q
+
+
+def _excluded_months_q(field, months, is_date=False):
+    q = Q()
+    for first, stop in _month_ranges(months):
+        if is_date:
+            q |= Q(**{f'{field}__gte': first, f'{field}__lt': stop})
+        else:
+            q |= Q(**{f'{field}__gte': month_floor(first), f'{field}__lt': month_floor(stop)})
+    return q
+
+
+def _zero_totals():
+    totals = {field: ZERO for field in TOTAL_FIELDS}
+    totals['units_sold'] = 0
+    totals['sales_count'] = 0
+    totals['expenses_by_type'] = {}
+    totals['expense_counts_by_type'] = {}
+    return totals
+
+
+def live_totals_by_period(org, windows):
+    """
+    Aggregate P&L totals straight from Sale, Expenses and Product for several
+    labelled windows at once.
+
+    windows maps label -> (start, stop, exclude_months). Each model is hit by
+    a single grouped query with the label as a CASE-bucketed column, so
+    comparing two periods costs the same number of queries as one.
+    """
+    sales_q, expenses_q, products_q = {}, {}, {}
+    for label, (start, stop, exclude_months) in windows.items():
+        sales_q[label] = window_q('sale_date', start, stop)
+        expenses_q[label] = _date_q('date', start, stop)
+        products_q[label] = window_q('bought_at', start, stop)
+        if exclude_months:
+            sales_q[label] &= ~_excluded_months_q('sale_date', exclude_months)
+            expenses_q[label] &= ~_excluded_months_q('date', exclude_months, is_date=True)
+            products_q[label] &= ~_excluded_months_q('bought_at', exclude_months)
+
+    sales_qs = Sale.objects.filter(any_of(sales_q))
+    expenses_qs = Expenses.objects.filter(any_of(expenses_q))
+    products_qs = Product.objects.filter(any_of(products_q))
+    if org:
+        sales_qs = sales_qs.filter(organization=org)
+        expenses_qs = expenses_qs.filter(organization=org)
+        products_qs = products_qs.filter(organization=org)
+
+    results = {label: _zero_totals() for label in windows}
+
+    sales_rows = sales_qs.annotate(period=period_case(sales_q)).values('period').annotate(
+        revenue=Sum(F('quantity_sold') * F('sale_price')),
+        cogs=Sum(F('quantity_sold') * F('product__price')),
+        user_payouts=Sum('user_payout'),
+        org_revenue=Sum('org_revenue'),
+        units_sold=Sum('quantity_sold'),
+        sales_count=Count('id'),
+    ).order_by()
+    for row in sales_rows:
+        totals = results[row['period']]
+        totals['revenue'] = row['revenue'] or ZERO
+        totals['cost_of_goods_sold'] = row['cogs'] or ZERO
+        totals['user_payouts'] = row['user_payouts'] or ZERO
+        totals['org_revenue'] = row['org_revenue'] or ZERO
+        totals['units_sold'] = row['units_sold'] or 0
+        totals['sales_count'] = row['sales_count'] or 0
+
+    expense_rows = expenses_qs.annotate(period=period_case(expenses_q)).values('period', 'type').annotate(
+        total=Sum('amount'),
+        count=Count('id'),
+    ).order_by()
+    for row in expense_rows:
+        totals = results[row['period']]
+        totals['expenses_by_type'][row['type']] = row['total'] or ZERO
+        totals['expense_counts_by_type'][row['type']] = row['count']
+        totals['expenses'] += row['total'] or ZERO
+
+    product_rows = products_qs.annotate(period=period_case(products_q)).values('period').annotate(
+        total=Sum(F('stock') * F('price')),
+    ).order_by()
+    for row in product_rows:
+        results[row['period']]['inventory_bought'] = row['total'] or ZERO
+
+    return results
+
+
+def live_totals(org, start=None, stop=None, exclude_months=()):
+    """
+    Aggregate P&L totals straight from Sale, Expenses and Product for
+    [start, stop), skipping any months in exclude_months.
+    """
+    return live_totals_by_period(org, {'current': (start, stop, exclude_months)})['current']
+
+
+def _add_totals(totals, other):
+    for field in TOTAL_FIELDS:
+        totals[field] += other[field]
+    for expense_type, amount in other['expenses_by_type'].items():
+        totals['expenses_by_type'][expense_type] = (
+            totals['expenses_by_type'].get(expense_type, ZERO) + Decimal(str(amount))
+        )
+    for expense_type, count in other['expense_counts_by_type'].items():
+        totals['expense_counts_by_type'][expense_type] = totals['expense_counts_by_type'].get(expense_type, 0) + count
+    return totals
+
+
+def _snapshot_totals(snapshot):
+    totals = {field: getattr(snapshot, field) for field in TOTAL_FIELDS}
+    totals['expenses_by_type'] = snapshot.expenses_by_type
+    totals['expense_counts_by_type'] = snapshot.expense_counts_by_type
+    return totals
+
+
+# ---- Closing and invalidation ----
+
+def close_month(org, month):
+    """
+    Compute and store the snapshot for a completed month. Month boundaries
+    are taken in the organization's timezone, and totals are read from the
+    primary so a lagging replica cannot freeze stale numbers.
+    """
+    with timezone.override(get_org_timezone(org)), use_primary():
+        return _close_month(org, month)
+
+
+def _close_month(org, month):
+    month = month_start(month)
+    if month >= current_month():
+        raise ValueError(f"{month:%Y-%m} is still open and cannot be closed")
+
+    totals = live_totals(org, month_floor(month), month_floor(next_month(month)))
+    defaults = {field: totals[field] for field in TOTAL_FIELDS}
+    defaults['expenses_by_type'] = {k: str(v) for k, v in totals['expenses_by_type'].items()}
+    defaults['expense_counts_by_type'] = totals['expense_counts_by_type']
+    defaults['is_stale'] = False
+    defaults['closed_at'] = now()
+
+    snapshot, _ = MonthlySnapshot.objects.update_or_create(
+        organization=org, month=month, defaults=defaults,
+    )
+    return snapshot
+
+
+def invalidate_months(org_id, values):
+    """
+    Mark the snapshots covering the given dates/datetimes as stale.
+    Writes into the open month never touch the table. Datetimes near a month
+    boundary invalidate both neighbouring months, whatever the org's timezone.
+    """
+    if not org_id:
+        return 0
+    months = set()
+    with timezone.override(datetime.timezone.utc):
+        # The month still open everywhere; earlier ones may be closed somewhere
+        open_month = month_start(now() + MAX_UTC_OFFSET)
+        for value in values:
+            if not value:
+                continue
+            if isinstance(value, datetime.datetime):
+                months.update(month_start(v) for v in (value - MAX_UTC_OFFSET, value, value + MAX_UTC_OFFSET))
+            else:
+                months.add(month_start(value))
+    months = {m for m in months if m < open_month}
+    if not months:
+        return 0
+    return MonthlySnapshot.objects.filter(
+        organization_id=org_id, month__in=months, is_stale=False,
+    ).update(is_stale=True)
+
+
+def invalidate_product_sales(org_id, product_ids):
+    """
+    Mark stale the months of the products' sales, whose cost of goods sold
+    follows the product's current price.
+    """
+    if not org_id or not product_ids:
+        return 0
+    dates = Sale.objects.filter(product_id__in=product_ids).values_list('sale_date', flat=True).distinct()
+    return invalidate_months(org_id, dates)
+
+
+def refresh_stale_snapshots(limit=None):
+    """
+    Recompute stale snapshots, oldest month first; returns how many. Run by
+    the run_report_jobs worker so reads never write.
+    """
+    stale = MonthlySnapshot.objects.filter(is_stale=True).select_related('organization').order_by('month', 'id')
+    if limit:
+        stale = stale[:limit]
+    count = 0
+    for snapshot in stale:
+        close_month(snapshot.organization, snapshot.month)
+        count += 1
+    return count
+
+
+# ---- Reading ----
+
+def _covered_months(start, stop):
+    """(first, stop) months of the closed months fully inside [start, stop)."""
+    first = None
+    if start:
+        first = month_start(start)
+        if month_floor(first) < start:
+            first = next_month(first)
+    # A month must end on or before stop, and only past months can be closed
+    last_stop = current_month()
+    if stop:
+        last_stop = min(last_stop, month_start(stop))
+    return first, last_stop
+
+
+def closed_snapshots_by_period(org, windows):
+    """
+    Fresh snapshots for every closed month fully inside each labelled
+    [start, stop) window, fetched in one query. Stale months are left out,
+    so callers aggregate them live; reads never recompute snapshots.
+    """
+    results = {label: [] for label in windows}
+    if not org:
+        return results
+
+    bounds = {label: _covered_months(start, stop) for label, (start, stop) in windows.items()}
+    months_q = Q()
+    for first, last_stop in bounds.values():
+        q = Q(month__lt=last_stop)
+        if first:
+            q &= Q(month__gte=first)
+        months_q |= q
+
+    for snapshot in MonthlySnapshot.objects.filter(months_q, organization=org, is_stale=False):
+        for label, (first, last_stop) in bounds.items():
+            if (not first or snapshot.month >= first) and snapshot.month < last_stop:
+                results[label].append(snapshot)
+    return results
+
+
+def pnl_totals_by_period(org, windows):
+    """
+    P&L totals for several labelled [start, stop) windows: closed months come
+    from snapshots, the rest from one grouped live aggregate per model.
+    """
+    snapshots = closed_snapshots_by_period(org, windows)
+    live_windows = {
+        label: (start, stop, [s.month for s in snapshots[label]])
+        for label, (start, stop) in windows.items()
+    }
+
+    results = live_totals_by_period(org, live_windows)
+    for label, label_snapshots in snapshots.items():
+        for snapshot in label_snapshots:
+            _add_totals(results[label], _snapshot_totals(snapshot))
+    return results
+
+
+def pnl_totals(org, start=None, stop=None):
+    """P&L totals for a single [start, stop) window."""
+    return pnl_totals_by_period(org, {'current': (start, stop)})['current']
+
+
+def expense_rollup(org, start=None, stop=None, by_month=False, by_vendor=False, expense_type=None):
+    """
+    Expense totals and counts per type for [start, stop), optionally also per
+    month and/or vendor, as {(month, vendor, type): {'total', 'count'}} with
+    month and vendor None when not grouped on.
+
+    Closed months come from snapshots and the rest from one grouped query.
+    Snapshots do not record vendors, so grouping by vendor is all live.
+    """
+    snapshots = []
+    if not by_vendor:
+        snapshots = closed_snapshots_by_period(org, {'current': (start, stop)})['current']
+
+    qs = Expenses.objects.filter(_date_q('date', start, stop))
+    if snapshots:
+        qs = qs.exclude(_excluded_months_q('date', [s.month for s in snapshots], is_date=True))
+    if org:
+        qs = qs.filter(organization=org)
+    if expense_type:
+        qs = qs.filter(type=expense_type)
+
+    group_fields = ['type']
+    if by_month:
+        qs = qs.annotate(month=bucket('date', 'month', is_date=True))
+        group_fields.append('month')
+    if by_vendor:
+        group_fields.append('vendor')
+
+    results = {}
+
+    def add(key, total, count):
+        entry = results.setdefault(key, {'total': ZERO, 'count': 0})
+        entry['total'] += total
+        entry['count'] += count
+
+    for row in qs.values(*group_fields).annotate(total=Sum('amount'), count=Count('id')).order_by():
+        add((row.get('month'), row.get('vendor'), row['type']), row['total'] or ZERO, row['count'])
+
+    for snapshot in snapshots:
+        for type_, amount in snapshot.expenses_by_type.items():
+            if expense_type and type_ != expense_type:
+                continue
+            count = snapshot.expense_counts_by_type.get(type_, 0)
+            add((snapshot.month if by_month else None, None, type_), Decimal(str(amount)), count)
+
+    return results
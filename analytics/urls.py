@@ -1,8 +1,14 @@
 from django.urls import path
-from .views import AnalyticsView, UserAnalyticsView, ProductAnalyticsView
+from .views import (
+    AnalyticsView, UserAnalyticsView, ProductAnalyticsView,
+    ReportJobListView, ReportJobDetailView, ReportJobResultView,
+)
 
 urlpatterns = [
     path('overall/', AnalyticsView.as_view(), name='analytics'),
     path('users/', UserAnalyticsView.as_view(), name='user_analytics'),
     path('products/', ProductAnalyticsView.as_view(), name='product_analytics'),
+    path('reports/', ReportJobListView.as_view(), name='report_jobs'),
+    path('reports/<int:pk>/', ReportJobDetailView.as_view(), name='report_job_detail'),
+    path('reports/<int:pk>/result/', ReportJobResultView.as_view(), name='report_job_result'),
 ]
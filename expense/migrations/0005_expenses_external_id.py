@@ -0,0 +1,22 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense', '0004_expenses_organization'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expenses',
+            name='external_id',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='expenses',
+            constraint=models.UniqueConstraint(fields=('organization', 'external_id'), name='expense_org_external_id'),
+        ),
+    ]
@@ -38,6 +38,8 @@ class Expenses(BaseModel):
         null=True, 
         blank=True
     )
+    # Key of the spreadsheet row this expense was imported from
+    external_id = models.CharField(max_length=64, null=True, blank=True)
 
     def __str__(self):
         if self.type == self.ExpenseType.SHIPPING and self.sale:
@@ -52,4 +54,7 @@ class Expenses(BaseModel):
     class Meta:
         verbose_name = "Expense"
         verbose_name_plural = "Expenses"
+        constraints = [
+            models.UniqueConstraint(fields=['organization', 'external_id'], name='expense_org_external_id'),
+        ]
 
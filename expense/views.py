@@ -1,18 +1,24 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Sum
 from .models import Expenses
 from .serializers import ExpensesSerializer
 from django_filters import rest_framework as filters
 from rest_framework.filters import SearchFilter, OrderingFilter
-from datetime import datetime
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
 from django.utils.timezone import make_aware, now
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
 from rest_framework.permissions import IsAuthenticated
 from accounts.permissions import HasModelPermission
-from accounts.mixins import OrgQuerysetMixin
+from accounts.mixins import OrgQuerysetMixin, OrgTimezoneMixin, resolve_org
+from analytics.snapshots import expense_rollup
+from stash_pro.db_router import ReplicaReadMixin
+from stash_pro.exports import ExportMixin
+
+
+SUMMARY_GROUPINGS = ['month', 'vendor']
 
 
 class ExpensesFilter(filters.FilterSet):
@@ -25,7 +31,7 @@ class ExpensesFilter(filters.FilterSet):
         fields = ['type', 'start_date', 'end_date']
 
 
-class ExpensesViewSet(OrgQuerysetMixin, viewsets.ModelViewSet):
+class ExpensesViewSet(ReplicaReadMixin, OrgTimezoneMixin, OrgQuerysetMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = Expenses.objects.all()
     serializer_class = ExpensesSerializer
     permission_classes = [IsAuthenticated, HasModelPermission]
@@ -34,6 +40,11 @@ class ExpensesViewSet(OrgQuerysetMixin, viewsets.ModelViewSet):
     search_fields = ['description', 'vendor']
     ordering_fields = ['id', 'date', 'amount']
     ordering = ['-date']
+    export_filename = 'expenses'
+    export_columns = [
+        ('ID', 'id'), ('Date', 'date'), ('Type', 'type'), ('Amount', 'amount'), ('Description', 'description'),
+        ('Vendor', 'vendor'), ('Sale ID', 'sale_id'), ('Product ID', 'product_id'), ('Created at', 'created_at'),
+    ]
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -79,7 +90,7 @@ class ExpensesViewSet(OrgQuerysetMixin, viewsets.ModelViewSet):
 
     @extend_schema(
         summary="Get expense summary",
-        description="Returns expense summary by type for the specified date range.",
+        description="Returns expense totals and counts by type for the specified date range, optionally grouped by month and/or vendor.",
         parameters=[
             OpenApiParameter(
                 name='start_date',
@@ -95,49 +106,90 @@ class ExpensesViewSet(OrgQuerysetMixin, viewsets.ModelViewSet):
                 description='End date (YYYY-MM-DD)',
                 required=False,
             ),
+            OpenApiParameter(
+                name='group_by',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description=f"Comma-separated extra grouping: {', '.join(SUMMARY_GROUPINGS)}",
+                required=False,
+            ),
         ],
     )
     @action(detail=False, methods=["get"])
     def summary(self, request):
         """
-        Returns expense summary by type, optionally filtered by date range
+        Returns expense summary by type, optionally filtered by date range and
+        grouped by month and/or vendor. Closed months are read from monthly
+        snapshots; everything else is one grouped query over the org's expenses.
         """
         # Parse date filters
         start_date = self.parse_custom_date(request.query_params.get('start_date'))
         end_date = self.parse_custom_date(request.query_params.get('end_date'))
-        
-        # Build base queryset with date filters
-        base_queryset = Expenses.objects.all()
-        if start_date:
-            base_queryset = base_queryset.filter(date__gte=start_date)
-        if end_date:
-            base_queryset = base_queryset.filter(date__lte=end_date)
-        
-        summary_data = {}
-        for expense_type, display_name in Expenses.ExpenseType.choices:
-            filtered = base_queryset.filter(type=expense_type)
-            total = filtered.aggregate(total_amount=Sum('amount'))['total_amount'] or 0
-            
-            summary_data[expense_type] = {
-                'display_name': display_name,
-                'total_amount': float(total),
-                'count': filtered.count()
-            }
-        
-        # Overall total
-        overall_total = base_queryset.aggregate(
-            total_amount=Sum('amount')
-        )['total_amount'] or 0
-        
+
+        group_by = [g for g in request.query_params.get('group_by', '').split(',') if g]
+        invalid = [g for g in group_by if g not in SUMMARY_GROUPINGS]
+        if invalid:
+            return Response(
+                {"error": f"Invalid group_by. Valid options are: {', '.join(SUMMARY_GROUPINGS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        org, _ = resolve_org(request)
+        rollup = expense_rollup(
+            org,
+            start=make_aware(datetime.combine(start_date, time.min)) if start_date else None,
+            stop=make_aware(datetime.combine(end_date + timedelta(days=1), time.min)) if end_date else None,
+            by_month='month' in group_by,
+            by_vendor='vendor' in group_by,
+            expense_type=request.query_params.get('type'),
+        )
+
+        summary_data = {
+            expense_type: {'display_name': display_name, 'total_amount': Decimal('0'), 'count': 0}
+            for expense_type, display_name in Expenses.ExpenseType.choices
+        }
+        groups = {}
+        for (month, vendor, expense_type), totals in rollup.items():
+            entry = summary_data.setdefault(
+                expense_type, {'display_name': expense_type, 'total_amount': Decimal('0'), 'count': 0}
+            )
+            entry['total_amount'] += totals['total']
+            entry['count'] += totals['count']
+
+            if group_by:
+                group = groups.setdefault((month, vendor), {
+                    **({'month': month.strftime('%Y-%m')} if 'month' in group_by else {}),
+                    **({'vendor': vendor} if 'vendor' in group_by else {}),
+                    'summary_by_type': {},
+                    'total_amount': Decimal('0'),
+                    'count': 0,
+                })
+                group['summary_by_type'][expense_type] = {
+                    'total_amount': float(totals['total']),
+                    'count': totals['count'],
+                }
+                group['total_amount'] += totals['total']
+                group['count'] += totals['count']
+
+        overall_total = sum(entry['total_amount'] for entry in summary_data.values())
+        for entry in [*summary_data.values(), *groups.values()]:
+            entry['total_amount'] = float(entry['total_amount'])
+
         response_data = {
             'summary_by_type': summary_data,
             'overall_total': float(overall_total),
-            'total_count': base_queryset.count()
+            'total_count': sum(entry['count'] for entry in summary_data.values()),
         }
-        
+
+        if group_by:
+            response_data['group_by'] = group_by
+            response_data['groups'] = [
+                groups[key] for key in sorted(groups, key=lambda k: (k[0] or date.min, k[1] or ''))
+            ]
+
         # Include date range in response if filters were applied
         if start_date or end_date:
             response_data['start_date'] = start_date.strftime("%Y-%m-%d") if start_date else None
             response_data['end_date'] = end_date.strftime("%Y-%m-%d") if end_date else None
-        
+
         return Response(response_data)
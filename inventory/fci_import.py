@@ -0,0 +1,368 @@
+"""
+Import of the FCI Common workbook (Inventory, Sales and Expenses sheets)
+into an organization, used by the import_fci_data command.
+
+The workbook is streamed in read-only mode and written in chunks with
+bulk upserts matched on the sheet's natural keys: lot number, product id,
+Shopify order id and expense number. Re-running the import only writes
+rows that changed and never duplicates them. Rows left by the old
+import_fci_data.py script, which stored no keys, are adopted by the sheet
+rows they came from on the first run.
+"""
+import datetime
+from collections import Counter, defaultdict, deque
+from decimal import Decimal
+
+import openpyxl
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.mixins import get_org_timezone
+from accounts.models import UserOrganization
+from analytics.snapshots import invalidate_months, invalidate_product_sales
+from expense.models import Expenses
+from sales.models import Sale
+from .imports import UpsertResult, chunked, parse_date, parse_datetime, parse_decimal, upsert
+from .models import Lot, Product
+
+CHUNK_SIZE = 500
+
+PRODUCT_TYPE_TO_CATEGORY = {
+    'SLR Body': Product.Category.FILM_CAMERA,
+    'SLR': Product.Category.FILM_CAMERA,
+    'Point & Shoot': Product.Category.FILM_CAMERA,
+    'Rangefinder': Product.Category.FILM_CAMERA,
+    'TLR': Product.Category.FILM_CAMERA,
+    'P&S + Film': Product.Category.FILM_CAMERA,
+    'Digicam': Product.Category.DIGITAL_CAMERA,
+    'Mirrorless': Product.Category.DIGITAL_CAMERA,
+    'DSLR Body': Product.Category.DIGITAL_CAMERA,
+    'Handycam': Product.Category.DIGITAL_CAMERA,
+    'Lens': Product.Category.ACCESSORY,
+    'Lens Adapter': Product.Category.ACCESSORY,
+    'Tele Converter': Product.Category.ACCESSORY,
+    'Flash': Product.Category.ACCESSORY,
+    'Viewfinder': Product.Category.ACCESSORY,
+    'Shutter Release cable': Product.Category.ACCESSORY,
+    'Other': Product.Category.ACCESSORY,
+    'Expired film': Product.Category.FILM,
+}
+
+# Sheet product types that differ from Product.SubCategory; others are used as is
+SUBCATEGORY_MAP = {
+    'SLR': Product.SubCategory.SLR,
+    'P&S + Film': Product.SubCategory.POINT_AND_SHOOT,
+}
+
+# Sheet buyer -> username of the team member who funded the lot; None is org-funded
+BUYER_MAP = {
+    'Jayesh': 'jayesh',
+    'Khare': 'apoorv',
+    'FCI': None,
+}
+
+USER_DEFAULTS = {
+    'jayesh': {'first_name': 'Jayesh', 'role': UserOrganization.Role.EDITOR},
+    'apoorv': {'first_name': 'Apoorv', 'last_name': 'Khare', 'role': UserOrganization.Role.OWNER},
+}
+
+# Used when a sheet row has no date
+DEFAULT_LOT_DATE = datetime.date(2026, 3, 1)
+DEFAULT_EXPENSE_DATE = datetime.date(2026, 4, 1)
+
+LOT_FIELDS = ['title', 'total_price', 'bought_on', 'bought_from', 'status', 'funded_by', 'funded_by_user_id']
+PRODUCT_FIELDS = [
+    'lot_id', 'name', 'price', 'stock', 'available_quantity', 'category', 'sub_category',
+    'listing_status', 'bought_from', 'bought_at', 'delivery_status', 'overall_condition',
+]
+SALE_FIELDS = [
+    'product_id', 'quantity_sold', 'sale_price', 'customer', 'sale_date', 'shopify_order_name',
+    'shipping_status', 'funded_by_user_id', 'cost_price', 'user_payout', 'org_revenue',
+]
+EXPENSE_FIELDS = ['type', 'amount', 'description', 'vendor', 'date']
+
+
+def _rows(ws, width):
+    """Data rows after the header, up to the first without an id, padded to width."""
+    for row in ws.iter_rows(min_row=2, values_only=True):
+        if not row or row[0] is None:
+            return
+        yield tuple(row) + (None,) * (width - len(row))
+
+
+def _int(value):
+    return int(value) if value else None
+
+
+class _LegacyRows:
+    """
+    Rows of a model that the old import script created without an
+    external_id, grouped by match(instance) in creation order. adopt()
+    hands them the external_id of the sheet rows they match, so the first
+    keyed run updates them instead of adding duplicates.
+    """
+
+    def __init__(self, queryset, match):
+        self.queryset = queryset
+        self.match = match
+        self.rows = defaultdict(deque)
+        for obj in queryset.filter(external_id__isnull=True).order_by('pk'):
+            self.rows[match(obj)].append(obj)
+        self.adopted = 0
+
+    def adopt(self, objs):
+        if not self.rows:
+            return
+        taken = set(
+            self.queryset.filter(external_id__in=[obj.external_id for obj in objs])
+            .values_list('external_id', flat=True)
+        )
+        adopted = []
+        for obj in objs:
+            candidates = self.rows.get(self.match(obj))
+            if obj.external_id not in taken and candidates:
+                legacy = candidates.popleft()
+                legacy.external_id = obj.external_id
+                adopted.append(legacy)
+        self.queryset.model.objects.bulk_update(adopted, ['external_id'])
+        self.adopted += len(adopted)
+
+    def note(self, notes, label):
+        if self.adopted:
+            notes.append(f"Matched {self.adopted} {label} from an earlier import without ids")
+
+
+def _ensure_users(org, notes):
+    users = {}
+    for buyer, username in BUYER_MAP.items():
+        if not username:
+            continue
+        defaults = dict(USER_DEFAULTS.get(username, {}))
+        role = defaults.pop('role', UserOrganization.Role.EDITOR)
+        user, created = User.objects.get_or_create(username=username, defaults={'is_active': True, **defaults})
+        if created:
+            user.set_unusable_password()
+            user.save(update_fields=['password'])
+            notes.append(f"Created user {username}; set a password with: manage.py changepassword {username}")
+        UserOrganization.objects.get_or_create(user=user, organization=org, defaults={'role': role})
+        users[buyer] = user
+    return users
+
+
+def _upsert_chunks(queryset, objs, key, fields, chunk_size, legacy=None):
+    result = UpsertResult()
+    for chunk in chunked(objs, chunk_size):
+        if legacy:
+            legacy.adopt(chunk)
+        result.merge(upsert(queryset, chunk, key, fields))
+    return result
+
+
+def _touched_dates(result, date_field):
+    """Dates of created rows, and old and new dates of updated ones, for snapshot invalidation."""
+    dates = [getattr(obj, date_field) for obj in result.created]
+    for obj, previous in result.updated:
+        dates.append(getattr(obj, date_field))
+        dates.append(previous.get(date_field))
+    return dates
+
+
+def _import_lots(ws, org, users, chunk_size, notes):
+    # A lot's price is the sum of its products' buying prices; its date the earliest purchase
+    lots = {}
+    for row in _rows(ws, 14):
+        lot_num = _int(row[1])
+        if not lot_num:
+            continue
+        info = lots.setdefault(lot_num, {'source': row[6], 'buyer': row[3], 'date': None, 'total': Decimal('0')})
+        info['total'] += parse_decimal(row[7], Decimal('0'))
+        purchase_date = parse_date(row[5])
+        if purchase_date and (info['date'] is None or purchase_date < info['date']):
+            info['date'] = purchase_date
+
+    objs = []
+    for lot_num, info in sorted(lots.items()):
+        funded_by = Lot.FundingSource.ORG if info['buyer'] == 'FCI' else Lot.FundingSource.USER
+        objs.append(Lot(
+            organization=org,
+            external_id=str(lot_num),
+            title=f"Lot #{lot_num}",
+            total_price=info['total'],
+            bought_on=info['date'] or DEFAULT_LOT_DATE,
+            bought_from=info['source'] or '',
+            status=Lot.PaymentStatus.PAID,
+            funded_by=funded_by,
+            funded_by_user=users.get(info['buyer']) if funded_by == Lot.FundingSource.USER else None,
+        ))
+    queryset = Lot.objects.filter(organization=org)
+    # The old script titled lots "Lot #<number>"
+    legacy = _LegacyRows(queryset, lambda lot: lot.title)
+    result = _upsert_chunks(queryset, objs, 'external_id', LOT_FIELDS, chunk_size, legacy)
+    legacy.note(notes, 'lots')
+    return result
+
+
+def _product_rows(ws, org, lots):
+    for row in _rows(ws, 14):
+        product_id, lot_num, product_type = _int(row[0]), _int(row[1]), row[2]
+        sold = str(row[12]).strip().lower() == 'yes' if row[12] else False
+        lot = lots.get(str(lot_num)) if lot_num else None
+        yield Product(
+            organization=org,
+            external_id=str(product_id),
+            lot_id=lot.pk if lot else None,
+            name=row[4] or f'Product #{product_id}',
+            price=parse_decimal(row[7], Decimal('0')),
+            stock=1,
+            available_quantity=0 if sold else 1,
+            category=PRODUCT_TYPE_TO_CATEGORY.get(product_type, Product.Category.ACCESSORY),
+            sub_category=SUBCATEGORY_MAP.get(product_type, product_type),
+            listing_status=row[13] if row[13] in Product.ListingStatus.values else Product.ListingStatus.UNLISTED,
+            bought_from=row[6],
+            bought_at=parse_datetime(row[5]),
+            delivery_status=Product.DeliveryStatus.RECEIVED,
+            overall_condition=row[8] or '',
+        )
+
+
+def _sale_rows(ws, org, products, lots_by_pk, users_by_pk, notes):
+    seen = Counter()  # Sheet order id -> sales created for it so far
+    for row in _rows(ws, 7):
+        order_name = str(row[0])  # e.g. "#1201"
+        sale_date = parse_datetime(row[1])
+        customer = row[3] or ''
+        for position, product_id in enumerate((_int(row[5]), _int(row[6]))):
+            if position and not product_id:
+                continue
+            seen[order_name] += 1
+            order_id = order_name if seen[order_name] == 1 else f'{order_name}-{seen[order_name]}'
+            product = products.get(str(product_id))
+            if not product:
+                notes.append(f"Sale {order_id}: product {product_id} not found, skipped")
+                continue
+            if not sale_date:
+                notes.append(f"Sale {order_id}: no sale date, skipped")
+                continue
+            lot = lots_by_pk.get(product.lot_id)
+            funded_by_user = None
+            if lot and lot.funded_by == Lot.FundingSource.USER:
+                funded_by_user = users_by_pk.get(lot.funded_by_user_id)
+            sale = Sale(
+                organization=org,
+                product_id=product.pk,
+                quantity_sold=1,
+                # The order total is on the first product; a second one rides along at 0
+                sale_price=parse_decimal(row[4], Decimal('0')) if position == 0 else Decimal('0'),
+                customer=customer,
+                sale_date=sale_date,
+                shopify_order_id=order_id,
+                shopify_order_name=order_name,
+                shipping_status=Sale.ShippingStatus.SHIPPED,
+                funded_by_user=funded_by_user,
+                cost_price=product.price,
+            )
+            sale.calculate_split()
+            yield sale
+
+
+def _expense_type(description):
+    description = (description or '').lower()
+    if any(word in description for word in ('delhivery', 'shipping', 'courier')):
+        return Expenses.ExpenseType.SHIPPING
+    if any(word in description for word in ('service', 'repair', 'battery')):
+        return Expenses.ExpenseType.SERVICING
+    return Expenses.ExpenseType.MISC
+
+
+def _expense_key(value):
+    """The sheet's expense number as a string; 12 and 12.0 are the same row."""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _expense_rows(ws, org, notes):
+    seen = set()
+    for row in _rows(ws, 6):
+        # Keyed on the expense number, so correcting a row updates it
+        key = _expense_key(row[0])
+        if key in seen:
+            notes.append(f"Expense {key}: number used twice in the sheet, later row skipped")
+            continue
+        seen.add(key)
+        expense_date = parse_date(row[1]) or DEFAULT_EXPENSE_DATE
+        description, vendor = row[3] or '', row[4] or ''
+        amount = parse_decimal(row[5], Decimal('0'))
+        yield Expenses(
+            organization=org,
+            external_id=key,
+            type=_expense_type(description),
+            amount=amount,
+            description=description,
+            vendor=vendor,
+            date=expense_date,
+        )
+
+
+def import_fci_workbook(path, org, chunk_size=CHUNK_SIZE, dry_run=False):
+    """
+    Import the workbook at path into org in one transaction, rolled back
+    when dry_run. Returns {'lots'|'products'|'sales'|'expenses': counts of
+    created, updated and unchanged rows, 'notes': [messages]}.
+    """
+    notes = []
+    report = {}
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        with transaction.atomic(), timezone.override(get_org_timezone(org)):
+            users = _ensure_users(org, notes)
+
+            lots = _import_lots(wb['Inventory'], org, users, chunk_size, notes)
+            report['lots'] = lots.counts()
+
+            product_queryset = Product.objects.filter(organization=org)
+            legacy = _LegacyRows(product_queryset, lambda p: (p.lot_id, p.name, p.price))
+            products = _upsert_chunks(
+                product_queryset, _product_rows(wb['Inventory'], org, lots.objects),
+                'external_id', PRODUCT_FIELDS, chunk_size, legacy,
+            )
+            legacy.note(notes, 'products')
+            report['products'] = products.counts()
+            invalidate_months(org.id, _touched_dates(products, 'bought_at'))
+            invalidate_product_sales(org.id, [p.id for p, previous in products.updated if 'price' in previous])
+
+            sales = UpsertResult()
+            lots_by_pk = {lot.pk: lot for lot in lots.objects.values()}
+            users_by_pk = {user.pk: user for user in users.values()}
+            sale_rows = _sale_rows(wb['Sales'], org, products.objects, lots_by_pk, users_by_pk, notes)
+            for chunk in chunked(sale_rows, chunk_size):
+                # Shopify order ids are unique across organizations
+                taken = set(
+                    Sale.objects.filter(shopify_order_id__in=[s.shopify_order_id for s in chunk])
+                    .exclude(organization=org).values_list('shopify_order_id', flat=True)
+                )
+                for order_id in sorted(taken):
+                    notes.append(f"Sale {order_id}: order id belongs to another organization, skipped")
+                chunk = [sale for sale in chunk if sale.shopify_order_id not in taken]
+                sales.merge(upsert(Sale.objects.filter(organization=org), chunk, 'shopify_order_id', SALE_FIELDS))
+            report['sales'] = sales.counts()
+            invalidate_months(org.id, _touched_dates(sales, 'sale_date'))
+
+            expense_queryset = Expenses.objects.filter(organization=org)
+            legacy = _LegacyRows(expense_queryset, lambda e: (e.date, e.description, e.vendor, e.amount))
+            expenses = _upsert_chunks(
+                expense_queryset, _expense_rows(wb['Expenses'], org, notes),
+                'external_id', EXPENSE_FIELDS, chunk_size, legacy,
+            )
+            legacy.note(notes, 'expenses')
+            report['expenses'] = expenses.counts()
+            invalidate_months(org.id, _touched_dates(expenses, 'date'))
+
+            if dry_run:
+                transaction.set_rollback(True)
+    finally:
+        wb.close()
+
+    report['notes'] = notes
+    return report
@@ -0,0 +1,395 @@
+"""
+Building blocks for spreadsheet imports: reading CSV and XLSX uploads,
+declarative column mappings, a row parse stage that can fan out to a
+process pool, and a chunked upsert on a natural key, so re-running an
+import only writes what changed.
+"""
+import csv
+import datetime
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from decimal import Decimal, InvalidOperation
+from itertools import islice, repeat
+
+from django.conf import settings
+from django.core.validators import DecimalValidator, MaxLengthValidator, MaxValueValidator, MinValueValidator
+from django.db.models.fields import PositiveIntegerRelDbTypeMixin
+from django.utils import timezone
+
+DATE_FORMATS = ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y')
+
+
+def parse_date(value):
+    """A date from a cell holding a datetime, date or string; None otherwise."""
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    if isinstance(value, str):
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.datetime.strptime(value.strip(), fmt).date()
+            except ValueError:
+                continue
+    return None
+
+
+def parse_datetime(value, tz=None):
+    """An aware datetime from a cell; dates become midnight in tz (default: current timezone)."""
+    tz = tz or timezone.get_current_timezone()
+    if isinstance(value, datetime.datetime):
+        return value if timezone.is_aware(value) else timezone.make_aware(value, tz)
+    value = parse_date(value)
+    if value is None:
+        return None
+    return timezone.make_aware(datetime.datetime.combine(value, datetime.time()), tz)
+
+
+def parse_decimal(value, default=None):
+    if value is None or value == '':
+        return default
+    try:
+        return Decimal(str(value).replace(',', '').strip())
+    except InvalidOperation:
+        raise ValueError(f"'{value}' is not a number")
+
+
+def parse_int(value, default=None):
+    number = parse_decimal(value)
+    if number is None:
+        return default
+    if number != number.to_integral_value():
+        raise ValueError(f"'{value}' is not a whole number")
+    return int(number)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class UpsertResult:
+    """What upsert did: saved instances by key, what it created and what it changed."""
+
+    def __init__(self):
+        self.objects = {}
+        self.created = []
+        self.updated = []  # (instance, {field: previous value})
+        self.unchanged = 0
+
+    def merge(self, other):
+        self.objects.update(other.objects)
+        self.created += other.created
+        self.updated += other.updated
+        self.unchanged += other.unchanged
+
+    def counts(self):
+        return {'created': len(self.created), 'updated': len(self.updated), 'unchanged': self.unchanged}
+
+
+def upsert(queryset, objs, key, fields):
+    """
+    Insert or update unsaved instances matched on the natural-key field
+    `key` within queryset: one SELECT for the existing rows, one
+    bulk_create and one bulk_update of the rows where any of `fields`
+    (attnames) differ. Rows that match are not written. Bulk writes skip
+    model signals; callers invalidate anything derived from these rows.
+    """
+    result = UpsertResult()
+    existing = {
+        getattr(obj, key): obj
+        for obj in queryset.filter(**{f'{key}__in': [getattr(o, key) for o in objs]})
+    }
+    now = timezone.now()
+    for obj in objs:
+        current = existing.get(getattr(obj, key))
+        if current is None:
+            result.created.append(obj)
+            result.objects[getattr(obj, key)] = obj
+            continue
+        previous = {f: getattr(current, f) for f in fields if getattr(current, f) != getattr(obj, f)}
+        if previous:
+            for field in previous:
+                setattr(current, field, getattr(obj, field))
+            current.updated_at = now
+            result.updated.append((current, previous))
+        else:
+            result.unchanged += 1
+        result.objects[getattr(obj, key)] = current
+
+    model = queryset.model
+    if result.created:
+        model.objects.bulk_create(result.created)
+    if result.updated:
+        model.objects.bulk_update([obj for obj, _ in result.updated], [*fields, 'updated_at'])
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Reading uploads
+# ---------------------------------------------------------------------------
+
+def read_table(upload, filename=None):
+    """
+    (header, rows) from a CSV or XLSX file object; rows yields
+    (sheet row number, values) and skips blank rows. XLSX files are read
+    from their first sheet in read-only mode.
+    """
+    filename = (filename or getattr(upload, 'name', '') or '').lower()
+    if filename.endswith('.xlsx'):
+        import openpyxl
+
+        wb = openpyxl.load_workbook(upload, read_only=True, data_only=True)
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+    elif filename.endswith('.csv'):
+        rows = csv.reader(io.TextIOWrapper(upload, encoding='utf-8-sig', newline=''))
+    else:
+        raise ValueError('Upload a .csv or .xlsx file')
+
+    header = next(rows, None)
+    if not header:
+        raise ValueError('The file is empty')
+    header = [str(name).strip() if name is not None else '' for name in header]
+
+    def numbered():
+        for number, row in enumerate(rows, start=2):
+            if any(value not in (None, '') for value in row):
+                yield number, tuple(row)
+
+    return header, numbered()
+
+
+# ---------------------------------------------------------------------------
+# Column mappings
+# ---------------------------------------------------------------------------
+
+def _parse_str(value):
+    return str(value).strip() if value is not None else None
+
+
+def _parse_cell_date(value):
+    if value is None:
+        return None
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(f"'{value}' is not a date")
+    return parsed
+
+
+# Field types a mapping can convert cells to
+FIELD_PARSERS = {
+    'str': _parse_str,
+    'int': parse_int,
+    'decimal': parse_decimal,
+    'date': _parse_cell_date,
+}
+
+
+def field_limits(model_field):
+    """
+    The limits a model field puts on its values, as plain data for
+    parse_chunk: max_length, min_value, max_value, max_digits and
+    decimal_places, where they apply.
+    """
+    limits = {}
+    if isinstance(model_field, PositiveIntegerRelDbTypeMixin):
+        limits['min_value'] = 0
+    for validator in model_field.validators:
+        if isinstance(validator, MaxLengthValidator):
+            limits['max_length'] = validator.limit_value
+        elif isinstance(validator, MinValueValidator):
+            limits['min_value'] = max(validator.limit_value, limits.get('min_value', validator.limit_value))
+        elif isinstance(validator, MaxValueValidator):
+            limits['max_value'] = validator.limit_value
+        elif isinstance(validator, DecimalValidator):
+            limits['max_digits'] = validator.max_digits
+            limits['decimal_places'] = validator.decimal_places
+    return limits
+
+
+def _check_limits(limits, value):
+    if 'max_length' in limits and len(value) > limits['max_length']:
+        raise ValueError(f"Ensure this value has at most {limits['max_length']} characters (it has {len(value)}).")
+    if 'min_value' in limits and value < limits['min_value']:
+        raise ValueError(f"Ensure this value is greater than or equal to {limits['min_value']}.")
+    if 'max_value' in limits and value > limits['max_value']:
+        raise ValueError(f"Ensure this value is less than or equal to {limits['max_value']}.")
+    if 'max_digits' in limits:
+        if not value.is_finite():
+            raise ValueError(f"'{value}' is not a number")
+        # Digits before and after the point, counted as DecimalValidator does
+        _, digits, exponent = value.as_tuple()
+        decimals = max(0, -exponent)
+        whole = max(0, len(digits) + exponent) if digits != (0,) else 0
+        if decimals > limits['decimal_places']:
+            raise ValueError(f"Ensure that there are no more than {limits['decimal_places']} decimal places.")
+        if whole > limits['max_digits'] - limits['decimal_places']:
+            raise ValueError(
+                f"Ensure that there are no more than {limits['max_digits'] - limits['decimal_places']} "
+                f"digits before the decimal point."
+            )
+
+
+class ColumnMapping:
+    """
+    A declarative mapping from file columns to model fields:
+
+        {
+            "columns": {"Item": "name", "Cost": "price", "Type": ["category", "sub_category"]},
+            "values": {"category": {"SLR": "Film Camera", "*": "Accessory"}},
+            "defaults": {"delivery_status": "received"}
+        }
+
+    columns maps a header (case-insensitive) to one or more fields. values
+    rewrites cell values per field, with "*" matching anything else, in
+    the manner of the FCI importer's PRODUCT_TYPE_TO_CATEGORY. defaults
+    fill empty cells and unmapped fields. fields describes the target:
+    {field: (type, choices or None, required[, model field])}; cells for a
+    field with a model field are also checked against its limits (see
+    field_limits), so a value the database would refuse is a row error.
+    """
+
+    def __init__(self, fields, columns, values=None, defaults=None):
+        if not isinstance(columns, dict) or not columns:
+            raise ValueError('columns must map file headers to fields')
+        self.fields = fields
+        self.columns = {}
+        self.headers = {}  # Lowercased header -> as given, for messages
+        for header, targets in columns.items():
+            targets = [targets] if isinstance(targets, str) else list(targets or [])
+            unknown = [t for t in targets if t not in fields]
+            if unknown:
+                raise ValueError(f"Unknown field(s) for column '{header}': {', '.join(unknown)}")
+            self.columns[str(header).strip().lower()] = targets
+            self.headers[str(header).strip().lower()] = str(header).strip()
+        self.values = {
+            field: {str(value): stored for value, stored in (mapping or {}).items()}
+            for field, mapping in (values or {}).items()
+        }
+        self.defaults = dict(defaults or {})
+        for field in [*self.values, *self.defaults]:
+            if field not in fields:
+                raise ValueError(f"Unknown field '{field}'")
+
+        mapped = self.mapped_fields()
+        missing = [f for f, spec in fields.items() if spec[2] and f not in mapped]
+        if missing:
+            raise ValueError(f"Required field(s) not mapped: {', '.join(missing)}")
+
+    @classmethod
+    def from_dict(cls, fields, data):
+        if not isinstance(data, dict):
+            raise ValueError('mapping must be an object')
+        return cls(fields, data.get('columns'), data.get('values'), data.get('defaults'))
+
+    def mapped_fields(self):
+        return {t for targets in self.columns.values() for t in targets} | set(self.defaults)
+
+    def compile(self, header):
+        """A plain, picklable spec for parse_chunk, bound to the file's header."""
+        positions = {name.lower(): i for i, name in enumerate(header)}
+        missing = [name for name in self.columns if name not in positions]
+        if missing:
+            raise ValueError(f"Column(s) not in the file: {', '.join(self.headers[name] for name in missing)}")
+        return {
+            'columns': [(positions[name], field) for name, targets in self.columns.items() for field in targets],
+            'values': self.values,
+            'defaults': self.defaults,
+            'types': {field: spec[0] for field, spec in self.fields.items()},
+            'choices': {
+                field: {str(choice).lower(): str(choice) for choice in spec[1]}
+                for field, spec in self.fields.items() if spec[1]
+            },
+            'required': [field for field, spec in self.fields.items() if spec[2]],
+            'limits': {field: field_limits(spec[3]) for field, spec in self.fields.items() if len(spec) > 3},
+        }
+
+
+# ---------------------------------------------------------------------------
+# Parse stage
+# ---------------------------------------------------------------------------
+
+# Rows per parse task, and the file size from which parsing fans out to processes
+PARSE_CHUNK_ROWS = 2000
+PARALLEL_MIN_ROWS = 10000
+
+_pool = None
+
+
+def _parse_cell(spec, field, raw):
+    if isinstance(raw, str):
+        raw = raw.strip()
+    if raw in (None, ''):
+        raw = spec['defaults'].get(field)
+    values = spec['values'].get(field)
+    if values and raw is not None:
+        raw = values.get(str(raw), values.get('*', raw))
+    value = FIELD_PARSERS[spec['types'][field]](raw)
+    choices = spec['choices'].get(field)
+    if choices and value not in (None, ''):
+        if str(value).lower() not in choices:
+            raise ValueError(f"'{value}' is not a valid choice")
+        value = choices[str(value).lower()]
+    limits = spec['limits'].get(field)
+    if limits and value is not None:
+        _check_limits(limits, value)
+    return value
+
+
+def parse_chunk(spec, rows):
+    """
+    Parse and validate (row number, values) pairs with a compiled mapping;
+    returns [(row number, data, errors)]. Pure Python, so it can run in a
+    worker process.
+    """
+    parsed = []
+    for number, row in rows:
+        data, errors = {}, {}
+        for index, field in spec['columns']:
+            try:
+                data[field] = _parse_cell(spec, field, row[index] if index < len(row) else None)
+            except ValueError as e:
+                errors[field] = str(e)
+        for field in spec['defaults']:
+            if field not in data and field not in errors:
+                try:
+                    data[field] = _parse_cell(spec, field, None)
+                except ValueError as e:
+                    errors[field] = str(e)
+        for field in spec['required']:
+            if field not in errors and data.get(field) in (None, ''):
+                errors[field] = 'This field is required.'
+        parsed.append((number, data, errors))
+    return parsed
+
+
+def _parse_pool():
+    global _pool
+    if _pool is None:
+        workers = getattr(settings, 'IMPORT_PARSE_WORKERS', None) or min(4, os.cpu_count() or 1)
+        # spawn: forking a threaded server process is not safe
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+def parse_rows(spec, rows, parallel_min_rows=PARALLEL_MIN_ROWS):
+    """
+    Parsed chunks for rows, in file order. Files with at least
+    parallel_min_rows rows are parsed on the process pool; smaller ones
+    inline, where starting workers would cost more than it saves.
+    """
+    global _pool
+    chunks = list(chunked(rows, PARSE_CHUNK_ROWS))
+    if sum(len(chunk) for chunk in chunks) < parallel_min_rows:
+        for chunk in chunks:
+            yield parse_chunk(spec, chunk)
+        return
+    try:
+        yield from _parse_pool().map(parse_chunk, repeat(spec), chunks)
+    except BrokenProcessPool:
+        _pool = None  # The next import starts fresh workers
+        raise
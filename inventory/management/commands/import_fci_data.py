@@ -0,0 +1,36 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import Organization
+from inventory.fci_import import CHUNK_SIZE, import_fci_workbook
+
+
+class Command(BaseCommand):
+    help = "Import the FCI workbook (Inventory, Sales and Expenses sheets) into an organization."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the .xlsx workbook')
+        parser.add_argument('--org', required=True, help='Organization slug')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows per bulk write')
+        parser.add_argument('--dry-run', action='store_true', help='Report the planned changes without saving them')
+
+    def handle(self, *args, **options):
+        org = Organization.objects.filter(slug=options['org']).first()
+        if not org:
+            raise CommandError(f"Organization '{options['org']}' not found")
+        if not os.path.isfile(options['path']):
+            raise CommandError(f"{options['path']} does not exist")
+
+        report = import_fci_workbook(
+            options['path'], org, chunk_size=options['chunk_size'], dry_run=options['dry_run'],
+        )
+
+        for note in report['notes']:
+            self.stdout.write(self.style.WARNING(note))
+        for name in ('lots', 'products', 'sales', 'expenses'):
+            counts = report[name]
+            self.stdout.write(
+                f"{name}: {counts['created']} created, {counts['updated']} updated, {counts['unchanged']} unchanged"
+            )
+        self.stdout.write(self.style.SUCCESS('Dry run, nothing was saved' if options['dry_run'] else 'Done'))
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0016_product_listing_status_alter_product_sub_category'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lot',
+            name='external_id',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='external_id',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='lot',
+            constraint=models.UniqueConstraint(fields=('organization', 'external_id'), name='lot_org_external_id'),
+        ),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(fields=('organization', 'external_id'), name='product_org_external_id'),
+        ),
+    ]
@@ -113,6 +113,13 @@ class Product(BaseModel):
     bought_at = models.DateTimeField(null=True, blank=True)
     lot = models.ForeignKey('Lot', on_delete=models.SET_NULL, null=True, blank=True, related_name='products')
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='products', null=True)
+    # Id of the row this product was imported from (e.g. the FCI sheet's product id)
+    external_id = models.CharField(max_length=64, null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['organization', 'external_id'], name='product_org_external_id'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.category} - {self.bought_from or 'N/A'})"
@@ -141,6 +148,13 @@ class Lot(BaseModel):
         choices=PaymentStatus.choices,
         default=PaymentStatus.PAYMENT_PENDING
     )
+    # Id of the row this lot was imported from (e.g. the FCI sheet's lot number)
+    external_id = models.CharField(max_length=64, null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['organization', 'external_id'], name='lot_org_external_id'),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.bought_on}"
@@ -0,0 +1,190 @@
+"""
+Column-mapped CSV/XLSX product imports, for supplier lot lists.
+
+The upload is read as a stream of rows, parsed and validated in chunks by
+imports.parse_rows (on a process pool for large files), and the valid rows
+are loaded by a single writer with chunked bulk upserts. Invalid rows are
+skipped and reported by sheet row number.
+"""
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from accounts.mixins import get_org_timezone
+from analytics.snapshots import invalidate_months, invalidate_product_sales
+from .imports import PARALLEL_MIN_ROWS, parse_datetime, parse_rows, read_table, upsert
+from .models import Lot, Product
+
+_field = Product._meta.get_field
+
+# Importable fields: (type, choices, required, model field whose limits
+# apply). "lot" groups rows into lots keyed by its value, stored as the
+# lot's external_id; "external_id" is the supplier's id, matched on re-import.
+PRODUCT_IMPORT_FIELDS = {
+    'external_id': ('str', None, False, _field('external_id')),
+    'lot': ('str', None, False, Lot._meta.get_field('external_id')),
+    'name': ('str', None, True, _field('name')),
+    'price': ('decimal', None, True, _field('price')),
+    'stock': ('int', None, False, _field('stock')),
+    'specs': ('str', None, False, _field('specs')),
+    'category': ('str', Product.Category.values, False, _field('category')),
+    'sub_category': ('str', Product.SubCategory.values, False, _field('sub_category')),
+    'cosmetic_condition': ('str', Product.CosmeticCondition.values, False, _field('cosmetic_condition')),
+    'working_condition': ('str', Product.WorkingCondition.values, False, _field('working_condition')),
+    'delivery_status': ('str', Product.DeliveryStatus.values, False, _field('delivery_status')),
+    'listing_status': ('str', Product.ListingStatus.values, False, _field('listing_status')),
+    'overall_condition': ('str', None, False, _field('overall_condition')),
+    'bought_from': ('str', None, False, _field('bought_from')),
+    'bought_at': ('date', None, False, _field('bought_at')),
+}
+
+# Row errors returned in full; beyond this only the count is
+MAX_REPORTED_ERRORS = 500
+
+
+def _product(org, data, lots, default_lot):
+    fields = {field: value for field, value in data.items() if field != 'lot'}
+    if fields.get('bought_at'):
+        fields['bought_at'] = parse_datetime(fields['bought_at'])
+    if 'stock' in fields:
+        fields['stock'] = fields['stock'] if fields['stock'] is not None else 1
+    return Product(
+        organization=org,
+        lot=lots[data['lot']] if data.get('lot') else default_lot,
+        available_quantity=fields.get('stock', 1),
+        **fields,
+    )
+
+
+def _ensure_lots(org, rows, lots, created):
+    """Add the lots named by rows to lots (key -> Lot), creating the missing ones."""
+    keys = {data['lot'] for data in rows if data.get('lot')} - set(lots)
+    if not keys:
+        return
+    lots.update({lot.external_id: lot for lot in Lot.objects.filter(organization=org, external_id__in=keys)})
+
+    new = {}
+    for data in rows:
+        key = data.get('lot')
+        if key in keys and key not in lots and key not in new:
+            new[key] = Lot(
+                organization=org,
+                external_id=key,
+                title=f"Lot {key}",
+                total_price=0,
+                bought_on=data.get('bought_at') or timezone.localdate(),
+                bought_from=data.get('bought_from'),
+            )
+    Lot.objects.bulk_create(new.values())
+    lots.update(new)
+    created.extend(new.values())
+
+
+def _adjust_available(updated):
+    """
+    Move available_quantity by each updated product's stock change, as
+    ProductViewSet.update does; one bulk UPDATE.
+    """
+    changed = []
+    for product, previous in updated:
+        if 'stock' in previous:
+            delta = (product.stock or 0) - (previous['stock'] or 0)
+            product.available_quantity = max(0, product.available_quantity + delta)
+            changed.append(product)
+    Product.objects.bulk_update(changed, ['available_quantity'])
+
+
+def _refresh_lot_totals(lot_ids):
+    """Set each lot's total price to what its products cost, in one UPDATE."""
+    cost = (
+        Product.objects.filter(lot=OuterRef('pk')).values('lot')
+        .annotate(total=Sum(F('price') * F('stock'), output_field=DecimalField()))
+        .values('total')
+    )
+    Lot.objects.filter(pk__in=lot_ids).update(
+        total_price=Coalesce(Subquery(cost), Value(0), output_field=DecimalField()),
+    )
+
+
+def import_products(org, upload, mapping, lot=None, dry_run=False, parallel_min_rows=PARALLEL_MIN_ROWS):
+    """
+    Import products into org from a CSV or XLSX upload with a
+    ColumnMapping over PRODUCT_IMPORT_FIELDS. Rows with an external_id
+    update the org's product with that id (only the mapped fields, with
+    available_quantity following a stock change); others are created. Rows
+    with a lot value go into the org's lot with that external_id, created
+    as needed; the rest into lot, if given. Every lot the import adds
+    products to or changes products in gets its total reset from its
+    products. Everything is written in one transaction, rolled back when
+    dry_run. Returns counts and per-row errors.
+    """
+    header, rows = read_table(upload)
+    spec = mapping.compile(header)
+    update_fields = [
+        'lot_id' if field == 'lot' else field for field in mapping.mapped_fields() if field != 'external_id'
+    ]
+    if lot and 'lot_id' not in update_fields:
+        update_fields.append('lot_id')
+
+    report = {'rows': 0, 'created': 0, 'updated': 0, 'unchanged': 0, 'lots_created': 0, 'skipped': 0, 'errors': []}
+    first_seen = {}  # external_id -> row number
+    lots, new_lots, dates = {}, [], []
+    touched_lots, repriced = set(), []
+    products = Product.objects.filter(organization=org)
+
+    with transaction.atomic(), timezone.override(get_org_timezone(org)):
+        for parsed in parse_rows(spec, rows, parallel_min_rows):
+            valid = []
+            for number, data, errors in parsed:
+                report['rows'] += 1
+                key = data.get('external_id')
+                if key and not errors:
+                    if key in first_seen:
+                        errors = {'external_id': f"Duplicate of row {first_seen[key]}"}
+                    else:
+                        first_seen[key] = number
+                if errors:
+                    report['skipped'] += 1
+                    if len(report['errors']) < MAX_REPORTED_ERRORS:
+                        report['errors'].append({'row': number, 'errors': errors})
+                    continue
+                valid.append(data)
+
+            _ensure_lots(org, valid, lots, new_lots)
+            chunk = [_product(org, data, lots, lot) for data in valid]
+            keyed = [product for product in chunk if product.external_id]
+            unkeyed = [product for product in chunk if not product.external_id]
+
+            if keyed:
+                result = upsert(products, keyed, 'external_id', update_fields)
+                report['created'] += len(result.created)
+                report['updated'] += len(result.updated)
+                report['unchanged'] += result.unchanged
+                _adjust_available(result.updated)
+                dates += [product.bought_at for product in result.created]
+                dates += [value for product, previous in result.updated
+                          for value in (product.bought_at, previous.get('bought_at'))]
+                touched_lots.update(product.lot_id for product in result.created)
+                touched_lots.update(value for product, previous in result.updated
+                                    for value in (product.lot_id, previous.get('lot_id')))
+                repriced += [product.id for product, previous in result.updated if 'price' in previous]
+            if unkeyed:
+                Product.objects.bulk_create(unkeyed)
+                report['created'] += len(unkeyed)
+                dates += [product.bought_at for product in unkeyed]
+                touched_lots.update(product.lot_id for product in unkeyed)
+
+        touched_lots.discard(None)
+        if touched_lots:
+            _refresh_lot_totals(touched_lots)
+        report['lots_created'] = len(new_lots)
+        # Bulk writes skip the snapshot signals
+        invalidate_months(org.id if org else None, dates)
+        invalidate_product_sales(org.id if org else None, repriced)
+
+        if dry_run:
+            transaction.set_rollback(True)
+
+    report['dry_run'] = dry_run
+    return report
@@ -12,7 +12,7 @@ class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = "__all__"
-        read_only_fields = ('available_quantity',)
+        read_only_fields = ('available_quantity', 'external_id')
         extra_kwargs = {
             'name': {'required': True},
             'price': {'required': True},
@@ -128,7 +128,7 @@ class LotSerializer(serializers.ModelSerializer):
     class Meta:
         model = Lot
         fields = "__all__"
-        read_only_fields = ('created_at', 'updated_at', 'organization')
+        read_only_fields = ('created_at', 'updated_at', 'organization', 'external_id')
 
     def validate_total_price(self, value):
         if value is None:
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ProductViewSet, LotViewSet, PaymentViewSet, BulkImportView
+from .views import ProductViewSet, LotViewSet, PaymentViewSet, BulkImportView, ProductImportView
 
 router = DefaultRouter()
 router.register(r'products', ProductViewSet, basename='products')
@@ -10,4 +10,5 @@ router.register(r'payments', PaymentViewSet, basename='payments')
 urlpatterns = [
     path('', include(router.urls)),
     path('bulk-import/', BulkImportView.as_view(), name='bulk_import'),
+    path('import/', ProductImportView.as_view(), name='product_import'),
 ]
\ No newline at end of file
@@ -1,9 +1,13 @@
 import datetime
+import json
 from rest_framework.decorators import action
 from rest_framework import viewsets, status, serializers
 from rest_framework.views import APIView
+from rest_framework.parsers import MultiPartParser
 from .models import Product, Lot, Payment
 from .serializers import ProductSerializer, LotSerializer, PaymentSerializer
+from .imports import ColumnMapping
+from .product_import import PRODUCT_IMPORT_FIELDS, import_products
 from rest_framework.response import Response
 from sales.models import Sale
 from django_filters import rest_framework as filters
@@ -13,7 +17,9 @@ from drf_spectacular.types import OpenApiTypes
 from rest_framework.permissions import IsAuthenticated
 from accounts.permissions import HasModelPermission, IsOwnerGroup
 from accounts.mixins import OrgQuerysetMixin, resolve_org
-from django.db import transaction
+from stash_pro.db_router import ReplicaReadMixin
+from stash_pro.exports import ExportMixin
+from django.db import DatabaseError, transaction
 
 
 class ProductFilter(filters.FilterSet):
@@ -53,7 +59,7 @@ class PaymentFilter(filters.FilterSet):
         fields = ['start_date', 'end_date', 'lot']
 
 
-class ProductViewSet(OrgQuerysetMixin, viewsets.ModelViewSet):
+class ProductViewSet(ReplicaReadMixin, OrgQuerysetMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated, HasModelPermission]
@@ -66,6 +72,15 @@ class ProductViewSet(OrgQuerysetMixin, viewsets.ModelViewSet):
     search_fields = ['name', 'specs']
     ordering_fields = ['id', 'name', 'price', 'available_quantity', 'created_at']
     ordering = ['id']
+    export_filename = 'products'
+    export_columns = [
+        ('ID', 'id'), ('External ID', 'external_id'), ('Name', 'name'), ('Category', 'category'),
+        ('Sub-category', 'sub_category'), ('Price', 'price'), ('Stock', 'stock'),
+        ('Available', 'available_quantity'), ('Listing status', 'listing_status'),
+        ('Delivery status', 'delivery_status'), ('Cosmetic condition', 'cosmetic_condition'),
+        ('Working condition', 'working_condition'), ('Bought from', 'bought_from'), ('Bought at', 'bought_at'),
+        ('Lot ID', 'lot_id'), ('Lot', 'lot__title'), ('Created at', 'created_at'),
+    ]
 
     def update(self, request, *args, **kwargs):
         """
@@ -179,7 +194,7 @@ class ProductViewSet(OrgQuerysetMixin, viewsets.ModelViewSet):
         return Response(data)
 
 
-class LotViewSet(OrgQuerysetMixin, viewsets.ModelViewSet):
+class LotViewSet(ReplicaReadMixin, OrgQuerysetMixin, viewsets.ModelViewSet):
     queryset = Lot.objects.all()
     serializer_class = LotSerializer
     permission_classes = [IsAuthenticated, HasModelPermission]
@@ -396,3 +411,57 @@ class BulkImportView(APIView):
             'created_sales': created_sales,
             'errors': errors,
         }, status=status.HTTP_201_CREATED if not errors else status.HTTP_207_MULTI_STATUS)
+
+
+class ProductImportView(APIView):
+    """
+    Import products from a CSV or XLSX file (e.g. a supplier's lot list)
+    with a declarative column mapping.
+
+    Multipart form fields:
+        file: the .csv or .xlsx file (first sheet)
+        mapping: JSON, e.g.
+            {
+                "columns": {"SKU": "external_id", "Item": "name", "Cost": "price",
+                            "Type": ["category", "sub_category"]},
+                "values": {"category": {"SLR": "Film Camera", "*": "Accessory"}},
+                "defaults": {"delivery_status": "received"}
+            }
+        lot: optional id of a lot for rows without a mapped lot column
+        dry_run: "true" to validate and report without saving
+
+    Rows with an external_id update the product imported with that id.
+    Invalid rows are skipped and listed with their sheet row number.
+    """
+    permission_classes = [IsAuthenticated, IsOwnerGroup]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            mapping = ColumnMapping.from_dict(PRODUCT_IMPORT_FIELDS, json.loads(request.data.get('mapping') or 'null'))
+        except ValueError as e:
+            return Response({'error': f'Invalid mapping: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        org, _ = resolve_org(request)
+        lot = None
+        if request.data.get('lot'):
+            lots = Lot.objects.filter(organization=org) if org else Lot.objects.all()
+            try:
+                lot = lots.filter(pk=int(request.data['lot'])).first()
+            except ValueError:
+                pass
+            if not lot:
+                return Response({'error': 'Lot not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        try:
+            report = import_products(org, upload, mapping, lot=lot, dry_run=dry_run)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except DatabaseError as e:
+            # A value the parse stage let through; nothing was saved
+            return Response({'error': f'The import could not be saved: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report)
@@ -0,0 +1,96 @@
+"""
+Per-tool latency of the MCP tools against a running Django server, with the
+shared pooled client and with a new client per backend request (how the
+server used to call the API), and with --orm also in-process against the
+ORM (MCP_BACKEND=orm; needs the Django settings and DJANGO_ORG).
+
+Start Django locally (python manage.py runserver) with some sales in the
+database, then:
+
+    DJANGO_BASE_URL=http://localhost:8000 DJANGO_API_TOKEN=<jwt> DJANGO_ORG=<slug> \
+        python benchmark.py --email buyer@example.com --order-id 1 --iterations 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+import mcp_server
+
+
+async def _request_with_new_client(method: str, path: str, **kwargs) -> httpx.Response:
+    # The pre-pooling behaviour: connect, send one request, disconnect
+    async with httpx.AsyncClient(
+        base_url=mcp_server.BASE_URL, headers=mcp_server._backend_headers(), timeout=15,
+    ) as client:
+        r = await client.request(method, path, **kwargs)
+        r.raise_for_status()
+        return r
+
+
+def _tool(obj):
+    # FastMCP wraps decorated functions; the callable is on .fn
+    return getattr(obj, "fn", obj)
+
+
+async def _time_tool(fn, args, iterations):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await fn(**args)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "mean": statistics.mean(timings),
+        "p50": timings[len(timings) // 2],
+        "p95": timings[int(len(timings) * 0.95)],
+    }
+
+
+async def run(tools, iterations, orm=False):
+    pooled_request = mcp_server._request
+    modes = [
+        ("new client per call", mcp_server.HttpBackend(), _request_with_new_client),
+        ("shared pool", mcp_server.HttpBackend(), pooled_request),
+    ]
+    if orm:
+        modes.append(("in-process ORM", mcp_server.OrmBackend(mcp_server.DJANGO_ORG, mcp_server.ORM_WORKERS), None))
+
+    results = {}
+    for mode, backend, request in modes:
+        mcp_server._backend = backend
+        mcp_server._request = request or pooled_request
+        try:
+            for name, (fn, args) in tools.items():
+                await fn(**args)  # warm-up
+                results[(name, mode)] = await _time_tool(fn, args, iterations)
+        finally:
+            mcp_server._request = pooled_request
+            await mcp_server.close_http_client()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--email", default="buyer@example.com")
+    parser.add_argument("--order-id", type=int, default=1)
+    parser.add_argument("--orm", action="store_true", help="also time the in-process ORM backend")
+    args = parser.parse_args()
+
+    tools = {
+        "get_order_status": (_tool(mcp_server.get_order_status), {"order_id": args.order_id}),
+        "get_order_by_email": (_tool(mcp_server.get_order_by_email), {"email": args.email}),
+        "get_unshipped_orders": (_tool(mcp_server.get_unshipped_orders), {}),
+    }
+    results = asyncio.run(run(tools, args.iterations, args.orm))
+
+    print(f"{'tool':<24}{'mode':<22}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for (name, mode), stats in results.items():
+        print(f"{name:<24}{mode:<22}{stats['mean']:>10.1f}{stats['p50']:>10.1f}{stats['p95']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
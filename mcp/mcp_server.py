@@ -1,4 +1,12 @@
+import asyncio
+import hmac
+import importlib.util
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from pathlib import Path
+
 import httpx
 from dotenv import load_dotenv
 from fastmcp import FastMCP
@@ -6,10 +14,36 @@ from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
 from starlette.responses import Response
 
+from response_cache import TTLCache, CachedBackend
+
 load_dotenv()
 
 BASE_URL = os.getenv("DJANGO_BASE_URL", "http://localhost:8000")
 MCP_API_KEY = os.getenv("MCP_API_KEY", "")
+# Optional credentials for the Django API: a JWT access token and org slug
+DJANGO_API_TOKEN = os.getenv("DJANGO_API_TOKEN", "")
+DJANGO_ORG = os.getenv("DJANGO_ORG", "")
+
+# Backend connection pool
+HTTP_TIMEOUT = float(os.getenv("MCP_HTTP_TIMEOUT", "15"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("MCP_HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("MCP_HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("MCP_HTTP_MAX_KEEPALIVE", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("MCP_HTTP_KEEPALIVE_EXPIRY", "30"))
+# HTTP/2 needs the h2 package (httpx[http2]) and a TLS backend that offers it
+HTTP2 = os.getenv("MCP_HTTP2", "auto").lower() in ("1", "true", "yes") or (
+    os.getenv("MCP_HTTP2", "auto").lower() == "auto" and importlib.util.find_spec("h2") is not None
+)
+
+# "http" calls the Django API; "orm" runs the tools in-process against the
+# ORM (needs the Django project and its settings, see OrmBackend)
+MCP_BACKEND = os.getenv("MCP_BACKEND", "http").lower()
+ORM_WORKERS = int(os.getenv("MCP_ORM_WORKERS", "8"))
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+# Seconds to reuse a backend response for identical tool calls; 0 disables
+CACHE_TTL = float(os.getenv("MCP_CACHE_TTL", "5"))
+CACHE_MAX_ENTRIES = int(os.getenv("MCP_CACHE_MAX_ENTRIES", "1024"))
 
 mcp = FastMCP("fci-stash-mcp")
 
@@ -20,35 +54,93 @@ mcp = FastMCP("fci-stash-mcp")
 
 class APIKeyMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
-        # SSE negotiation happens on GET /sse — still require the key
+        # SSE negotiation happens on GET /sse — still require the key. With no
+        # key configured nothing gets through.
         key = request.headers.get("X-MCP-Key", "")
-        if key != MCP_API_KEY:
+        if not MCP_API_KEY or not hmac.compare_digest(key.encode(), MCP_API_KEY.encode()):
             return Response("Unauthorized", status_code=401)
         return await call_next(request)
 
 
+# ---------------------------------------------------------------------------
+# Backend HTTP client
+# ---------------------------------------------------------------------------
+
+_client: httpx.AsyncClient | None = None
+
+
+def _backend_headers() -> dict:
+    headers = {}
+    if DJANGO_API_TOKEN:
+        headers["Authorization"] = f"Bearer {DJANGO_API_TOKEN}"
+    if DJANGO_ORG:
+        headers["X-Organization"] = DJANGO_ORG
+    return headers
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    The process-wide client for the Django API, so tool calls reuse pooled
+    keep-alive connections instead of opening one per request. The app
+    lifespan opens it and closes it on shutdown; outside an app (e.g.
+    benchmark.py) it is created on first use.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=BASE_URL,
+            headers=_backend_headers(),
+            http2=HTTP2,
+            timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+    return _client
+
+
+async def close_http_client() -> None:
+    """Close pooled connections; called when the server shuts down."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+@asynccontextmanager
+async def http_client_lifespan():
+    """Hold the backend client open for the life of the app."""
+    if MCP_BACKEND != "orm":
+        get_http_client()
+    try:
+        yield
+    finally:
+        await close_http_client()
+
+
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
 
+async def _request(method: str, path: str, **kwargs) -> httpx.Response:
+    r = await get_http_client().request(method, path, **kwargs)
+    r.raise_for_status()
+    return r
+
+
 async def _get(path: str, params: dict | None = None) -> dict | list:
-    url = f"{BASE_URL}{path}"
-    async with httpx.AsyncClient(timeout=15) as client:
-        r = await client.get(url, params=params)
-        r.raise_for_status()
-        return r.json()
+    return (await _request("GET", path, params=params)).json()
 
 
 async def _patch(path: str, body: dict) -> dict:
-    url = f"{BASE_URL}{path}"
-    async with httpx.AsyncClient(timeout=15) as client:
-        r = await client.patch(url, json=body)
-        r.raise_for_status()
-        return r.json()
+    return (await _request("PATCH", path, json=body)).json()
 
 
 def _product_name(sale: dict) -> str:
-    p = sale.get("product") or {}
+    # The sales API sends the product id as "product" and its name under "product_details"
+    p = sale.get("product_details") or sale.get("product") or {}
     if isinstance(p, dict):
         return p.get("name", "—")
     return str(p)
@@ -58,55 +150,184 @@ def _product_name(sale: dict) -> str:
 # Tools
 # ---------------------------------------------------------------------------
 
-@mcp.tool()
-async def get_order_by_email(email: str) -> dict:
-    """
-    Find all orders placed by a customer email address.
+def _email_order(sale: dict, info: dict, email: str) -> dict:
+    return {
+        "order_id": sale.get("id"),
+        "product_name": _product_name(sale),
+        "sale_price": sale.get("sale_price"),
+        "shipping_status": sale.get("shipping_status"),
+        "sale_date": sale.get("sale_date"),
+        "customer_name": info.get("customer_name", sale.get("customer", "—")),
+        "customer_email": info.get("customer_email", email),
+    }
 
-    Returns order id, product name, sale_price, shipping_status,
-    sale_date, and customer_name for every matching order.
-    """
-    # Fetch all shipping-info records and find those matching the email
+
+# ---------------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------------
+
+async def _sales_by_email_from_shipping_info(email: str) -> list[dict]:
+    """Fallback for backends without /api/sales/by_email/: scan shipping info, fetch sales concurrently."""
     shipping_data = await _get("/api/sales/shipping-info/")
     if isinstance(shipping_data, dict):
         shipping_records = shipping_data.get("results", shipping_data.get("data", []))
     else:
         shipping_records = shipping_data
 
-    matched_sale_ids = {
-        rec["sale"] if isinstance(rec.get("sale"), int) else rec.get("sale", {}).get("id")
-        for rec in shipping_records
-        if rec.get("customer_email", "").lower() == email.lower()
-    }
-
-    if not matched_sale_ids:
-        return {"orders": [], "message": f"No orders found for email: {email}"}
-
-    # Build customer_name lookup from shipping records
     email_info: dict[int, dict] = {}
     for rec in shipping_records:
-        sid = rec["sale"] if isinstance(rec.get("sale"), int) else rec.get("sale", {}).get("id")
-        if sid in matched_sale_ids:
+        if rec.get("customer_email", "").lower() == email.lower():
+            sid = rec["sale"] if isinstance(rec.get("sale"), int) else rec.get("sale", {}).get("id")
             email_info[sid] = rec
 
-    # Fetch full sale details for each matched order
-    orders = []
-    for sale_id in matched_sale_ids:
+    sales = await asyncio.gather(
+        *(_get(f"/api/sales/{sale_id}/") for sale_id in email_info), return_exceptions=True,
+    )
+    found = []
+    for sale_id, sale in zip(email_info, sales):
+        if isinstance(sale, httpx.HTTPStatusError):
+            continue
+        if isinstance(sale, BaseException):
+            raise sale
+        found.append({**sale, "shipping_info": email_info[sale_id]})
+    return found
+
+
+class HttpBackend:
+    """Tool data from the Django API, over the shared pooled client."""
+
+    async def sales_by_email(self, email: str) -> list[dict]:
+        try:
+            data = await _get("/api/sales/by_email/", params={"email": email})
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code != 404:
+                raise
+            return await _sales_by_email_from_shipping_info(email)
+        return data.get("orders", [])
+
+    async def sale(self, order_id: int) -> dict | None:
         try:
-            sale = await _get(f"/api/sales/{sale_id}/")
-            info = email_info.get(sale_id, {})
-            orders.append({
-                "order_id": sale.get("id"),
-                "product_name": _product_name(sale),
-                "sale_price": sale.get("sale_price"),
-                "shipping_status": sale.get("shipping_status"),
-                "sale_date": sale.get("sale_date"),
-                "customer_name": info.get("customer_name", sale.get("customer", "—")),
-                "customer_email": info.get("customer_email", email),
-            })
+            return await _get(f"/api/sales/{order_id}/")
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                return None
+            raise
+
+    async def shipping_info(self, order_id: int) -> dict | None:
+        # 404 when the sale has no shipping info yet
+        try:
+            return await _get(f"/api/sales/shipping-info/{order_id}/get_shipping_info/")
         except httpx.HTTPStatusError:
-            continue
+            return None
+
+    async def unshipped(self, page: int, page_size: int) -> dict:
+        return await _get("/api/sales/unshipped/", params={"page": page, "page_size": page_size})
+
+    async def update_shipping_status(self, order_id: int, shipping_status: str) -> dict | None:
+        try:
+            return await _patch(
+                f"/api/sales/{order_id}/update_shipping_status/",
+                {"shipping_status": shipping_status},
+            )
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                return None
+            raise
+
+    async def bulk_update_shipping_status(self, order_ids: list[int], shipping_status: str) -> dict:
+        return await _patch(
+            "/api/sales/bulk_update_shipping_status/",
+            {"sale_ids": order_ids, "shipping_status": shipping_status},
+        )
+
+
+def setup_django() -> None:
+    """Configure Django for the in-process backend, unless the host app (stash_pro.asgi) already has."""
+    from django.apps import apps
+
+    if apps.ready:
+        return
+    if str(REPO_DIR) not in sys.path:
+        sys.path.append(str(REPO_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "stash_pro.settings")
+    import django
+
+    django.setup()
+
+
+class OrmBackend:
+    """
+    Tool data straight from the ORM in this process (MCP_BACKEND=orm), with
+    no HTTP round trip or JSON decoding. Lookups (orm_backend.py) run via
+    sync_to_async on a bounded thread pool, so they never block the event
+    loop and at most `workers` database connections are in use.
+    """
+
+    def __init__(self, org_slug: str, workers: int):
+        if not org_slug:
+            raise RuntimeError("DJANGO_ORG must name the organization when MCP_BACKEND=orm")
+        setup_django()
+        from asgiref.sync import sync_to_async
+        import orm_backend
+
+        self._org_slug = org_slug
+        self._impl = orm_backend
+        self._sync_to_async = sync_to_async
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mcp-orm")
+
+    async def _run(self, fn, *args):
+        return await self._sync_to_async(fn, thread_sensitive=False, executor=self._executor)(
+            self._org_slug, *args,
+        )
+
+    async def sales_by_email(self, email: str) -> list[dict]:
+        return await self._run(self._impl.sales_by_email, email)
+
+    async def sale(self, order_id: int) -> dict | None:
+        return await self._run(self._impl.sale, order_id)
+
+    async def shipping_info(self, order_id: int) -> dict | None:
+        return await self._run(self._impl.shipping_info, order_id)
+
+    async def unshipped(self, page: int, page_size: int) -> dict:
+        return await self._run(self._impl.unshipped, page, page_size)
+
+    async def update_shipping_status(self, order_id: int, shipping_status: str) -> dict | None:
+        return await self._run(self._impl.update_shipping_status, order_id, shipping_status)
+
+    async def bulk_update_shipping_status(self, order_ids: list[int], shipping_status: str) -> dict:
+        return await self._run(self._impl.bulk_update_shipping_status, order_ids, shipping_status)
+
+
+_backend: HttpBackend | OrmBackend | CachedBackend | None = None
 
+
+def get_backend() -> HttpBackend | OrmBackend | CachedBackend:
+    global _backend
+    if _backend is None:
+        _backend = OrmBackend(DJANGO_ORG, ORM_WORKERS) if MCP_BACKEND == "orm" else HttpBackend()
+        if CACHE_TTL > 0:
+            _backend = CachedBackend(_backend, TTLCache(CACHE_TTL, CACHE_MAX_ENTRIES))
+    return _backend
+
+
+# ---------------------------------------------------------------------------
+# Tools
+# ---------------------------------------------------------------------------
+
+@mcp.tool()
+async def get_order_by_email(email: str) -> dict:
+    """
+    Find all orders placed by a customer email address.
+
+    Returns order id, product name, sale_price, shipping_status,
+    sale_date, and customer_name for every matching order.
+    """
+    sales = await get_backend().sales_by_email(email)
+    orders = [_email_order(sale, sale.get("shipping_info") or {}, email) for sale in sales]
+
+    if not orders:
+        return {"orders": [], "message": f"No orders found for email: {email}"}
     return {"orders": orders, "total": len(orders)}
 
 
@@ -118,14 +339,12 @@ async def get_order_status(order_id: int) -> dict:
     Returns order id, product name, shipping_status, sale_date,
     customer_name, and any available shipping/tracking info.
     """
-    try:
-        sale = await _get(f"/api/sales/{order_id}/")
-    except httpx.HTTPStatusError as e:
-        if e.response.status_code == 404:
-            return {"error": f"Order {order_id} not found"}
-        raise
+    backend = get_backend()
+    sale, shipping = await asyncio.gather(backend.sale(order_id), backend.shipping_info(order_id))
+    if sale is None:
+        return {"error": f"Order {order_id} not found"}
 
-    result = {
+    return {
         "order_id": sale.get("id"),
         "product_name": _product_name(sale),
         "sale_price": sale.get("sale_price"),
@@ -135,71 +354,47 @@ async def get_order_status(order_id: int) -> dict:
         "customer": sale.get("customer"),
         "is_refunded": sale.get("is_refunded"),
         "refunded_at": sale.get("refunded_at"),
-        "shipping_info": None,
-    }
-
-    # Attempt to fetch shipping info (may 404 if not set)
-    try:
-        shipping = await _get(f"/api/sales/shipping-info/{order_id}/get_shipping_info/")
-        result["shipping_info"] = {
+        "shipping_info": {
             "customer_name": shipping.get("customer_name"),
             "customer_email": shipping.get("customer_email"),
             "customer_phone": shipping.get("customer_phone"),
             "customer_address": shipping.get("customer_address"),
             "customer_pincode": shipping.get("customer_pincode"),
-        }
-    except httpx.HTTPStatusError:
-        result["shipping_info"] = None
-
-    return result
+        } if shipping else None,
+    }
 
 
 @mcp.tool()
-async def get_unshipped_orders() -> dict:
+async def get_unshipped_orders(page: int = 1, page_size: int = 100) -> dict:
     """
-    Return all orders that have not yet been shipped.
+    Return orders that have not yet been shipped, oldest first, one page
+    at a time (page_size up to 1000).
 
     For each order returns: order_id, product_name, customer_name,
-    customer_email, sale_date, and current shipping_status.
+    customer_email, sale_date, days_since_sale and current shipping_status.
     """
-    data = await _get("/api/sales/unshipped/")
-
-    raw_sales = data.get("unshipped_sales", data) if isinstance(data, dict) else data
-
-    # Fetch shipping info to enrich with customer email
-    shipping_data = await _get("/api/sales/shipping-info/")
-    if isinstance(shipping_data, dict):
-        shipping_records = shipping_data.get("results", shipping_data.get("data", []))
-    else:
-        shipping_records = shipping_data
-
-    email_map: dict[int, str] = {}
-    name_map: dict[int, str] = {}
-    for rec in shipping_records:
-        sid = rec["sale"] if isinstance(rec.get("sale"), int) else rec.get("sale", {}).get("id")
-        if sid:
-            email_map[sid] = rec.get("customer_email", "")
-            name_map[sid] = rec.get("customer_name", "")
+    data = await get_backend().unshipped(page, page_size)
 
     orders = []
-    for sale in raw_sales:
-        sid = sale.get("id")
+    for sale in data.get("sales", []):
+        info = sale.get("shipping_info") or {}
         orders.append({
-            "order_id": sid,
+            "order_id": sale.get("id"),
             "product_name": _product_name(sale),
             "shipping_status": sale.get("shipping_status"),
             "sale_date": sale.get("sale_date"),
+            "days_since_sale": sale.get("days_since_sale"),
             "customer": sale.get("customer"),
-            "customer_name": name_map.get(sid, sale.get("customer", "—")),
-            "customer_email": email_map.get(sid, "—"),
+            "customer_name": info.get("customer_name") or sale.get("customer", "—"),
+            "customer_email": info.get("customer_email") or "—",
         })
 
-    total_unshipped = data.get("total_unshipped_items") if isinstance(data, dict) else len(orders)
-
     return {
         "orders": orders,
-        "count": len(orders),
-        "total_unshipped_items": total_unshipped,
+        "count": data.get("count", len(orders)),
+        "page": page,
+        "has_more": bool(data.get("next")),
+        "total_unshipped_items": data.get("total_unshipped_items"),
     }
 
 
@@ -220,15 +415,10 @@ async def update_shipping_status(order_id: int, status: str) -> dict:
             "error": f"Invalid status '{status}'. Must be one of: {', '.join(sorted(VALID_STATUSES))}"
         }
 
-    try:
-        result = await _patch(
-            f"/api/sales/{order_id}/update_shipping_status/",
-            {"shipping_status": status},
-        )
-    except httpx.HTTPStatusError as e:
-        if e.response.status_code == 404:
-            return {"error": f"Order {order_id} not found"}
-        raise
+    # The API stores the lowercase value (Sale.ShippingStatus)
+    result = await get_backend().update_shipping_status(order_id, status.lower())
+    if result is None:
+        return {"error": f"Order {order_id} not found"}
 
     return {
         "success": True,
@@ -238,13 +428,87 @@ async def update_shipping_status(order_id: int, status: str) -> dict:
     }
 
 
+MAX_BATCH_ORDERS = 1000
+
+
+@mcp.tool()
+async def update_shipping_statuses(order_ids: list[int], status: str) -> dict:
+    """
+    Update the shipping status of many orders at once, e.g. everything a
+    courier picked up, in one request (up to 1000 orders).
+
+    Valid values for status: SHIPPING_PENDING, SHIPPING_PLACED, SHIPPED.
+    Returns how many orders were updated and the ids that were not found.
+    """
+    status = status.upper().strip()
+    if status not in VALID_STATUSES:
+        return {
+            "error": f"Invalid status '{status}'. Must be one of: {', '.join(sorted(VALID_STATUSES))}"
+        }
+    order_ids = sorted(set(order_ids))
+    if not order_ids:
+        return {"error": "order_ids must not be empty"}
+    if len(order_ids) > MAX_BATCH_ORDERS:
+        return {"error": f"At most {MAX_BATCH_ORDERS} orders per call"}
+
+    result = await get_backend().bulk_update_shipping_status(order_ids, status.lower())
+    return {
+        "success": True,
+        "updated": result.get("updated"),
+        "not_found": result.get("not_found", []),
+        "new_shipping_status": result.get("shipping_status", status),
+        "message": f"{result.get('updated')} of {len(order_ids)} orders updated to {status}",
+    }
+
+
+@mcp.tool()
+async def get_cache_stats() -> dict:
+    """
+    Diagnostics for the server's response cache: TTL, live entries,
+    in-flight fetches, hits, misses, coalesced calls, hit ratio and
+    invalidations since start.
+    """
+    backend = get_backend()
+    if not isinstance(backend, CachedBackend):
+        return {"enabled": False}
+    return {"enabled": True, **backend.cache.stats()}
+
+
 # ---------------------------------------------------------------------------
 # Entry point
 # ---------------------------------------------------------------------------
 
-if __name__ == "__main__":
+def asgi_app():
+    """
+    The MCP SSE app behind the API-key check; served by serve() or mounted
+    into the Django ASGI app (stash_pro/asgi.py, MCP_MOUNT_PATH). Its
+    lifespan opens and closes the backend client; an app mounting it must
+    run that lifespan (mounted apps get no lifespan events). Refuses to
+    start without MCP_API_KEY.
+    """
+    if not MCP_API_KEY:
+        raise RuntimeError("MCP_API_KEY is not set; refusing to serve the MCP tools without a key")
+    get_backend()
     app = mcp.sse_app()
     app.add_middleware(APIKeyMiddleware)
 
+    sse_lifespan = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def lifespan(app):
+        async with http_client_lifespan(), sse_lifespan(app) as state:
+            yield state
+
+    app.router.lifespan_context = lifespan
+    return app
+
+
+async def serve(host: str = "0.0.0.0", port: int = 8001) -> None:
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+
+    server = uvicorn.Server(uvicorn.Config(asgi_app(), host=host, port=port, lifespan="on"))
+    await server.serve()
+
+
+if __name__ == "__main__":
+    asyncio.run(serve())
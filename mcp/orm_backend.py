@@ -0,0 +1,107 @@
+"""
+Backend lookups for the MCP server's in-process mode (MCP_BACKEND=orm).
+
+Each function returns what the matching Django API endpoint returns, built
+from the same querysets (sales.lookups) and serializers, so tool outputs do
+not depend on the backend. They are synchronous; mcp_server runs them on
+its bounded thread pool. Django must be set up before this is imported.
+"""
+from contextlib import contextmanager
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.paginator import Paginator
+from django.db import close_old_connections
+from django.utils import timezone
+
+from accounts.mixins import get_org_timezone
+from accounts.models import Organization
+from sales.lookups import (
+    bulk_set_shipping_status, latest_shipping_info, sales_by_email as _sales_by_email, unshipped_sales,
+)
+from sales.models import Sale
+from sales.serializers import SaleSerializer, ShippingInfoSerializer, UnshippedSaleSerializer
+from stash_pro.db_router import use_replica
+from stash_pro.pagination import StandardPagination
+
+
+@contextmanager
+def _org_scope(org_slug):
+    """
+    What a request to the API gets: fresh database connections and the
+    org's timezone, so dates serialize the same way.
+    """
+    close_old_connections()
+    try:
+        org = Organization.objects.filter(slug=org_slug).first()
+        if org is None:
+            raise ImproperlyConfigured(f"Organization '{org_slug}' does not exist")
+        timezone.activate(get_org_timezone(org))
+        yield org
+    finally:
+        timezone.deactivate()
+        close_old_connections()
+
+
+def sales_by_email(org_slug, email):
+    """The sales shipped to an email, each with its shipping_info (GET /api/sales/by_email/)."""
+    with _org_scope(org_slug) as org, use_replica():
+        orders = []
+        for sale, info in _sales_by_email(org, email):
+            data = SaleSerializer(sale).data
+            data['shipping_info'] = ShippingInfoSerializer(info).data
+            orders.append(data)
+        return orders
+
+
+def sale(org_slug, order_id):
+    """One sale (GET /api/sales/<id>/), or None."""
+    with _org_scope(org_slug) as org, use_replica():
+        obj = Sale.objects.filter(organization=org, pk=order_id).select_related('product').first()
+        return SaleSerializer(obj).data if obj else None
+
+
+def shipping_info(org_slug, order_id):
+    """A sale's latest shipping info (GET /api/sales/shipping-info/<id>/get_shipping_info/), or None."""
+    with _org_scope(org_slug) as org, use_replica():
+        info = latest_shipping_info(order_id, org)
+        return ShippingInfoSerializer(info).data if info else None
+
+
+def unshipped(org_slug, page, page_size):
+    """
+    One page of unshipped sales (GET /api/sales/unshipped/); next and
+    previous are booleans rather than links. An out-of-range page raises
+    EmptyPage where the API answers 404.
+    """
+    if page_size <= 0:
+        page_size = StandardPagination.page_size
+    page_size = min(page_size, StandardPagination.max_page_size)
+
+    with _org_scope(org_slug) as org, use_replica():
+        sales, total_items = unshipped_sales(Sale.objects.filter(organization=org))
+        current = Paginator(sales, page_size).page(page)
+        return {
+            "total_unshipped_items": total_items,
+            "count": current.paginator.count,
+            "next": current.has_next(),
+            "previous": current.has_previous(),
+            "sales": UnshippedSaleSerializer(current.object_list, many=True).data,
+        }
+
+
+def update_shipping_status(org_slug, order_id, shipping_status):
+    """Set a sale's shipping status (PATCH /api/sales/<id>/update_shipping_status/); None if not found."""
+    with _org_scope(org_slug) as org:
+        obj = Sale.objects.filter(organization=org, pk=order_id).select_related('product').first()
+        if obj is None:
+            return None
+        obj.shipping_status = shipping_status
+        obj.save()
+        return SaleSerializer(obj).data
+
+
+def bulk_update_shipping_status(org_slug, order_ids, shipping_status):
+    """Set one shipping status on many sales in one UPDATE (PATCH /api/sales/bulk_update_shipping_status/)."""
+    with _org_scope(org_slug) as org:
+        updated, not_found = bulk_set_shipping_status(Sale.objects.filter(organization=org), order_ids, shipping_status)
+        return {"shipping_status": shipping_status, "updated": updated, "not_found": not_found}
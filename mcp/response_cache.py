@@ -0,0 +1,135 @@
+"""
+Response cache for the MCP server's backend lookups (MCP_CACHE_TTL).
+
+Kept apart from mcp_server so it has no dependencies beyond asyncio.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Async cache whose entries expire after ttl seconds, with single-flight
+    fetches: concurrent callers of a missing key await one shared fetch
+    instead of each calling the backend.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()  # key -> (expires_at, value), oldest first
+        self._inflight: dict = {}  # key -> asyncio.Task
+        # Bumped on invalidation so a fetch that started before it is not stored
+        self._generation = 0
+        self.hits = self.misses = self.coalesced = self.invalidations = 0
+
+    async def get(self, key, fetch):
+        """The cached value for key, or the result of awaiting fetch()."""
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._fetch(key, fetch))
+            # Mark a failure as seen even if every caller was cancelled
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        else:
+            self.coalesced += 1
+        # A cancelled caller must not cancel the fetch others are waiting on
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key, fetch):
+        generation = self._generation
+        try:
+            value = await fetch()
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+        if generation == self._generation:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, match) -> int:
+        """Drop entries for which match(key, value) is true; returns how many."""
+        self._generation += 1
+        stale = [key for key, (_, value) in self._entries.items() if match(key, value)]
+        for key in stale:
+            del self._entries[key]
+        # Later callers start a new fetch rather than join one that may be stale
+        for key in [key for key in self._inflight if match(key, None)]:
+            del self._inflight[key]
+        self.invalidations += len(stale)
+        return len(stale)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "ttl_seconds": self.ttl,
+            "entries": sum(1 for expires, _ in self._entries.values() if expires > now),
+            "in_flight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 3) if lookups else None,
+            "invalidations": self.invalidations,
+        }
+
+
+class CachedBackend:
+    """
+    Serves a backend's lookups through a TTLCache. Status updates go
+    straight to the backend and drop the cached entries they change: the
+    order itself, every unshipped page, and email lookups listing it.
+    """
+
+    def __init__(self, backend, cache: TTLCache):
+        self.backend = backend
+        self.cache = cache
+
+    async def sales_by_email(self, email: str) -> list[dict]:
+        email = email.strip().lower()
+        return await self.cache.get(("sales_by_email", email), lambda: self.backend.sales_by_email(email))
+
+    async def sale(self, order_id: int) -> dict | None:
+        return await self.cache.get(("sale", order_id), lambda: self.backend.sale(order_id))
+
+    async def shipping_info(self, order_id: int) -> dict | None:
+        return await self.cache.get(("shipping_info", order_id), lambda: self.backend.shipping_info(order_id))
+
+    async def unshipped(self, page: int, page_size: int) -> dict:
+        return await self.cache.get(("unshipped", page, page_size), lambda: self.backend.unshipped(page, page_size))
+
+    async def update_shipping_status(self, order_id: int, shipping_status: str) -> dict | None:
+        result = await self.backend.update_shipping_status(order_id, shipping_status)
+        self.invalidate_orders({order_id})
+        return result
+
+    async def bulk_update_shipping_status(self, order_ids: list[int], shipping_status: str) -> dict:
+        try:
+            return await self.backend.bulk_update_shipping_status(order_ids, shipping_status)
+        finally:
+            # Some sales may have changed even if the response was lost
+            self.invalidate_orders(set(order_ids))
+
+    def invalidate_orders(self, order_ids: set[int]) -> int:
+        def affected(key, value):
+            kind = key[0]
+            if kind == "sale":
+                return key[1] in order_ids
+            if kind == "unshipped":
+                return True
+            if kind == "sales_by_email":
+                # In-flight lookups have no value yet; assume they list the order
+                return value is None or any(sale.get("id") in order_ids for sale in value)
+            return False
+
+        return self.cache.invalidate(affected)
@@ -0,0 +1,65 @@
+"""
+Sale lookups and bulk updates shared by the sales API and the MCP server's
+in-process backend, so both return the same rows for the same question.
+"""
+from django.db.models import DurationField, ExpressionWrapper, F, Prefetch, Sum
+from django.utils.timezone import now
+
+from .models import Sale, ShippingInfo
+
+
+def sales_by_email(org, email):
+    """
+    (sale, shipping info) pairs for the sales shipped to a customer email
+    (case-insensitive), newest first, in one query. A sale with several
+    shipping records appears once, with its latest.
+    """
+    infos = ShippingInfo.objects.filter(customer_email__iexact=email)
+    if org:
+        infos = infos.filter(sale__organization=org)
+    infos = infos.select_related('sale__product', 'sale__funded_by_user').order_by('-sale__sale_date', '-id')
+
+    sales = {}
+    for info in infos:
+        sales.setdefault(info.sale_id, (info.sale, info))
+    return list(sales.values())
+
+
+def unshipped_sales(queryset):
+    """
+    The pending sales in queryset, oldest first, with their shipping info
+    prefetched newest first and a sale_age annotation; returns
+    (sales, total unshipped items).
+    """
+    pending = queryset.filter(shipping_status=Sale.ShippingStatus.SHIPPING_PENDING)
+    total_items = pending.aggregate(total_items=Sum('quantity_sold'))['total_items'] or 0
+
+    pending = pending.select_related('funded_by_user').prefetch_related(
+        Prefetch('shipping_info', queryset=ShippingInfo.objects.order_by('-id')),
+    ).annotate(
+        sale_age=ExpressionWrapper(now() - F('sale_date'), output_field=DurationField()),
+    ).order_by('sale_date', 'id')
+    return pending, total_items
+
+
+def latest_shipping_info(sale_id, org=None):
+    """The newest shipping record of a sale, or None."""
+    infos = ShippingInfo.objects.filter(sale_id=sale_id)
+    if org:
+        infos = infos.filter(sale__organization=org)
+    return infos.order_by('-id').first()
+
+
+def bulk_set_shipping_status(queryset, sale_ids, shipping_status):
+    """
+    Set shipping_status on the sales in queryset with the given ids in one
+    UPDATE; returns (number updated, sorted ids not found). The ids are only
+    looked up again when some were not updated.
+    """
+    sale_ids = set(sale_ids)
+    sales = queryset.filter(id__in=sale_ids)
+    updated = sales.update(shipping_status=shipping_status, updated_at=now())
+    not_found = []
+    if updated < len(sale_ids):
+        not_found = sorted(sale_ids - set(sales.values_list('id', flat=True)))
+    return updated, not_found
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:13
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0011_sale_cost_price_sale_funded_by_user_sale_org_revenue_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shippinginfo',
+            index=models.Index(django.db.models.functions.text.Upper('customer_email'), name='shipping_info_email_upper'),
+        ),
+    ]
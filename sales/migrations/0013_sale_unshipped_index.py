@@ -0,0 +1,17 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0012_shippinginfo_email_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['organization', 'shipping_status', 'sale_date'], name='sale_org_status_date'),
+        ),
+    ]
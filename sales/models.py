@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Upper
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
 
@@ -38,6 +39,12 @@ class Sale(BaseModel):
     user_payout = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     org_revenue = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
+    class Meta:
+        indexes = [
+            # Unshipped queue: an org's pending sales, oldest first
+            models.Index(fields=['organization', 'shipping_status', 'sale_date'], name='sale_org_status_date'),
+        ]
+
     def calculate_split(self):
         """Calculate revenue split based on funding source."""
         total = self.sale_price * self.quantity_sold
@@ -65,4 +72,10 @@ class ShippingInfo(BaseModel):
     customer_phone = models.CharField(max_length=255)
     customer_address = models.TextField()
     customer_pincode = models.CharField(max_length=255)
-    sale = models.ForeignKey(Sale, on_delete=models.CASCADE, related_name="shipping_info")
\ No newline at end of file
+    sale = models.ForeignKey(Sale, on_delete=models.CASCADE, related_name="shipping_info")
+
+    class Meta:
+        indexes = [
+            # Serves case-insensitive email lookups (iexact compares UPPER())
+            models.Index(Upper('customer_email'), name='shipping_info_email_upper'),
+        ]
\ No newline at end of file
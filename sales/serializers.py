@@ -146,4 +146,19 @@ class SaleSerializer(serializers.ModelSerializer):
 class ShippingInfoSerializer(serializers.ModelSerializer):
     class Meta:
         model = ShippingInfo
-        fields = ('id', 'customer_name', 'customer_email', 'customer_phone', 'customer_address', 'customer_pincode')
\ No newline at end of file
+        fields = ('id', 'customer_name', 'customer_email', 'customer_phone', 'customer_address', 'customer_pincode')
+
+
+class UnshippedSaleSerializer(SaleSerializer):
+    """Sale with its latest shipping info; days_since_sale comes from the sale_age annotation."""
+    shipping_info = serializers.SerializerMethodField()
+
+    class Meta(SaleSerializer.Meta):
+        fields = SaleSerializer.Meta.fields + ('shipping_info',)
+
+    def get_days_since_sale(self, obj):
+        return obj.sale_age.days
+
+    def get_shipping_info(self, obj):
+        infos = obj.shipping_info.all()  # Prefetched newest first
+        return ShippingInfoSerializer(infos[0]).data if infos else None
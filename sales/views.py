@@ -1,11 +1,11 @@
 from rest_framework.decorators import action
 from rest_framework import viewsets, status
 from .models import Sale, ShippingInfo
-from .serializers import SaleSerializer, ShippingInfoSerializer
+from .serializers import SaleSerializer, ShippingInfoSerializer, UnshippedSaleSerializer
+from .lookups import bulk_set_shipping_status, latest_shipping_info, sales_by_email, unshipped_sales
 from rest_framework.response import Response
-from django.db.models import Sum, F, ExpressionWrapper, DurationField, Count, DateField
-from django.utils.timezone import now, make_aware
-from datetime import datetime, timedelta
+from django.db.models import Sum, F, Count
+from django.utils.timezone import now, localtime
 from django_filters import rest_framework as filters
 from rest_framework.filters import SearchFilter, OrderingFilter
 from django.db import transaction
@@ -14,7 +14,15 @@ from drf_spectacular.types import OpenApiTypes
 from expense.models import Expenses
 from rest_framework.permissions import IsAuthenticated
 from accounts.permissions import HasModelPermission
-from accounts.mixins import OrgQuerysetMixin
+from accounts.mixins import OrgQuerysetMixin, OrgTimezoneMixin, resolve_org
+from stash_pro.db_router import ReplicaReadMixin
+from stash_pro.exports import ExportMixin
+from stash_pro.pagination import StandardPagination
+from analytics.buckets import GRANULARITIES, parse_granularity, bucket, fill_series
+from analytics.periods import (
+    COMPARE_MODES, resolve_window, display_end, comparison_window,
+    window_q, period_case, any_of, deltas,
+)
 
 
 class SaleFilter(filters.FilterSet):
@@ -28,7 +36,7 @@ class SaleFilter(filters.FilterSet):
         fields = ['start_date', 'end_date', 'shipping_status', 'is_refunded']
 
 
-class SaleViewSet(OrgQuerysetMixin, viewsets.ModelViewSet):
+class SaleViewSet(ReplicaReadMixin, OrgTimezoneMixin, OrgQuerysetMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = Sale.objects.all()
     serializer_class = SaleSerializer
     permission_classes = [IsAuthenticated, HasModelPermission]
@@ -40,6 +48,16 @@ class SaleViewSet(OrgQuerysetMixin, viewsets.ModelViewSet):
     search_fields = ['customer', 'product__name']
     ordering_fields = ['id', 'sale_date', 'sale_price']
     ordering = ['id']
+    BULK_STATUS_MAX_SALES = 1000
+    export_filename = 'sales'
+    export_columns = [
+        ('ID', 'id'), ('Sale date', 'sale_date'), ('Product ID', 'product_id'), ('Product', 'product__name'),
+        ('Quantity', 'quantity_sold'), ('Sale price', 'sale_price'), ('Customer', 'customer'),
+        ('Shipping status', 'shipping_status'), ('Shopify order ID', 'shopify_order_id'),
+        ('Shopify order', 'shopify_order_name'), ('Tracking number', 'tracking_number'),
+        ('Refunded', 'is_refunded'), ('Refunded at', 'refunded_at'), ('Cost price', 'cost_price'),
+        ('User payout', 'user_payout'), ('Org revenue', 'org_revenue'), ('Funded by', 'funded_by_user__username'),
+    ]
 
     def destroy(self, request, *args, **kwargs):
         """
@@ -57,72 +75,66 @@ class SaleViewSet(OrgQuerysetMixin, viewsets.ModelViewSet):
         self.perform_destroy(instance)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    def get_date_range(self, duration):
-        """Get the start and end dates based on the duration parameter"""
-        current_date = now()
-        
-        if duration == "last_month":
-            # Calculate last month
-            if current_date.month == 1:
-                last_month = 12
-                last_month_year = current_date.year - 1
-            else:
-                last_month = current_date.month - 1
-                last_month_year = current_date.year
-            
-            start_date = make_aware(datetime(last_month_year, last_month, 1))
-            if last_month == 12:
-                end_date = make_aware(datetime(last_month_year + 1, 1, 1)) - timedelta(days=1)
-            else:
-                end_date = make_aware(datetime(last_month_year, last_month + 1, 1)) - timedelta(days=1)
-                
-        elif duration == "current_year":
-            # Current year from January 1st to current date
-            start_date = make_aware(datetime(current_date.year, 1, 1))
-            end_date = current_date
-            
-        else:  # "current_month" (default)
-            # Current month from 1st to current date
-            start_date = make_aware(datetime(current_date.year, current_date.month, 1))
-            end_date = current_date
-        
-        return start_date, end_date
-
-    def parse_custom_date(self, date_str):
-        """Parse a date string in YYYY-MM-DD format"""
-        try:
-            parsed_date = datetime.strptime(date_str, "%Y-%m-%d")
-            return make_aware(parsed_date)
-        except (ValueError, TypeError):
-            return None
-
+    @extend_schema(
+        summary="Unshipped sales",
+        description="The organization's pending sales, oldest first and paginated, each with its product and latest shipping info.",
+        parameters=[
+            OpenApiParameter(name='page', type=OpenApiTypes.INT, location=OpenApiParameter.QUERY, required=False),
+            OpenApiParameter(name='page_size', type=OpenApiTypes.INT, location=OpenApiParameter.QUERY, required=False),
+        ],
+    )
     @action(detail=False, methods=["get"])
     def unshipped(self, request):
         """
-        Returns all unshipped sale items.
+        Returns unshipped sale items, oldest sale first.
         """
-        unshipped_sales = Sale.objects.filter(shipping_status=Sale.ShippingStatus.SHIPPING_PENDING).annotate(
-            days_since_sale=ExpressionWrapper(
-                now() - F('sale_date'), output_field=DurationField()
-            )
-        ).order_by('-days_since_sale')
-
-        # Total unshipped items
-        total_unshipped_items = unshipped_sales.aggregate(total_items=Sum('quantity_sold'))['total_items'] or 0
+        unshipped, total_unshipped_items = unshipped_sales(self.get_queryset())
 
-        # Serialize the data
-        serializer = self.get_serializer(unshipped_sales, many=True)
+        paginator = StandardPagination()
+        page = paginator.paginate_queryset(unshipped, request, view=self)
+        serializer = UnshippedSaleSerializer(page, many=True, context=self.get_serializer_context())
 
-        response_data = {
+        return Response({
             "total_unshipped_items": total_unshipped_items,
+            "count": paginator.page.paginator.count,
+            "next": paginator.get_next_link(),
+            "previous": paginator.get_previous_link(),
             "sales": serializer.data,
-        }
+        })
+
+    @extend_schema(
+        summary="Find sales by customer email",
+        description="Sales whose shipping info has the given customer email (case-insensitive), with that shipping info, in one query.",
+        parameters=[
+            OpenApiParameter(
+                name='email',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='Customer email address',
+                required=True,
+            ),
+        ],
+    )
+    @action(detail=False, methods=["get"])
+    def by_email(self, request):
+        """
+        Returns the sales shipped to a customer email, newest first.
+        """
+        email = request.query_params.get('email', '').strip()
+        if not email:
+            return Response({"error": "email is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(response_data)
+        org, _ = resolve_org(request)
+        orders = []
+        for sale, info in sales_by_email(org, email):
+            data = self.get_serializer(sale).data
+            data['shipping_info'] = ShippingInfoSerializer(info).data
+            orders.append(data)
+        return Response({"email": email, "count": len(orders), "orders": orders})
 
     @extend_schema(
         summary="Get daily sales data",
-        description="Returns daily sales data for the specified date range. Use custom start_date/end_date or preset duration.",
+        description="Returns sales bucketed by day (or the requested granularity) for the specified date range. Use custom start_date/end_date or preset duration.",
         parameters=[
             OpenApiParameter(
                 name='start_date',
@@ -146,6 +158,22 @@ class SaleViewSet(OrgQuerysetMixin, viewsets.ModelViewSet):
                 required=False,
                 enum=['current_month', 'last_month', 'current_year'],
             ),
+            OpenApiParameter(
+                name='compare',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='Also return the previous period or the same period last year, computed in the same query',
+                required=False,
+                enum=COMPARE_MODES,
+            ),
+            OpenApiParameter(
+                name='granularity',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description="Bucket size, in the organization's timezone (default: day)",
+                required=False,
+                enum=GRANULARITIES,
+            ),
         ],
     )
     @action(detail=False, methods=["get"])
@@ -154,103 +182,103 @@ class SaleViewSet(OrgQuerysetMixin, viewsets.ModelViewSet):
         Returns daily sales data based on the duration parameter or custom date range.
         Duration options: current_month, last_month, current_year
         If no dates are provided (or invalid), returns all sales data without date filtering.
+        With compare=previous_period|previous_year the comparison window is
+        bucketed into the same grouped query and returned with deltas.
+        granularity=day|week|month|quarter|year sets the bucket size; dates
+        are truncated in the database, in the organization's timezone.
         """
-        # Check for custom date range first
-        start_date_param = request.query_params.get('start_date')
-        end_date_param = request.query_params.get('end_date')
-        
-        custom_start = self.parse_custom_date(start_date_param)
-        custom_end = self.parse_custom_date(end_date_param)
-        
-        # Check for duration parameter
-        duration = request.query_params.get('duration')
-        
-        start_date = None
-        end_date = None
-        
-        # If both custom dates are provided and valid, use them
-        if custom_start and custom_end:
-            if custom_start > custom_end:
+        try:
+            duration, start_date, stop_date = resolve_window(request.query_params)
+            granularity = parse_granularity(request.query_params.get('granularity'))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        compare = request.query_params.get('compare')
+        if compare:
+            if compare not in COMPARE_MODES:
                 return Response(
-                    {"error": "start_date must be before or equal to end_date"},
+                    {"error": f"Invalid compare mode. Valid options are: {', '.join(COMPARE_MODES)}"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            start_date = custom_start
-            end_date = custom_end.replace(hour=23, minute=59, second=59)
-            duration = "custom"
-        elif duration:
-            # Use duration-based logic only if duration is explicitly provided
-            valid_durations = ['current_month', 'last_month', 'current_year']
-            if duration in valid_durations:
-                start_date, end_date = self.get_date_range(duration)
-            # If duration is invalid, we'll return all data (start_date and end_date stay None)
-        
-        # Build base queryset
-        sales_queryset = Sale.objects.all()
-        
-        # Apply date filters only if we have valid dates
-        if start_date and end_date:
-            sales_queryset = sales_queryset.filter(
-                sale_date__gte=start_date,
-                sale_date__lte=end_date
-            )
-        
-        # Get sales data grouped by date
-        sales_data = sales_queryset.annotate(
-            date=ExpressionWrapper(
-                F('sale_date__date'),
-                output_field=DateField()
-            )
-        ).values('date').annotate(
+            if not start_date:
+                return Response(
+                    {"error": "compare requires a date range or duration"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        windows = {'current': (start_date, stop_date)}
+        if compare:
+            windows['previous'] = comparison_window(duration, start_date, stop_date, compare)
+        conditions = {
+            label: window_q('sale_date', start, stop) for label, (start, stop) in windows.items()
+        }
+
+        # Get sales data grouped by period and bucket in one query
+        sales_data = self.get_queryset().filter(any_of(conditions)).annotate(
+            period=period_case(conditions),
+            date=bucket('sale_date', granularity),
+        ).values('period', 'date').annotate(
             total_sales=Count('id'),
             total_amount=Sum(F('quantity_sold') * F('sale_price'))
         ).order_by('date')
 
-        # If we have date range, create a list of all dates
-        if start_date and end_date:
-            all_dates = []
-            current = start_date.date()
-            while current <= end_date.date():
-                all_dates.append(current)
-                current += timedelta(days=1)
-
-            # Create response data with all dates, including those with no sales
-            response_data = []
-            for date in all_dates:
-                date_str = date.strftime("%Y-%m-%d")
-                sales_for_date = next(
-                    (item for item in sales_data if item['date'] == date),
-                    {'total_sales': 0, 'total_amount': 0}
-                )
-                response_data.append({
-                    "date": date_str,
-                    "total_sales": sales_for_date['total_sales'],
-                    "total_amount": float(sales_for_date['total_amount'] or 0)
-                })
-            
-            return Response({
-                "duration": duration,
-                "start_date": start_date.strftime("%Y-%m-%d"),
-                "end_date": end_date.strftime("%Y-%m-%d"),
-                "daily_sales": response_data
-            })
-        else:
-            # No date filter - return all sales grouped by date
-            response_data = []
-            for item in sales_data:
-                response_data.append({
-                    "date": item['date'].strftime("%Y-%m-%d") if item['date'] else None,
-                    "total_sales": item['total_sales'],
-                    "total_amount": float(item['total_amount'] or 0)
-                })
-            
+        by_period = {label: {} for label in windows}
+        for item in sales_data:
+            by_period[item['period']][item['date']] = item
+
+        if not start_date:
+            # No date filter - return all sales from the first to the last bucket with data
             return Response({
                 "duration": "all",
+                "granularity": granularity,
                 "start_date": None,
                 "end_date": None,
-                "daily_sales": response_data
+                "daily_sales": self._series(by_period['current'], granularity),
             })
 
+        response = {
+            "duration": duration,
+            "granularity": granularity,
+            "start_date": start_date.strftime("%Y-%m-%d"),
+            "end_date": display_end(stop_date).strftime("%Y-%m-%d"),
+            "daily_sales": self._series(by_period['current'], granularity, start_date, stop_date),
+        }
+
+        if compare:
+            prev_start, prev_stop = windows['previous']
+            previous_series = self._series(by_period['previous'], granularity, prev_start, prev_stop)
+            totals = {
+                label: {
+                    "total_sales": sum(item['total_sales'] for item in series),
+                    "total_amount": sum(item['total_amount'] for item in series),
+                }
+                for label, series in (('current', response['daily_sales']), ('previous', previous_series))
+            }
+            response["comparison"] = {
+                "mode": compare,
+                "start_date": prev_start.strftime("%Y-%m-%d"),
+                "end_date": display_end(prev_stop).strftime("%Y-%m-%d"),
+                "daily_sales": previous_series,
+                "totals": totals,
+                "deltas": deltas(totals['current'], totals['previous'], ['total_sales', 'total_amount']),
+            }
+
+        return Response(response)
+
+    @staticmethod
+    def _series(rows_by_date, granularity, start=None, stop=None):
+        """One entry per bucket, including buckets with no sales."""
+        first = localtime(start).date() if start else None
+        last = localtime(display_end(stop)).date() if stop else None
+        return [
+            {
+                "date": date.strftime("%Y-%m-%d"),
+                "total_sales": row['total_sales'] if row else 0,
+                "total_amount": float(row['total_amount'] or 0) if row else 0.0,
+            }
+            for date, row in fill_series(rows_by_date, granularity, first, last)
+        ]
+
     @action(detail=True, methods=["patch"])
     def update_shipping_status(self, request, pk=None):
         """
@@ -288,6 +316,51 @@ class SaleViewSet(OrgQuerysetMixin, viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    @extend_schema(
+        summary="Bulk update shipping status",
+        description="Sets one shipping status on many of the organization's sales in a single UPDATE.",
+        request={
+            'application/json': {
+                'type': 'object',
+                'properties': {
+                    'sale_ids': {'type': 'array', 'items': {'type': 'integer'}},
+                    'shipping_status': {'type': 'string', 'enum': Sale.ShippingStatus.values},
+                },
+                'example': {'sale_ids': [12, 13, 14], 'shipping_status': 'shipped'}
+            }
+        },
+    )
+    @action(detail=False, methods=["patch"])
+    def bulk_update_shipping_status(self, request):
+        """
+        Update the shipping status of many sale items at once. Returns the
+        number updated and the ids that were not found.
+        """
+        sale_ids = request.data.get('sale_ids')
+        new_status = request.data.get('shipping_status')
+
+        if not new_status:
+            return Response({"error": "shipping_status is required"}, status=status.HTTP_400_BAD_REQUEST)
+        if new_status not in Sale.ShippingStatus.values:
+            return Response(
+                {"error": f"Invalid shipping status. Valid options are: {', '.join(Sale.ShippingStatus.values)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not isinstance(sale_ids, list) or not sale_ids:
+            return Response({"error": "sale_ids must be a non-empty list"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(sale_ids) > self.BULK_STATUS_MAX_SALES:
+            return Response(
+                {"error": f"At most {self.BULK_STATUS_MAX_SALES} sales per request"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            sale_ids = {int(sale_id) for sale_id in sale_ids}
+        except (TypeError, ValueError):
+            return Response({"error": "sale_ids must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+
+        updated, not_found = bulk_set_shipping_status(self.get_queryset(), sale_ids, new_status)
+        return Response({"shipping_status": new_status, "updated": updated, "not_found": not_found})
+
     @extend_schema(
         summary="Mark sale as refund",
         description="Marks a sale as refunded. Restores product quantity and creates a refund expense.",
@@ -375,7 +448,11 @@ class ShippingInfoViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=["get"])
     def get_shipping_info(self, request, pk=None):
-        shipping_info = self.get_object().shipping_info
+        """
+        Returns the latest shipping info of the sale with this id.
+        """
+        org, _ = resolve_org(request)
+        shipping_info = latest_shipping_info(pk, org)
         if shipping_info:
             serializer = self.get_serializer(shipping_info)
             return Response(serializer.data)
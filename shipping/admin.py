@@ -0,0 +1,28 @@
+from django.contrib import admin
+from .models import ShopifySyncState, ShopifyOrder, ShopifyWebhookEvent, FulfillmentRequest
+
+
+@admin.register(ShopifySyncState)
+class ShopifySyncStateAdmin(admin.ModelAdmin):
+    list_display = ("organization", "updated_at_min", "last_synced_at", "last_full_sync_at", "last_fetched_count")
+
+
+@admin.register(ShopifyOrder)
+class ShopifyOrderAdmin(admin.ModelAdmin):
+    list_display = ("name", "organization", "shopify_order_id", "shopify_updated_at", "fetched_at")
+    search_fields = ("name", "shopify_order_id")
+    list_filter = ("organization",)
+
+
+@admin.register(ShopifyWebhookEvent)
+class ShopifyWebhookEventAdmin(admin.ModelAdmin):
+    list_display = ("topic", "shopify_order_id", "organization", "status", "attempts", "received_at", "processed_at")
+    search_fields = ("shopify_order_id", "webhook_id")
+    list_filter = ("status", "topic", "organization")
+
+
+@admin.register(FulfillmentRequest)
+class FulfillmentRequestAdmin(admin.ModelAdmin):
+    list_display = ("shopify_order_id", "tracking_number", "organization", "status", "attempts", "next_attempt_at", "delivered_at")
+    search_fields = ("shopify_order_id", "tracking_number", "idempotency_key")
+    list_filter = ("status", "organization")
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class ShippingConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'shipping'
+
+    def ready(self):
+        from . import signals
+        signals.connect()
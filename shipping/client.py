@@ -0,0 +1,307 @@
+"""
+HTTP client for the Shopify Admin REST API.
+
+One ShopifyClient per store keeps a pooled requests.Session, paces calls
+with a leaky-bucket limiter fed by the X-Shopify-Shop-Api-Call-Limit header,
+retries 429s and 5xx responses with jittered exponential backoff (honouring
+Retry-After) and records per-call latency. get_org_client hands each
+organization the client for its own store; the SHOPIFY_STORE store from
+the environment serves only calls without an organization and the one
+organization named by SHOPIFY_STORE_ORG.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+API_VERSION = '2024-01'
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+
+class ShopifyRateLimiter:
+    """
+    Client-side mirror of Shopify's leaky bucket: `capacity` calls that drain
+    at `leak_rate` per second. acquire() blocks until a call fits, and
+    update() resyncs the level from the call-limit header ("32/40").
+    """
+
+    def __init__(self, capacity=40, leak_rate=2.0, headroom=2, clock=time.monotonic, sleep=time.sleep):
+        self.capacity = capacity
+        self.leak_rate = leak_rate
+        self.headroom = headroom
+        self._clock = clock
+        self._sleep = sleep
+        self._level = 0.0
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _drain(self, now):
+        self._level = max(0.0, self._level - (now - self._updated) * self.leak_rate)
+        self._updated = now
+
+    def acquire(self):
+        """Reserve room for one call; returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._drain(self._clock())
+                if self._level + 1 <= self.capacity - self.headroom:
+                    self._level += 1
+                    return waited
+                wait = (self._level + 1 - (self.capacity - self.headroom)) / self.leak_rate
+            self._sleep(wait)
+            waited += wait
+
+    def update(self, header):
+        """Adopt the level Shopify reported, e.g. "32/40"."""
+        try:
+            used, capacity = (int(part) for part in header.split('/'))
+        except (AttributeError, ValueError):
+            return
+        with self._lock:
+            self._drain(self._clock())
+            self.capacity = capacity
+            self._level = float(used)
+
+
+class ShopifyMetrics:
+    """Per-client call counters and recent latencies."""
+
+    def __init__(self, window=500):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.errors = 0
+        self.throttled_seconds = 0.0
+        self.latencies = deque(maxlen=window)
+
+    def record(self, method, path, status_code, seconds, attempts, throttled):
+        with self._lock:
+            self.calls += 1
+            self.retries += attempts - 1
+            self.throttled_seconds += throttled
+            if status_code is None or status_code >= 400:
+                self.errors += 1
+            self.latencies.append(seconds)
+        logger.debug(
+            "shopify %s %s -> %s in %.3fs (attempts=%s, throttled=%.2fs)",
+            method, path, status_code, seconds, attempts, throttled,
+        )
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            return {
+                'calls': self.calls,
+                'retries': self.retries,
+                'errors': self.errors,
+                'throttled_seconds': round(self.throttled_seconds, 3),
+                'latency_p50': latencies[len(latencies) // 2] if latencies else None,
+                'latency_p95': latencies[int(len(latencies) * 0.95)] if latencies else None,
+                'latency_max': latencies[-1] if latencies else None,
+            }
+
+
+class ShopifyClient:
+    """Pooled, rate-limited Shopify Admin API client for one store."""
+
+    def __init__(self, store, access_token, max_retries=4, backoff_base=0.5, backoff_cap=30.0,
+                 timeout=30, pool_size=10, sleep=time.sleep):
+        # A full base URL (scheme included) is accepted for local fakes and proxies
+        base = store.rstrip('/') if '://' in store else f"https://{store}"
+        self.base_url = f"{base}/admin/api/{API_VERSION}/"
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = timeout
+        self._sleep = sleep
+
+        self.session = requests.Session()
+        self.session.headers['X-Shopify-Access-Token'] = access_token
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.limiter = ShopifyRateLimiter(sleep=sleep)
+        self.metrics = ShopifyMetrics()
+
+    def url(self, path):
+        return path if '://' in path else self.base_url + path
+
+    def _backoff(self, attempt, response):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        delay = min(self.backoff_cap, self.backoff_base * 2 ** attempt)
+        return random.uniform(delay / 2, delay)
+
+    def request(self, method, path, **kwargs):
+        """
+        Send a request, retrying 429s. Idempotent methods also retry 5xx
+        responses and connection errors; a POST that may have reached Shopify
+        is not repeated. Raises requests.HTTPError for a final error response.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        url = self.url(path)
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        retry_statuses = RETRY_STATUSES if idempotent else {429}
+        throttled = 0.0
+        started = time.monotonic()
+        response = None
+
+        for attempt in range(self.max_retries + 1):
+            throttled += self.limiter.acquire()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.ConnectionError:
+                if attempt == self.max_retries or not idempotent:
+                    self.metrics.record(method, path, None, time.monotonic() - started, attempt + 1, throttled)
+                    raise
+                response = None
+            else:
+                self.limiter.update(response.headers.get('X-Shopify-Shop-Api-Call-Limit'))
+                if response.status_code not in retry_statuses or attempt == self.max_retries:
+                    break
+            delay = self._backoff(attempt, response)
+            logger.info("Shopify %s %s failed (%s); retrying in %.2fs",
+                        method, path, response.status_code if response is not None else 'connection error', delay)
+            self._sleep(delay)
+
+        self.metrics.record(method, path, response.status_code, time.monotonic() - started, attempt + 1, throttled)
+        response.raise_for_status()
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def paginate(self, path, key, params=None):
+        """Yield each page's `key` list, following Link rel="next" cursors."""
+        url = path
+        while url:
+            response = self.get(url, params=params)
+            yield response.json().get(key, [])
+            # Next-page URLs already carry the cursor and filters
+            url, params = _next_link(response.headers.get('Link', '')), None
+
+
+def _next_link(link):
+    for part in link.split(','):
+        if 'rel="next"' in part:
+            return part[part.find('<') + 1:part.find('>')]
+    return None
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(store, access_token):
+    """
+    Shared client for a store and token, so calls reuse its connections and
+    rate budget. Different stores never share a session or limiter.
+    """
+    with _clients_lock:
+        client = _clients.get((store, access_token))
+        if client is None:
+            client = _clients[(store, access_token)] = ShopifyClient(store, access_token)
+        return client
+
+
+# org id -> (store, access token) of the client it was last given
+_org_configs = {}
+
+
+def uses_env_store(org):
+    """
+    Whether an org without credentials of its own may use the store from the
+    environment: only calls without an org, and the org SHOPIFY_STORE_ORG
+    names (the org of a single-store install). Other orgs must never see it.
+    """
+    if org is None:
+        return True
+    env_org = os.getenv('SHOPIFY_STORE_ORG')
+    return bool(env_org) and org.slug == env_org
+
+
+def org_credentials(org):
+    """
+    (store, access token) for an org: its own Shopify credentials, or
+    SHOPIFY_STORE/SHOPIFY_ACCESS_TOKEN from the environment where
+    uses_env_store allows it. Raises ValueError when there are none.
+    """
+    if org is not None and org.shopify_store and org.shopify_access_token:
+        return org.shopify_store, org.shopify_access_token
+    if not uses_env_store(org):
+        raise ValueError(
+            f"Organization '{org.slug}' has no Shopify credentials; set its shopify_store and shopify_access_token"
+        )
+    store = os.getenv('SHOPIFY_STORE')
+    token = os.getenv('SHOPIFY_ACCESS_TOKEN')
+    if not store or not token:
+        raise ValueError("SHOPIFY_STORE and SHOPIFY_ACCESS_TOKEN must be set in .env")
+    return store, token
+
+
+def has_credentials(org):
+    """Whether org_credentials finds a store for the org."""
+    try:
+        org_credentials(org)
+    except ValueError:
+        return False
+    return True
+
+
+def get_org_client(org):
+    """The pooled client for an org's store (see org_credentials)."""
+    config = org_credentials(org)
+    key = org.pk if org is not None else None
+    with _clients_lock:
+        previous = _org_configs.get(key)
+        _org_configs[key] = config
+    if previous and previous != config:
+        _close_unused(previous)
+    return get_client(*config)
+
+
+def forget_org_client(org_id):
+    """Drop an org's cached client config, e.g. after its credentials change."""
+    with _clients_lock:
+        config = _org_configs.pop(org_id, None)
+    if config:
+        _close_unused(config)
+
+
+def refresh_org_client(org):
+    """Forget an org's client if its credentials no longer match it."""
+    try:
+        config = org_credentials(org)
+    except ValueError:
+        config = None
+    with _clients_lock:
+        previous = _org_configs.get(org.pk)
+    if previous and previous != config:
+        forget_org_client(org.pk)
+
+
+def _close_unused(config):
+    # Close the old store session once no org is using it any more
+    with _clients_lock:
+        if config in _org_configs.values():
+            return
+        client = _clients.pop(config, None)
+    if client is not None:
+        client.session.close()
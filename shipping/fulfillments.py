@@ -0,0 +1,222 @@
+"""
+Outbox for Shopify fulfillments.
+
+request_fulfillment marks the sale as shipping placed and queues a
+FulfillmentRequest in one transaction; the deliver_fulfillments command
+claims due requests and sends them to Shopify, retrying transient failures
+with exponential backoff. A retried request first looks for a fulfillment
+with its tracking number, so a call that succeeded on Shopify but failed on
+the way back is recorded instead of repeated.
+"""
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Q, Value, When
+from django.utils import timezone
+
+from sales.models import Sale
+from .models import FulfillmentRequest
+from .client import get_org_client
+from .services import find_shopify_fulfillment, fulfill_shopify_order
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 8
+RETRY_BASE = timedelta(seconds=30)
+RETRY_CAP = timedelta(hours=1)
+# Concurrent Shopify calls for one bulk fulfillment; the client's rate
+# limiter still paces them against the store's budget
+BULK_WORKERS = 8
+
+
+def idempotency_key(sale_id, shopify_order_id, tracking_number):
+    payload = f'{sale_id}:{shopify_order_id}:{tracking_number}'
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def request_fulfillment(sale, shopify_order_id, tracking_number, tracking_company='Delhivery'):
+    """
+    Mark the sale as shipping placed and queue its fulfillment. Returns
+    (request, created); resubmitting the same tracking number returns the
+    existing request, re-queued if it had failed.
+    """
+    key = idempotency_key(sale.pk, shopify_order_id, tracking_number)
+    with transaction.atomic():
+        sale.shipping_status = Sale.ShippingStatus.SHIPPING_PLACED
+        sale.tracking_number = tracking_number
+        sale.save(update_fields=['shipping_status', 'tracking_number', 'updated_at'])
+        try:
+            with transaction.atomic():
+                return FulfillmentRequest.objects.create(
+                    organization_id=sale.organization_id,
+                    sale=sale,
+                    shopify_order_id=str(shopify_order_id),
+                    tracking_number=tracking_number,
+                    tracking_company=tracking_company,
+                    idempotency_key=key,
+                ), True
+        except IntegrityError:
+            pass
+        fulfillment = FulfillmentRequest.objects.select_for_update().get(idempotency_key=key)
+        if fulfillment.status == FulfillmentRequest.Status.FAILED:
+            fulfillment.status = FulfillmentRequest.Status.PENDING
+            fulfillment.attempts = 0
+            fulfillment.next_attempt_at = timezone.now()
+            fulfillment.save(update_fields=['status', 'attempts', 'next_attempt_at'])
+    return fulfillment, False
+
+
+def claim_next_fulfillment(stale_after=None):
+    """
+    Lock and mark the oldest due request as sending; None when nothing is
+    due. Requests stuck sending longer than stale_after are picked up again.
+    """
+    now = timezone.now()
+    due = Q(status=FulfillmentRequest.Status.PENDING, next_attempt_at__lte=now)
+    if stale_after:
+        due |= Q(status=FulfillmentRequest.Status.SENDING, started_at__lt=now - stale_after)
+
+    with transaction.atomic():
+        fulfillment = (
+            FulfillmentRequest.objects.select_for_update(skip_locked=True)
+            .filter(due).select_related('organization').order_by('next_attempt_at', 'id').first()
+        )
+        if not fulfillment:
+            return None
+        fulfillment.status = FulfillmentRequest.Status.SENDING
+        fulfillment.started_at = now
+        fulfillment.attempts += 1
+        fulfillment.save(update_fields=['status', 'started_at', 'attempts'])
+    return fulfillment
+
+
+def _is_permanent(error):
+    # 4xx responses other than throttling will fail the same way next time
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return 400 <= error.response.status_code < 500 and error.response.status_code != 429
+    return isinstance(error, ValueError)
+
+
+def _send(fulfillment, client=None):
+    """
+    The Shopify calls for one request; returns (result, error). Touches no
+    database, so bulk fulfillment can run it in worker threads.
+    """
+    try:
+        existing = None
+        if fulfillment.attempts > 1:
+            existing = find_shopify_fulfillment(fulfillment.shopify_order_id, fulfillment.tracking_number, client)
+        return existing or fulfill_shopify_order(
+            fulfillment.shopify_order_id, fulfillment.tracking_number, fulfillment.tracking_company, client=client,
+        ), None
+    except Exception as e:
+        return None, e
+
+
+def _record(fulfillment, result, error):
+    """Apply a send outcome to the (unsaved) request."""
+    if error is None:
+        fulfillment.status = FulfillmentRequest.Status.DELIVERED
+        fulfillment.fulfillment_id = str(result.get('id') or '')
+        fulfillment.delivered_at = timezone.now()
+        fulfillment.last_error = ''
+        return
+    if _is_permanent(error) or fulfillment.attempts >= MAX_ATTEMPTS:
+        logger.error("Fulfillment %s failed: %s", fulfillment.pk, error)
+        fulfillment.status = FulfillmentRequest.Status.FAILED
+    else:
+        logger.warning("Fulfillment %s attempt %s failed: %s", fulfillment.pk, fulfillment.attempts, error)
+        fulfillment.status = FulfillmentRequest.Status.PENDING
+        fulfillment.next_attempt_at = timezone.now() + min(
+            RETRY_CAP, RETRY_BASE * 2 ** (fulfillment.attempts - 1),
+        )
+    fulfillment.last_error = str(error)
+
+
+RESULT_FIELDS = ['status', 'next_attempt_at', 'last_error', 'fulfillment_id', 'delivered_at']
+
+
+def deliver(fulfillment, client=None):
+    """Send one claimed request to its org's store and record the outcome."""
+    try:
+        client = client or get_org_client(fulfillment.organization)
+    except ValueError as e:
+        _record(fulfillment, None, e)
+    else:
+        _record(fulfillment, *_send(fulfillment, client))
+    fulfillment.save(update_fields=RESULT_FIELDS)
+    return fulfillment
+
+
+def deliver_pending_fulfillments(limit=None, stale_after=timedelta(minutes=10), client=None):
+    """Deliver due requests (up to limit); returns the number attempted."""
+    count = 0
+    while limit is None or count < limit:
+        fulfillment = claim_next_fulfillment(stale_after)
+        if not fulfillment:
+            break
+        deliver(fulfillment, client)
+        count += 1
+    return count
+
+
+def bulk_fulfill(org, sales, entries, client=None, max_workers=BULK_WORKERS):
+    """
+    Queue and immediately send fulfillments for many of an org's sales to
+    its Shopify store. sales maps sale id to Sale; entries are dicts with
+    sale_id, shopify_order_id, tracking_number and optional
+    tracking_company. Sales are marked shipping placed in one UPDATE, the
+    Shopify calls run on a bounded thread pool and the outcomes are saved
+    in one bulk update. Requests already delivered are reported without
+    calling Shopify; transient failures stay queued for deliver_fulfillments.
+    Returns one FulfillmentRequest per entry.
+    """
+    client = client or get_org_client(org)
+    now = timezone.now()
+    keys = [idempotency_key(e['sale_id'], e['shopify_order_id'], e['tracking_number']) for e in entries]
+
+    with transaction.atomic():
+        Sale.objects.filter(id__in={e['sale_id'] for e in entries}).update(
+            shipping_status=Sale.ShippingStatus.SHIPPING_PLACED,
+            tracking_number=Case(
+                *(When(id=e['sale_id'], then=Value(e['tracking_number'])) for e in entries)
+            ),
+            updated_at=now,
+        )
+        FulfillmentRequest.objects.bulk_create([
+            FulfillmentRequest(
+                organization_id=sales[e['sale_id']].organization_id,
+                sale_id=e['sale_id'],
+                shopify_order_id=str(e['shopify_order_id']),
+                tracking_number=e['tracking_number'],
+                tracking_company=e.get('tracking_company') or 'Delhivery',
+                idempotency_key=key,
+            )
+            for e, key in zip(entries, keys)
+        ], ignore_conflicts=True)
+        # Locked so the background worker does not send the same requests
+        by_key = FulfillmentRequest.objects.select_for_update().in_bulk(keys, field_name='idempotency_key')
+        to_send = [
+            f for f in by_key.values()
+            if f.status in (FulfillmentRequest.Status.PENDING, FulfillmentRequest.Status.FAILED)
+        ]
+        for fulfillment in to_send:
+            if fulfillment.status == FulfillmentRequest.Status.FAILED:
+                fulfillment.attempts = 0
+            fulfillment.status = FulfillmentRequest.Status.SENDING
+            fulfillment.started_at = now
+            fulfillment.attempts += 1
+        FulfillmentRequest.objects.bulk_update(to_send, ['status', 'started_at', 'attempts'])
+
+    if to_send:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(to_send))) as pool:
+            outcomes = list(pool.map(lambda f: _send(f, client), to_send))
+        for fulfillment, (result, error) in zip(to_send, outcomes):
+            _record(fulfillment, result, error)
+        FulfillmentRequest.objects.bulk_update(to_send, RESULT_FIELDS)
+
+    return [by_key[key] for key in keys]
@@ -0,0 +1,38 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from shipping.fulfillments import deliver_pending_fulfillments
+
+
+class Command(BaseCommand):
+    help = "Deliver queued Shopify fulfillments."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Deliver what is due and exit instead of polling')
+        parser.add_argument('--max', type=int, help='Exit after attempting this many fulfillments')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when nothing is due')
+        parser.add_argument(
+            '--stale-after', type=int, default=10,
+            help='Minutes after which a fulfillment still marked sending is retried',
+        )
+
+    def handle(self, *args, **options):
+        stale_after = timedelta(minutes=options['stale_after'])
+        remaining = options['max']
+        total = 0
+
+        while True:
+            sent = deliver_pending_fulfillments(limit=remaining, stale_after=stale_after)
+            total += sent
+            if remaining is not None:
+                remaining -= sent
+                if remaining <= 0:
+                    break
+            if options['once']:
+                break
+            if not sent:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'Attempted {total} fulfillment(s)'))
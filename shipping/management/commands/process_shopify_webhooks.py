@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shipping.webhooks import process_pending_events
+
+
+class Command(BaseCommand):
+    help = "Process received Shopify order webhooks into orders and pending sales."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the inbox and exit instead of polling')
+        parser.add_argument('--batch-size', type=int, default=100, help='Events claimed per transaction')
+        parser.add_argument(
+            '--sleep', type=float, default=2.0,
+            help='Seconds to wait when no event is due (failed events wait out their retry backoff)',
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            claimed = process_pending_events(batch_size=options['batch_size'])
+            total += claimed
+            if not claimed:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {total} webhook event(s)'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import Organization
+from shipping.client import has_credentials
+from shipping.services import sync_shopify_orders
+
+
+class Command(BaseCommand):
+    help = "Pull new and changed Shopify orders since each organization's sync cursor."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--org', help='Organization slug (default: all organizations)')
+        parser.add_argument('--full', action='store_true', help='Ignore the cursor and re-read the whole order history')
+
+    def handle(self, *args, **options):
+        orgs = Organization.objects.all()
+        if options['org']:
+            orgs = orgs.filter(slug=options['org'])
+            if not orgs.exists():
+                raise CommandError(f"Organization '{options['org']}' not found")
+
+        for org in orgs:
+            if not has_credentials(org):
+                self.stdout.write(self.style.WARNING(f"{org.slug}: skipped, no Shopify credentials"))
+                continue
+            fetched = sync_shopify_orders(org, full=options['full'])
+            self.stdout.write(f"{org.slug}: fetched {fetched} order(s)")
+
+        self.stdout.write(self.style.SUCCESS('Done'))
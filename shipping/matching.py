@@ -0,0 +1,133 @@
+"""
+In-memory matching of Shopify line-item names to inventory products.
+
+ProductMatcher is built from one query over an org's available products and
+answers every lookup without touching the database: an exact match on the
+normalized name, then candidates that share a word or character trigram
+with the item, ranked by a blend of word overlap and trigram similarity.
+"""
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+
+from django.db.models import Count, Max
+
+from inventory.models import Product
+
+# Suggestions returned per line item and the lowest score worth showing
+DEFAULT_TOP_K = 5
+MIN_SCORE = 0.2
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def normalize(name):
+    """Lowercase, strip accents and collapse punctuation/whitespace to single spaces."""
+    name = unicodedata.normalize('NFKD', name or '').encode('ascii', 'ignore').decode()
+    return _NON_ALNUM.sub(' ', name.lower()).strip()
+
+
+def trigrams(normalized):
+    """Character trigrams of each word, padded so short words still produce some."""
+    grams = set()
+    for word in normalized.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class ProductMatcher:
+    """Exact, token and trigram indexes over a fixed set of products."""
+
+    def __init__(self, products):
+        # products: dicts with id, name and price
+        self.products = list(products)
+        self._exact = {}
+        self._tokens = []
+        self._grams = []
+        self._token_index = defaultdict(set)
+        self._gram_index = defaultdict(set)
+
+        for i, product in enumerate(self.products):
+            norm = normalize(product['name'])
+            self._exact.setdefault(norm, i)  # The oldest product wins a tie, as before
+            tokens = set(norm.split())
+            grams = trigrams(norm)
+            self._tokens.append(tokens)
+            self._grams.append(grams)
+            for token in tokens:
+                self._token_index[token].add(i)
+            for gram in grams:
+                self._gram_index[gram].add(i)
+
+    @classmethod
+    def for_queryset(cls, queryset):
+        return cls(queryset.order_by('id').values('id', 'name', 'price'))
+
+    def exact(self, name):
+        """The product whose normalized name equals name's, or None."""
+        i = self._exact.get(normalize(name))
+        return self.products[i] if i is not None else None
+
+    def score(self, i, tokens, grams):
+        """0..1 blend of word overlap and trigram Dice similarity."""
+        product_tokens, product_grams = self._tokens[i], self._grams[i]
+        token_score = len(tokens & product_tokens) / len(tokens | product_tokens) if tokens else 0.0
+        gram_total = len(grams) + len(product_grams)
+        gram_score = 2 * len(grams & product_grams) / gram_total if gram_total else 0.0
+        return 0.4 * token_score + 0.6 * gram_score
+
+    def suggest(self, name, k=DEFAULT_TOP_K, min_score=MIN_SCORE):
+        """Up to k (product, score) pairs, best first; an exact match scores 1.0."""
+        norm = normalize(name)
+        tokens = set(norm.split())
+        grams = trigrams(norm)
+
+        # Only products sharing at least a few trigrams (or a word) can score
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._gram_index.get(gram, ()))
+        candidates = {i for i, n in shared.items() if n >= 2}
+        for token in tokens:
+            candidates.update(self._token_index.get(token, ()))
+
+        exact = self._exact.get(norm)
+        scored = []
+        for i in candidates:
+            score = 1.0 if i == exact else self.score(i, tokens, grams)
+            if score >= min_score:
+                scored.append((score, -i, i))
+        scored.sort(reverse=True)
+        return [(self.products[i], round(score, 3)) for score, _, i in scored[:k]]
+
+
+# Matchers per org, rebuilt whenever the org's available products change
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def get_matcher(org):
+    """
+    ProductMatcher over an org's in-stock products. The index is reused
+    across requests until a product is added, edited, sold out or removed,
+    which one aggregate query per call detects.
+    """
+    products = Product.objects.filter(organization=org, available_quantity__gt=0)
+    stamp = products.aggregate(count=Count('id'), last_id=Max('id'), updated=Max('updated_at'))
+    version = (stamp['count'], stamp['last_id'], stamp['updated'])
+
+    with _cache_lock:
+        cached = _cache.get(org.pk)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    matcher = ProductMatcher.for_queryset(products)
+    with _cache_lock:
+        _cache[org.pk] = (version, matcher)
+    return matcher
+
+
+def clear_matcher_cache():
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.17 on 2026-10-19 05:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('accounts', '0006_organization_timezone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShopifySyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('updated_at_min', models.DateTimeField(blank=True, null=True)),
+                ('last_synced_at', models.DateTimeField(blank=True, null=True)),
+                ('last_full_sync_at', models.DateTimeField(blank=True, null=True)),
+                ('last_fetched_count', models.PositiveIntegerField(default=0)),
+                ('organization', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='shopify_sync_state', to='accounts.organization')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ShopifyOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shopify_order_id', models.CharField(max_length=64)),
+                ('name', models.CharField(max_length=64)),
+                ('shopify_updated_at', models.DateTimeField(blank=True, null=True)),
+                ('data', models.JSONField(default=dict)),
+                ('fetched_at', models.DateTimeField(auto_now=True)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopify_orders', to='accounts.organization')),
+            ],
+            options={
+                'ordering': ['-shopify_updated_at'],
+                'unique_together': {('organization', 'shopify_order_id')},
+            },
+        ),
+    ]
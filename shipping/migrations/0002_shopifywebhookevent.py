@@ -0,0 +1,39 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_organization_timezone'),
+        ('shipping', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShopifyWebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic', models.CharField(max_length=64)),
+                ('webhook_id', models.CharField(blank=True, default='', max_length=128)),
+                ('shopify_order_id', models.CharField(db_index=True, max_length=64)),
+                ('payload', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processed', 'Processed'), ('superseded', 'Superseded'), ('failed', 'Failed')], default='pending', max_length=16)),
+                ('error', models.TextField(blank=True, default='')),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopify_webhook_events', to='accounts.organization')),
+            ],
+            options={
+                'ordering': ['received_at', 'id'],
+                'indexes': [models.Index(fields=['status', 'received_at'], name='shipping_sh_status_394ca6_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shopifywebhookevent',
+            constraint=models.UniqueConstraint(condition=models.Q(('webhook_id', ''), _negated=True), fields=('organization', 'webhook_id'), name='unique_shopify_webhook_delivery'),
+        ),
+    ]
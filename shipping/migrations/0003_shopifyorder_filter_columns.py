@@ -0,0 +1,52 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:07
+
+from django.db import migrations, models
+from django.utils.dateparse import parse_datetime
+
+
+def copy_filter_columns(apps, schema_editor):
+    # Fill the new columns from the stored order data
+    ShopifyOrder = apps.get_model('shipping', 'ShopifyOrder')
+    orders = []
+    for order in ShopifyOrder.objects.iterator(chunk_size=500):
+        order.shopify_created_at = parse_datetime(order.data.get('created_at') or '')
+        order.financial_status = order.data.get('financial_status') or ''
+        order.is_cod = bool(order.data.get('is_cod'))
+        orders.append(order)
+    ShopifyOrder.objects.bulk_update(
+        orders, ['shopify_created_at', 'financial_status', 'is_cod'], batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipping', '0002_shopifywebhookevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shopifyorder',
+            name='financial_status',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='shopifyorder',
+            name='is_cod',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='shopifyorder',
+            name='shopify_created_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='shopifyorder',
+            index=models.Index(fields=['organization', '-shopify_created_at'], name='shopify_order_org_created'),
+        ),
+        migrations.AddIndex(
+            model_name='shopifyorder',
+            index=models.Index(fields=['organization', 'financial_status'], name='shopify_order_org_status'),
+        ),
+        migrations.RunPython(copy_filter_columns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_organization_timezone'),
+        ('sales', '0011_sale_cost_price_sale_funded_by_user_sale_org_revenue_and_more'),
+        ('shipping', '0003_shopifyorder_filter_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FulfillmentRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shopify_order_id', models.CharField(max_length=64)),
+                ('tracking_number', models.CharField(max_length=128)),
+                ('tracking_company', models.CharField(default='Delhivery', max_length=128)),
+                ('idempotency_key', models.CharField(max_length=64, unique=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('delivered', 'Delivered'), ('failed', 'Failed')], default='pending', max_length=16)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('fulfillment_id', models.CharField(blank=True, default='', max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('delivered_at', models.DateTimeField(blank=True, null=True)),
+                ('organization', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='fulfillment_requests', to='accounts.organization')),
+                ('sale', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fulfillment_requests', to='sales.sale')),
+            ],
+            options={
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='shipping_fu_status_a717c6_idx')],
+            },
+        ),
+    ]
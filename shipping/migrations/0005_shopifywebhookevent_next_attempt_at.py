@@ -0,0 +1,18 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipping', '0004_fulfillmentrequest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shopifywebhookevent',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,133 @@
+from django.db import models
+from django.utils import timezone
+
+from accounts.models import Organization
+
+
+class ShopifySyncState(models.Model):
+    """
+    Per-organization cursor for the incremental Shopify order sync.
+
+    updated_at_min is the high-water mark: the newest order updated_at seen
+    so far. Each sync asks Shopify only for orders updated since then.
+    """
+    organization = models.OneToOneField(Organization, on_delete=models.CASCADE, related_name='shopify_sync_state')
+    updated_at_min = models.DateTimeField(null=True, blank=True)
+    last_synced_at = models.DateTimeField(null=True, blank=True)
+    last_full_sync_at = models.DateTimeField(null=True, blank=True)
+    last_fetched_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.organization} sync cursor {self.updated_at_min or '(none)'}"
+
+
+class ShopifyOrder(models.Model):
+    """
+    Local copy of a Shopify order (the cleaned order shape), written by the
+    incremental sync and the order webhooks. ShopifyOrdersView lists orders
+    from here; the fields it filters on are copied out of data into indexed
+    columns.
+    """
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='shopify_orders')
+    shopify_order_id = models.CharField(max_length=64)
+    name = models.CharField(max_length=64)
+    shopify_created_at = models.DateTimeField(null=True, blank=True)
+    shopify_updated_at = models.DateTimeField(null=True, blank=True)
+    financial_status = models.CharField(max_length=32, blank=True, default='')
+    is_cod = models.BooleanField(default=False)
+    data = models.JSONField(default=dict)
+    fetched_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('organization', 'shopify_order_id')
+        ordering = ['-shopify_updated_at']
+        indexes = [
+            models.Index(fields=['organization', '-shopify_created_at'], name='shopify_order_org_created'),
+            models.Index(fields=['organization', 'financial_status'], name='shopify_order_org_status'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.organization})"
+
+
+class ShopifyWebhookEvent(models.Model):
+    """
+    Inbox row for one verified orders/create or orders/updated webhook.
+
+    The receiver only stores the payload; the process_shopify_webhooks
+    command turns pending rows into ShopifyOrder updates and pending sales.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        PROCESSED = "processed", "Processed"
+        SUPERSEDED = "superseded", "Superseded"
+        FAILED = "failed", "Failed"
+
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='shopify_webhook_events')
+    topic = models.CharField(max_length=64)
+    # X-Shopify-Webhook-Id; Shopify reuses it when it redelivers
+    webhook_id = models.CharField(max_length=128, blank=True, default='')
+    shopify_order_id = models.CharField(max_length=64, db_index=True)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
+    error = models.TextField(blank=True, default='')
+    attempts = models.PositiveIntegerField(default=0)
+    # A failed event is not retried before this; null means due now
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['received_at', 'id']
+        indexes = [models.Index(fields=['status', 'received_at'])]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['organization', 'webhook_id'],
+                condition=~models.Q(webhook_id=''),
+                name='unique_shopify_webhook_delivery',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} {self.shopify_order_id} ({self.status})"
+
+
+class FulfillmentRequest(models.Model):
+    """
+    Outbox row for one Shopify fulfillment, written in the same transaction
+    that marks the sale as shipping placed and delivered to Shopify by the
+    deliver_fulfillments command.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        SENDING = "sending", "Sending"
+        DELIVERED = "delivered", "Delivered"
+        FAILED = "failed", "Failed"
+
+    organization = models.ForeignKey(
+        Organization, on_delete=models.CASCADE, related_name='fulfillment_requests', null=True, blank=True,
+    )
+    sale = models.ForeignKey('sales.Sale', on_delete=models.CASCADE, related_name='fulfillment_requests')
+    shopify_order_id = models.CharField(max_length=64)
+    tracking_number = models.CharField(max_length=128)
+    tracking_company = models.CharField(max_length=128, default='Delhivery')
+    # Same sale, order and tracking number -> same key, so a resubmitted
+    # request never produces a second fulfillment
+    idempotency_key = models.CharField(max_length=64, unique=True)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    fulfillment_id = models.CharField(max_length=64, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+    def __str__(self):
+        return f"Fulfillment of {self.shopify_order_id} ({self.status})"
@@ -1,47 +1,45 @@
-import os
-import requests
+from collections import Counter
+from datetime import datetime, timedelta
 
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
-def _shopify_headers():
-    return {'X-Shopify-Access-Token': os.getenv('SHOPIFY_ACCESS_TOKEN', '')}
+from analytics.snapshots import invalidate_months
+from inventory.models import Product
+from sales.models import Sale, ShippingInfo
+from .client import get_org_client
+from .models import ShopifySyncState, ShopifyOrder
 
+# Re-fetch this far behind the cursor so orders whose updated_at was written
+# while the previous sync ran are not skipped; duplicates are upserted.
+SYNC_OVERLAP = timedelta(minutes=5)
 
-def _shopify_url(path):
-    store = os.getenv('SHOPIFY_STORE')
-    return f"https://{store}/admin/api/2024-01/{path}"
+
+def _default_client():
+    """Client for the store configured in the environment."""
+    return get_org_client(None)
 
 
 # ---- Shopify Orders ----
 
-def get_shopify_orders():
-    store = os.getenv('SHOPIFY_STORE')
-    token = os.getenv('SHOPIFY_ACCESS_TOKEN')
-    if not store or not token:
-        raise ValueError("SHOPIFY_STORE and SHOPIFY_ACCESS_TOKEN must be set in .env")
-
-    all_orders = []
-    url = _shopify_url('orders.json')
-    params = {'status': 'any', 'limit': 250}
-
-    while url:
-        response = requests.get(
-            url,
-            params=params if not all_orders else None,
-            headers=_shopify_headers(),
-            timeout=30,
-        )
-        response.raise_for_status()
-        all_orders.extend(response.json().get('orders', []))
+def iter_shopify_order_pages(updated_at_min=None, client=None):
+    """
+    Yield cleaned orders one page (up to 250) at a time, oldest change
+    first, optionally only those updated at or after updated_at_min. Only
+    one raw page is held in memory.
+    """
+    client = client or _default_client()
 
-        # Parse Link header for cursor-based pagination
-        url = None
-        link = response.headers.get('Link', '')
-        for part in link.split(','):
-            if 'rel="next"' in part:
-                url = part[part.find('<') + 1:part.find('>')]
-                break
+    params = {'status': 'any', 'limit': 250, 'order': 'updated_at asc'}
+    if updated_at_min:
+        params['updated_at_min'] = updated_at_min.isoformat()
 
-    return [_clean_order(o) for o in all_orders]
+    for page in client.paginate('orders.json', 'orders', params=params):
+        yield [_clean_order(o) for o in page]
 
 
 def _clean_order(order):
@@ -52,6 +50,7 @@ def _clean_order(order):
         'id': order['id'],
         'name': order['name'],
         'created_at': order.get('created_at', ''),
+        'updated_at': order.get('updated_at') or order.get('created_at', ''),
         'customer_name': f"{shipping.get('first_name', '')} {shipping.get('last_name', '')}".strip(),
         'phone': shipping.get('phone') or order.get('phone') or '',
         'address1': shipping.get('address1', ''),
@@ -68,19 +67,252 @@ def _clean_order(order):
     }
 
 
+# ---- Incremental sync ----
+
+def sync_shopify_orders(org, full=False, client=None):
+    """
+    Pull orders changed since the org's cursor into ShopifyOrder and advance
+    the cursor; full=True ignores the cursor and re-reads the whole history.
+    Pages are stored as they arrive and, since they come oldest change
+    first, the cursor advances with each one, so an interrupted sync resumes
+    where it stopped. Returns the number of orders fetched.
+    """
+    client = client or get_org_client(org)
+    state, _ = ShopifySyncState.objects.get_or_create(organization=org)
+    since = None
+    if not full and state.updated_at_min:
+        since = state.updated_at_min - SYNC_OVERLAP
+
+    fetched = 0
+    for page in iter_shopify_order_pages(updated_at_min=since, client=client):
+        with transaction.atomic():
+            newest = _store_orders(org, page)
+            if newest and (not state.updated_at_min or newest > state.updated_at_min):
+                state.updated_at_min = newest
+                state.save(update_fields=['updated_at_min'])
+        fetched += len(page)
+
+    state.last_synced_at = timezone.now()
+    if full:
+        state.last_full_sync_at = state.last_synced_at
+    state.last_fetched_count = fetched
+    state.save()
+    return fetched
+
+
+def _store_orders(org, orders):
+    """Upsert one page of cleaned orders into ShopifyOrder; returns the newest updated_at."""
+    existing = {
+        o.shopify_order_id: o
+        for o in ShopifyOrder.objects.filter(
+            organization=org, shopify_order_id__in=[str(order['id']) for order in orders],
+        )
+    }
+    to_create, to_update = {}, {}
+    newest = None
+    fetched_at = timezone.now()
+    for order in orders:
+        order_id = str(order['id'])
+        updated_at = parse_datetime(order['updated_at']) if order.get('updated_at') else None
+        if updated_at and (newest is None or updated_at > newest):
+            newest = updated_at
+
+        # An order edited mid-sync can show up twice; the later copy wins
+        row = existing.get(order_id) or to_create.get(order_id)
+        if row is None:
+            row = to_create[order_id] = ShopifyOrder(organization=org, shopify_order_id=order_id)
+        elif row.pk:
+            if row.shopify_updated_at == updated_at and row.data == order:
+                continue  # The cursor overlap re-fetched an unchanged order
+            to_update[order_id] = row
+        row.name = order['name']
+        row.shopify_created_at = parse_datetime(order['created_at']) if order.get('created_at') else None
+        row.shopify_updated_at = updated_at
+        row.financial_status = order.get('financial_status') or ''
+        row.is_cod = bool(order.get('is_cod'))
+        row.data = order
+        row.fetched_at = fetched_at
+
+    ShopifyOrder.objects.bulk_create(to_create.values(), batch_size=500)
+    ShopifyOrder.objects.bulk_update(
+        to_update.values(),
+        ['name', 'shopify_created_at', 'shopify_updated_at', 'financial_status', 'is_cod', 'data', 'fetched_at'],
+        batch_size=500,
+    )
+    return newest
+
+
+# ---- Confirming orders as sales ----
+
+def _parse_sale_date(value):
+    if isinstance(value, datetime):
+        sale_date = value
+    else:
+        sale_date = parse_datetime(value) if value else None
+    if sale_date and timezone.is_naive(sale_date):
+        sale_date = timezone.make_aware(sale_date)
+    return sale_date
+
+
+def _item_product_id(item):
+    """The item's product ID as an int, None when unmapped; ValueError when invalid."""
+    value = item.get('product_id')
+    if value in (None, ''):
+        return None
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        raise ValueError(f"invalid product_id {value!r}")
+
+
+def _item_values(item):
+    """
+    The item's (quantity, sale price), validated like the Sale fields;
+    ValueError when either is invalid.
+    """
+    values = []
+    for field, key, default in (('quantity_sold', 'quantity', 1), ('sale_price', 'sale_price', 0)):
+        value = item.get(key, default)
+        try:
+            value = Sale._meta.get_field(field).clean(value, None)
+        except ValidationError as e:
+            raise ValueError(f"invalid {key} {value!r}: {' '.join(e.messages)}")
+        values.append(value)
+    if values[0] < 1:
+        raise ValueError("quantity must be at least 1")
+    return values
+
+
+def create_shopify_sales(org, orders):
+    """
+    Create a Sale (plus ShippingInfo when a customer name is given) for each
+    line item of confirmed Shopify orders, in a handful of queries however
+    many orders there are. Orders whose Shopify ID already has a sale are
+    skipped; items with an unknown product, no sale date or an invalid
+    quantity or price are reported and left out.
+    Returns (created_sales, skipped, errors).
+    """
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                return _create_shopify_sales(org, orders)
+        except IntegrityError:
+            # A concurrent confirm created one of these orders; skip it and retry
+            if attempt:
+                raise
+
+
+def _create_shopify_sales(org, orders):
+    order_ids = {str(order.get('shopify_order_id', '')) for order in orders}
+    existing_ids = set(
+        Sale.objects.filter(shopify_order_id__in=order_ids).values_list('shopify_order_id', flat=True)
+    )
+    product_ids = set()
+    for order in orders:
+        for item in order.get('items', []):
+            try:
+                product_ids.add(_item_product_id(item))
+            except ValueError:
+                continue  # Reported below
+    product_ids.discard(None)
+    products = Product.objects.filter(id__in=product_ids, organization=org).select_related('lot').in_bulk()
+
+    skipped = 0
+    errors = []
+    sales, shipping_infos = [], []
+    sold = Counter()
+    for order in orders:
+        shopify_order_id = str(order.get('shopify_order_id', ''))
+        order_name = order.get('order_name', '')
+
+        # Idempotency, including the same order twice in one request
+        if shopify_order_id in existing_ids:
+            skipped += 1
+            continue
+        existing_ids.add(shopify_order_id)
+
+        sale_date = _parse_sale_date(order.get('sale_date'))
+        customer_name = order.get('customer_name', '')
+        for i, item in enumerate(order.get('items', [])):
+            try:
+                product_id = _item_product_id(item)
+                quantity, sale_price = _item_values(item)
+            except ValueError as e:
+                errors.append(f"Order {order_name} item {i}: {e}")
+                continue
+
+            product = None
+            if product_id:
+                product = products.get(product_id)
+                if product is None:
+                    errors.append(f"Product {product_id} not found for order {order_name}")
+                    continue
+            if sale_date is None:
+                errors.append(f"Order {order_name} item {i}: sale_date is missing or invalid")
+                continue
+
+            funded_by_user = None
+            if product and product.lot and product.lot.funded_by == 'user':
+                funded_by_user = product.lot.funded_by_user
+
+            sale = Sale(
+                organization=org,
+                product=product,
+                quantity_sold=quantity,
+                sale_price=sale_price,
+                customer=order.get('customer', ''),
+                sale_date=sale_date,
+                # Unique order ID for multi-item orders
+                shopify_order_id=shopify_order_id if i == 0 else f"{shopify_order_id}-{i+1}",
+                shopify_order_name=order_name,
+                shipping_status=Sale.ShippingStatus.SHIPPING_PENDING,
+                funded_by_user=funded_by_user,
+                cost_price=product.price if product else None,
+            )
+            sale.calculate_split()
+            sales.append(sale)
+            if product:
+                sold[product.id] += quantity
+
+            if customer_name:
+                shipping_infos.append(ShippingInfo(
+                    sale=sale,
+                    customer_name=customer_name,
+                    customer_email=order.get('customer', ''),
+                    customer_phone=order.get('phone', ''),
+                    customer_address=order.get('address', ''),
+                    customer_pincode=order.get('pincode', ''),
+                ))
+
+    Sale.objects.bulk_create(sales, batch_size=500)
+    # Each ShippingInfo picks up its sale's new ID
+    ShippingInfo.objects.bulk_create(shipping_infos, batch_size=500)
+    if sold:
+        Product.objects.filter(id__in=sold).update(
+            available_quantity=Case(
+                *(When(id=pid, then=Greatest(F('available_quantity') - Value(qty), Value(0)))
+                  for pid, qty in sold.items())
+            ),
+            updated_at=timezone.now(),
+        )
+    # bulk_create skips the snapshot signals
+    invalidate_months(org.id, [sale.sale_date for sale in sales])
+    return len(sales), skipped, errors
+
+
 # ---- Shopify Fulfillment ----
 
-def fulfill_shopify_order(shopify_order_id, tracking_number, tracking_company='Delhivery'):
+def fulfill_shopify_order(shopify_order_id, tracking_number, tracking_company='Delhivery', client=None):
+    client = client or _default_client()
+
     # Step 1: get fulfillment order ID
-    resp = requests.get(
-        _shopify_url(f'orders/{shopify_order_id}/fulfillment_orders.json'),
-        headers=_shopify_headers(),
-        timeout=30,
-    )
-    resp.raise_for_status()
-    fulfillment_orders = resp.json().get('fulfillment_orders', [])
+    resp = client.get(f'orders/{shopify_order_id}/fulfillment_orders.json')
+    fulfillment_orders = [
+        fo for fo in resp.json().get('fulfillment_orders', [])
+        if fo.get('status', 'open') in ('open', 'in_progress')
+    ]
     if not fulfillment_orders:
-        raise ValueError("No fulfillment orders found for this Shopify order")
+        raise ValueError("No open fulfillment orders found for this Shopify order")
 
     fo_id = fulfillment_orders[0]['id']
 
@@ -95,11 +327,18 @@ def fulfill_shopify_order(shopify_order_id, tracking_number, tracking_company='D
             'notify_customer': True,
         }
     }
-    resp = requests.post(
-        _shopify_url('fulfillments.json'),
-        json=payload,
-        headers=_shopify_headers(),
-        timeout=30,
-    )
-    resp.raise_for_status()
+    resp = client.post('fulfillments.json', json=payload)
     return resp.json().get('fulfillment', {})
+
+
+def find_shopify_fulfillment(shopify_order_id, tracking_number, client=None):
+    """The order's existing fulfillment carrying tracking_number, or None."""
+    client = client or _default_client()
+    resp = client.get(f'orders/{shopify_order_id}/fulfillments.json')
+    for fulfillment in resp.json().get('fulfillments', []):
+        numbers = set(fulfillment.get('tracking_numbers') or [])
+        numbers.add(fulfillment.get('tracking_number'))
+        numbers.add((fulfillment.get('tracking_info') or {}).get('number'))
+        if tracking_number in numbers:
+            return fulfillment
+    return None
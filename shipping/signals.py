@@ -0,0 +1,21 @@
+"""
+Drop an organization's cached Shopify client when its credentials change,
+so the next call uses the new store or token.
+"""
+from django.db.models.signals import post_delete, post_save
+
+from accounts.models import Organization
+from .client import forget_org_client, refresh_org_client
+
+
+def credentials_saved(sender, instance, **kwargs):
+    refresh_org_client(instance)
+
+
+def organization_deleted(sender, instance, **kwargs):
+    forget_org_client(instance.pk)
+
+
+def connect():
+    post_save.connect(credentials_saved, sender=Organization, dispatch_uid='shopify_client_org_save')
+    post_delete.connect(organization_deleted, sender=Organization, dispatch_uid='shopify_client_org_delete')
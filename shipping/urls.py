@@ -1,8 +1,8 @@
 from django.urls import path
 from .views import (
-    ShopifyOrdersView, FulfillOrderView,
+    ShopifyOrdersView, FulfillOrderView, BulkFulfillView, FulfillmentStatusView,
     ShopifyOAuthInitView, ShopifyOAuthCallbackView,
-    ShopifySyncView, ResolveUnmatchedSaleView,
+    ShopifySyncView, ResolveUnmatchedSaleView, ShopifyWebhookView,
 )
 
 urlpatterns = [
@@ -10,6 +10,9 @@ urlpatterns = [
     path('oauth/callback/', ShopifyOAuthCallbackView.as_view(), name='shopify-oauth-callback'),
     path('orders/', ShopifyOrdersView.as_view(), name='shipping-orders'),
     path('fulfill/', FulfillOrderView.as_view(), name='fulfill-order'),
+    path('fulfill/bulk/', BulkFulfillView.as_view(), name='bulk-fulfill'),
+    path('fulfill/<int:job_id>/', FulfillmentStatusView.as_view(), name='fulfillment-status'),
     path('sync/', ShopifySyncView.as_view(), name='shopify-sync'),
+    path('webhooks/<slug:org_slug>/orders/', ShopifyWebhookView.as_view(), name='shopify-order-webhook'),
     path('resolve-sale/<int:sale_id>/', ResolveUnmatchedSaleView.as_view(), name='resolve-unmatched-sale'),
 ]
@@ -1,5 +1,7 @@
+import json
 import os
 import logging
+from datetime import timedelta
 
 from django.http import HttpResponse, HttpResponseRedirect
 import requests
@@ -9,24 +11,53 @@ from rest_framework import status
 from rest_framework.permissions import AllowAny
 from django.db import transaction
 
-from sales.models import Sale, ShippingInfo
+from sales.models import Sale
 from inventory.models import Product
-from accounts.mixins import resolve_org
-from .services import get_shopify_orders, fulfill_shopify_order
+from accounts.mixins import resolve_org, OrgTimezoneMixin
+from accounts.permissions import IsOwnerGroup
+from accounts.models import Organization
+from analytics.periods import parse_custom_date
+from stash_pro.db_router import ReplicaReadMixin, use_primary
+from stash_pro.pagination import StandardPagination
+from .client import uses_env_store
+from .fulfillments import bulk_fulfill, request_fulfillment
+from .matching import get_matcher
+from .models import FulfillmentRequest, ShopifyOrder, ShopifySyncState
+from .webhooks import WEBHOOK_TOPICS, receive_webhook, verify_hmac
+from .services import (
+    create_shopify_sales, iter_shopify_order_pages, sync_shopify_orders,
+)
 
 logger = logging.getLogger(__name__)
 
+# Orders matched against products per batch, the same as a Shopify page
+SYNC_PAGE_SIZE = 250
+
 
 class ShopifyOAuthInitView(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request):
-        store = os.getenv('SHOPIFY_STORE')
+        """
+        Start the OAuth install for the store of the requesting owner's
+        organization; anonymous requests (and the SHOPIFY_STORE_ORG org)
+        get SHOPIFY_STORE.
+        """
+        org, _ = resolve_org(request)
+        if org and not IsOwnerGroup().has_permission(request, self):
+            return Response(
+                {'error': 'Only organization owners can install the Shopify app'},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        store = (org.shopify_store if org else '') or (os.getenv('SHOPIFY_STORE') if uses_env_store(org) else '')
         client_id = os.getenv('SHOPIFY_CLIENT_ID')
         redirect_uri = os.getenv('SHOPIFY_REDIRECT_URI', 'http://localhost:8000/api/shipping/oauth/callback/')
 
         if not store or not client_id:
-            return HttpResponse('SHOPIFY_STORE and SHOPIFY_CLIENT_ID must be set in .env', status=400)
+            return HttpResponse(
+                "Set the organization's shopify_store (or SHOPIFY_STORE) and SHOPIFY_CLIENT_ID in .env",
+                status=400,
+            )
 
         auth_url = (
             f"https://{store}/admin/oauth/authorize"
@@ -62,24 +93,111 @@ class ShopifyOAuthCallbackView(APIView):
             f"<h2>Success!</h2>"
             f"<p>Your access token:</p>"
             f"<pre style='background:#f0f0f0;padding:12px;border-radius:6px'>{access_token}</pre>"
-            f"<p>Copy this into your <code>.env</code> as <code>SHOPIFY_ACCESS_TOKEN</code></p>",
+            f"<p>Save it as your organization's <code>shopify_access_token</code>, or copy it into your "
+            f"<code>.env</code> as <code>SHOPIFY_ACCESS_TOKEN</code></p>",
             content_type='text/html',
         )
 
 
-class ShopifyOrdersView(APIView):
+class ShopifyWebhookView(APIView):
+    """
+    Receiver for the orders/create and orders/updated webhooks of one org.
+    Verified deliveries are stored for process_shopify_webhooks and
+    acknowledged straight away; other topics are acknowledged and dropped.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request, org_slug):
+        body = request.body
+        org = Organization.objects.filter(slug=org_slug).exclude(shopify_webhook_secret='').first()
+        if not org or not verify_hmac(
+            org.shopify_webhook_secret, body, request.headers.get('X-Shopify-Hmac-Sha256'),
+        ):
+            return Response({'error': 'Invalid webhook signature'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        topic = request.headers.get('X-Shopify-Topic', '')
+        if topic not in WEBHOOK_TOPICS:
+            return Response({'status': 'ignored'})
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return Response({'error': 'Invalid JSON payload'}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(payload, dict) or not payload.get('id'):
+            return Response({'error': 'Payload has no order id'}, status=status.HTTP_400_BAD_REQUEST)
+
+        event = receive_webhook(org, topic, request.headers.get('X-Shopify-Webhook-Id'), payload)
+        return Response({'status': 'received' if event else 'duplicate'})
+
+
+def _wants_full_sync(request):
+    return request.query_params.get('full', '').lower() in ('1', 'true', 'yes')
+
+
+class ShopifyOrdersView(ReplicaReadMixin, OrgTimezoneMixin, APIView):
+    """
+    List Shopify orders. With an organization selected the list is served
+    from the local ShopifyOrder copy kept current by the sync and webhooks,
+    newest first and paginated, with optional filters:
+      ?financial_status=paid,pending  ?is_cod=true|false
+      ?start_date=YYYY-MM-DD&end_date=YYYY-MM-DD (order creation, org timezone)
+    ?refresh=1 runs an incremental sync first (?full=1 re-reads everything).
+    """
+
     def get(self, request):
+        org, _ = resolve_org(request)
+        refresh = request.query_params.get('refresh', '').lower() in ('1', 'true', 'yes') or _wants_full_sync(request)
         try:
-            orders = get_shopify_orders()
-            return Response(orders)
+            if not org:
+                return Response([order for page in iter_shopify_order_pages() for order in page])
+            if refresh:
+                with use_primary():
+                    sync_shopify_orders(org, full=_wants_full_sync(request))
         except ValueError as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+        if refresh:
+            # The replica may not have caught up with what the sync just wrote
+            with use_primary():
+                return self.list_orders(request, org)
+        return self.list_orders(request, org)
+
+    def list_orders(self, request, org):
+        orders = ShopifyOrder.objects.filter(organization=org)
+
+        financial_status = request.query_params.get('financial_status')
+        if financial_status:
+            orders = orders.filter(financial_status__in=financial_status.split(','))
+        is_cod = request.query_params.get('is_cod', '').lower()
+        if is_cod in ('1', 'true', 'yes', '0', 'false', 'no'):
+            orders = orders.filter(is_cod=is_cod in ('1', 'true', 'yes'))
+        start_date = parse_custom_date(request.query_params.get('start_date'))
+        end_date = parse_custom_date(request.query_params.get('end_date'))
+        if start_date:
+            orders = orders.filter(shopify_created_at__gte=start_date)
+        if end_date:
+            # Include the whole end day
+            orders = orders.filter(shopify_created_at__lt=end_date + timedelta(days=1))
+
+        paginator = StandardPagination()
+        page = paginator.paginate_queryset(
+            orders.order_by('-shopify_created_at', '-id').only('data'), request, view=self,
+        )
+        state = ShopifySyncState.objects.filter(organization=org).first()
+        response = paginator.get_paginated_response([o.data for o in page])
+        response.data['last_synced_at'] = state.last_synced_at if state else None
+        return response
+
 
 class FulfillOrderView(APIView):
     def post(self, request):
+        """
+        Mark a sale as shipping placed and queue its Shopify fulfillment,
+        which deliver_fulfillments sends in the background. Returns the job
+        id to poll at fulfill/<job_id>/.
+        """
         sale_id = request.data.get('sale_id')
         shopify_order_id = request.data.get('shopify_order_id')
         tracking_number = request.data.get('tracking_number')
@@ -90,28 +208,119 @@ class FulfillOrderView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        org, _ = resolve_org(request)
+        sales = Sale.objects.filter(organization=org) if org else Sale.objects.all()
         try:
-            sale = Sale.objects.get(id=sale_id)
-            sale.shipping_status = Sale.ShippingStatus.SHIPPING_PLACED
-            sale.save()
-        except Sale.DoesNotExist:
+            sale = sales.get(id=sale_id)
+        except (Sale.DoesNotExist, ValueError):
             return Response({'error': 'Sale not found'}, status=status.HTTP_404_NOT_FOUND)
 
+        fulfillment, created = request_fulfillment(
+            sale, shopify_order_id, tracking_number,
+            request.data.get('tracking_company') or 'Delhivery',
+        )
+        return Response({
+            'success': True,
+            'job_id': fulfillment.id,
+            'status': fulfillment.status,
+            'tracking_number': tracking_number,
+        }, status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK)
+
+
+class BulkFulfillView(APIView):
+    MAX_ORDERS = 250
+
+    def post(self, request):
+        """
+        Fulfill many orders at once.
+        Expected body:
+        {
+            "orders": [
+                {"sale_id": 12, "shopify_order_id": "123", "tracking_number": "AWB1"}
+            ]
+        }
+        Shopify is called concurrently; returns one result per order. Orders
+        whose call failed transiently stay queued for deliver_fulfillments.
+        """
+        orders = request.data.get('orders')
+        if not isinstance(orders, list) or not orders:
+            return Response({'error': 'orders must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(orders) > self.MAX_ORDERS:
+            return Response(
+                {'error': f'At most {self.MAX_ORDERS} orders per request'}, status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        org, _ = resolve_org(request)
+        sale_ids = {o.get('sale_id') for o in orders if isinstance(o, dict)}
+        sales = Sale.objects.filter(organization=org) if org else Sale.objects.all()
         try:
-            fulfillment = fulfill_shopify_order(shopify_order_id, tracking_number)
-            return Response({
-                'success': True,
-                'tracking_number': tracking_number,
-                'fulfillment_id': fulfillment.get('id'),
-            })
-        except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            sales = sales.in_bulk([sale_id for sale_id in sale_ids if sale_id])
+        except ValueError:
+            return Response({'error': 'sale_id must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = [None] * len(orders)
+        entries, positions = [], []
+        for i, order in enumerate(orders):
+            order = order if isinstance(order, dict) else {}
+            sale_id = order.get('sale_id')
+            if not all([sale_id, order.get('shopify_order_id'), order.get('tracking_number')]):
+                error = 'sale_id, shopify_order_id and tracking_number are required'
+            elif int(sale_id) not in sales:
+                error = 'Sale not found'
+            else:
+                entries.append({**order, 'sale_id': int(sale_id)})
+                positions.append(i)
+                continue
+            results[i] = {'sale_id': sale_id, 'shopify_order_id': order.get('shopify_order_id'), 'error': error}
+
+        if entries:
+            try:
+                fulfillments = bulk_fulfill(org, sales, entries)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            for i, fulfillment in zip(positions, fulfillments):
+                results[i] = {
+                    'sale_id': fulfillment.sale_id,
+                    'shopify_order_id': fulfillment.shopify_order_id,
+                    'job_id': fulfillment.id,
+                    'status': fulfillment.status,
+                    'fulfillment_id': fulfillment.fulfillment_id or None,
+                    'error': fulfillment.last_error or None,
+                }
+
+        delivered = sum(1 for r in results if r.get('status') == FulfillmentRequest.Status.DELIVERED)
+        return Response({'delivered': delivered, 'results': results})
+
+
+class FulfillmentStatusView(APIView):
+    def get(self, request, job_id):
+        """Delivery status of a queued fulfillment."""
+        org, _ = resolve_org(request)
+        jobs = FulfillmentRequest.objects.filter(organization=org) if org else FulfillmentRequest.objects.all()
+        try:
+            fulfillment = jobs.get(id=job_id)
+        except FulfillmentRequest.DoesNotExist:
+            return Response({'error': 'Fulfillment not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'job_id': fulfillment.id,
+            'sale_id': fulfillment.sale_id,
+            'shopify_order_id': fulfillment.shopify_order_id,
+            'tracking_number': fulfillment.tracking_number,
+            'status': fulfillment.status,
+            'attempts': fulfillment.attempts,
+            'next_attempt_at': fulfillment.next_attempt_at,
+            'error': fulfillment.last_error or None,
+            'fulfillment_id': fulfillment.fulfillment_id or None,
+            'delivered_at': fulfillment.delivered_at,
+        })
 
 
 class ShopifySyncView(APIView):
     """
     Pull-based Shopify sync.
     GET: Fetch Shopify orders not yet in StashPro, with suggested product matches.
+         Only orders changed since the org's sync cursor are pulled from
+         Shopify; ?full=1 resets the cursor and re-reads the whole history.
     POST: Confirm mappings and create Sale records.
     """
 
@@ -121,74 +330,88 @@ class ShopifySyncView(APIView):
         if not org:
             return Response({'error': 'No organization selected'}, status=status.HTTP_400_BAD_REQUEST)
 
+        full = _wants_full_sync(request)
         try:
-            shopify_orders = get_shopify_orders()
+            fetched = sync_shopify_orders(org, full=full)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        # Find which orders are already synced
-        existing_order_ids = set(
-            Sale.objects.filter(organization=org, shopify_order_id__isnull=False)
-            .values_list('shopify_order_id', flat=True)
-        )
+        # Orders fetched by this or an earlier sync that have no sale yet
+        synced_order_ids = Sale.objects.filter(
+            organization=org, shopify_order_id__isnull=False,
+        ).values('shopify_order_id')
+        shopify_orders = ShopifyOrder.objects.filter(organization=org).exclude(
+            shopify_order_id__in=synced_order_ids,
+        ).order_by('-shopify_created_at')
 
-        org_products = Product.objects.filter(organization=org, available_quantity__gt=0)
+        # Every line item is matched in memory against one index of the org's products
+        matcher = get_matcher(org)
+        pending_orders = []
+        page = []
+        for shopify_order in shopify_orders.iterator(chunk_size=SYNC_PAGE_SIZE):
+            page.append(shopify_order)
+            if len(page) == SYNC_PAGE_SIZE:
+                pending_orders.extend(self._match_page(matcher, page))
+                page = []
+        if page:
+            pending_orders.extend(self._match_page(matcher, page))
+
+        # Also return sync status
+        last_synced = Sale.objects.filter(
+            organization=org, shopify_order_id__isnull=False
+        ).order_by('-created_at').first()
+
+        unmatched = Sale.objects.filter(
+            organization=org, shopify_order_id__isnull=False, product__isnull=True
+        ).values('id', 'shopify_order_name', 'customer', 'sale_price', 'sale_date')
+
+        return Response({
+            'pending_orders': pending_orders,
+            'pending_count': len(pending_orders),
+            'last_synced_at': last_synced.created_at if last_synced else None,
+            'last_order_name': last_synced.shopify_order_name if last_synced else None,
+            'unmatched_count': unmatched.count(),
+            'unmatched_sales': list(unmatched),
+            'fetched_count': fetched,
+            'full_sync': full,
+        })
 
+    @staticmethod
+    def _match_page(matcher, shopify_orders):
+        """Pending-order entries for one page of orders, with ranked product suggestions."""
         pending_orders = []
-        for order in shopify_orders:
-            order_id = str(order['id'])
-            if order_id in existing_order_ids:
-                continue
+        for shopify_order in shopify_orders:
+            order = shopify_order.data
 
             # Try to match each line item to a product
             items_with_matches = []
             for item in order.get('items', []):
                 item_name = item.get('name', '')
-                suggested_product = None
-                suggestions = []
-
-                # Exact match
-                exact = org_products.filter(name__iexact=item_name).first()
-                if exact:
-                    suggested_product = {'id': exact.id, 'name': exact.name, 'price': float(exact.price)}
-
-                # Fuzzy matches for suggestions
-                fuzzy = org_products.filter(name__icontains=item_name.split(' ')[0])[:5]
-                suggestions = [{'id': p.id, 'name': p.name, 'price': float(p.price)} for p in fuzzy]
+                exact = matcher.exact(item_name)
+                suggestions = [
+                    {'id': p['id'], 'name': p['name'], 'price': float(p['price']), 'score': score}
+                    for p, score in matcher.suggest(item_name)
+                ]
 
                 items_with_matches.append({
                     'shopify_item_name': item_name,
                     'quantity': item.get('quantity', 1),
-                    'suggested_product': suggested_product,
+                    'suggested_product': (
+                        {'id': exact['id'], 'name': exact['name'], 'price': float(exact['price'])}
+                        if exact else None
+                    ),
                     'suggestions': suggestions,
                 })
 
             pending_orders.append({
-                'shopify_order_id': order_id,
+                'shopify_order_id': shopify_order.shopify_order_id,
                 'order_name': order['name'],
                 'created_at': order['created_at'],
                 'customer_name': order['customer_name'],
                 'total_price': order['total_price'],
                 'items': items_with_matches,
             })
-
-        # Also return sync status
-        last_synced = Sale.objects.filter(
-            organization=org, shopify_order_id__isnull=False
-        ).order_by('-created_at').first()
-
-        unmatched = Sale.objects.filter(
-            organization=org, shopify_order_id__isnull=False, product__isnull=True
-        ).values('id', 'shopify_order_name', 'customer', 'sale_price', 'sale_date')
-
-        return Response({
-            'pending_orders': pending_orders,
-            'pending_count': len(pending_orders),
-            'last_synced_at': last_synced.created_at if last_synced else None,
-            'last_order_name': last_synced.shopify_order_name if last_synced else None,
-            'unmatched_count': unmatched.count(),
-            'unmatched_sales': list(unmatched),
-        })
+        return pending_orders
 
     def post(self, request):
         """
@@ -217,79 +440,10 @@ class ShopifySyncView(APIView):
             return Response({'error': 'No organization selected'}, status=status.HTTP_400_BAD_REQUEST)
 
         orders_data = request.data.get('orders', [])
-        created_sales = 0
-        skipped = 0
-        errors = []
-
-        for order in orders_data:
-            shopify_order_id = str(order.get('shopify_order_id', ''))
-            order_name = order.get('order_name', '')
-
-            # Idempotency
-            if Sale.objects.filter(shopify_order_id=shopify_order_id).exists():
-                skipped += 1
-                continue
+        if not isinstance(orders_data, list):
+            return Response({'error': 'orders must be a list'}, status=status.HTTP_400_BAD_REQUEST)
 
-            items = order.get('items', [])
-            for i, item in enumerate(items):
-                product_id = item.get('product_id')
-                sale_price = item.get('sale_price', 0)
-                quantity = item.get('quantity', 1)
-
-                product = None
-                if product_id:
-                    try:
-                        product = Product.objects.get(id=product_id, organization=org)
-                    except Product.DoesNotExist:
-                        errors.append(f"Product {product_id} not found for order {order_name}")
-                        continue
-
-                # Unique order ID for multi-item orders
-                unique_id = shopify_order_id if i == 0 else f"{shopify_order_id}-{i+1}"
-
-                try:
-                    with transaction.atomic():
-                        # Determine funded_by_user from product's lot
-                        funded_by_user = None
-                        if product and product.lot and product.lot.funded_by == 'user':
-                            funded_by_user = product.lot.funded_by_user
-
-                        sale = Sale.objects.create(
-                            organization=org,
-                            product=product,
-                            quantity_sold=quantity,
-                            sale_price=sale_price,
-                            customer=order.get('customer', ''),
-                            sale_date=order.get('sale_date'),
-                            shopify_order_id=unique_id,
-                            shopify_order_name=order_name,
-                            shipping_status=Sale.ShippingStatus.SHIPPING_PENDING,
-                            funded_by_user=funded_by_user,
-                            cost_price=product.price if product else None,
-                        )
-                        sale.calculate_split()
-                        sale.save()
-
-                        if product:
-                            product.available_quantity = max(0, product.available_quantity - quantity)
-                            product.save()
-
-                        # Create shipping info if available
-                        customer_name = order.get('customer_name', '')
-                        address = order.get('address', '')
-                        if customer_name:
-                            ShippingInfo.objects.create(
-                                sale=sale,
-                                customer_name=customer_name,
-                                customer_email=order.get('customer', ''),
-                                customer_phone=order.get('phone', ''),
-                                customer_address=address,
-                                customer_pincode=order.get('pincode', ''),
-                            )
-
-                        created_sales += 1
-                except Exception as e:
-                    errors.append(f"Order {order_name} item {i}: {str(e)}")
+        created_sales, skipped, errors = create_shopify_sales(org, orders_data)
 
         return Response({
             'created_sales': created_sales,
@@ -0,0 +1,156 @@
+"""
+Shopify order webhooks.
+
+The receiver verifies a delivery's HMAC against the org's webhook secret and
+stores it in the ShopifyWebhookEvent inbox; process_pending_events (run by
+the process_shopify_webhooks command) folds the newest payload per order
+into ShopifyOrder and turns orders without a sale into pending sales.
+"""
+import base64
+import hashlib
+import hmac
+import logging
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from sales.models import Sale
+from .matching import get_matcher
+from .models import ShopifyOrder, ShopifyWebhookEvent
+from .services import _clean_order, _store_orders, create_shopify_sales
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_TOPICS = {'orders/create', 'orders/updated'}
+# Deliveries that keep failing are parked as failed after this many tries
+MAX_ATTEMPTS = 5
+# Wait before retrying a failed event, doubled after each further failure
+RETRY_BACKOFF = timedelta(seconds=30)
+MAX_RETRY_DELAY = timedelta(hours=1)
+
+
+def verify_hmac(secret, body, signature):
+    """True when signature is the base64 HMAC-SHA256 of the raw body under secret."""
+    if not secret or not signature:
+        return False
+    digest = base64.b64encode(hmac.new(secret.encode(), body, hashlib.sha256).digest()).decode()
+    return hmac.compare_digest(digest, signature)
+
+
+def receive_webhook(org, topic, webhook_id, payload):
+    """Store a verified delivery; returns None when it is a redelivery already stored."""
+    try:
+        with transaction.atomic():
+            return ShopifyWebhookEvent.objects.create(
+                organization=org,
+                topic=topic,
+                webhook_id=webhook_id or '',
+                shopify_order_id=str(payload.get('id', '')),
+                payload=payload,
+            )
+    except IntegrityError:
+        return None
+
+
+def _updated_at(event):
+    return parse_datetime(event.payload.get('updated_at') or '') or event.received_at
+
+
+def retry_delay(attempts):
+    """How long to wait before retrying an event that has failed attempts times."""
+    return min(RETRY_BACKOFF * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def process_pending_events(batch_size=100):
+    """
+    Process one batch of pending events that are due; returns how many were
+    claimed. Rows stay locked until the batch commits, so concurrent workers
+    skip them. Of several events for the same order only the newest is
+    applied. A failed event waits retry_delay() before its next attempt and
+    is parked as failed after MAX_ATTEMPTS.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(
+            ShopifyWebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(status=ShopifyWebhookEvent.Status.PENDING)
+            .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+            .select_related('organization')
+            .order_by('received_at', 'id')[:batch_size]
+        )
+        if not events:
+            return 0
+
+        latest = {}
+        for event in events:
+            key = (event.organization_id, event.shopify_order_id)
+            if key not in latest or _updated_at(event) >= _updated_at(latest[key]):
+                latest[key] = event
+
+        for event in events:
+            event.attempts += 1
+            if latest[(event.organization_id, event.shopify_order_id)] is not event:
+                event.status = ShopifyWebhookEvent.Status.SUPERSEDED
+                event.processed_at = now
+                continue
+            try:
+                with transaction.atomic():
+                    ingest_order(event.organization, event.payload)
+            except Exception as e:
+                logger.exception("Shopify webhook event %s failed", event.pk)
+                event.error = str(e)
+                if event.attempts >= MAX_ATTEMPTS:
+                    event.status = ShopifyWebhookEvent.Status.FAILED
+                else:
+                    event.next_attempt_at = timezone.now() + retry_delay(event.attempts)
+                continue
+            event.status = ShopifyWebhookEvent.Status.PROCESSED
+            event.error = ''
+            event.processed_at = now
+
+        ShopifyWebhookEvent.objects.bulk_update(
+            events, ['status', 'error', 'attempts', 'next_attempt_at', 'processed_at'],
+        )
+    return len(events)
+
+
+def ingest_order(org, payload):
+    """
+    Apply one order payload: refresh the local ShopifyOrder (unless a newer
+    copy is already stored) and, for an open order with no sale yet, create
+    its sales with exact product matches; other items stay unmatched.
+    """
+    order = _clean_order(payload)
+    order_id = str(order['id'])
+
+    stored = ShopifyOrder.objects.filter(organization=org, shopify_order_id=order_id).first()
+    updated_at = parse_datetime(order['updated_at'] or '')
+    if not (stored and stored.shopify_updated_at and updated_at and stored.shopify_updated_at > updated_at):
+        _store_orders(org, [order])
+
+    if payload.get('cancelled_at') or Sale.objects.filter(shopify_order_id=order_id).exists():
+        return
+
+    matcher = get_matcher(org)
+    items = []
+    for line_item in payload.get('line_items', []):
+        product = matcher.exact(line_item.get('name', ''))
+        items.append({
+            'product_id': product['id'] if product else None,
+            'sale_price': line_item.get('price', 0),
+            'quantity': line_item.get('quantity', 1),
+        })
+    create_shopify_sales(org, [{
+        'shopify_order_id': order_id,
+        'order_name': order['name'],
+        'customer': payload.get('email') or '',
+        'customer_name': order['customer_name'],
+        'phone': order['phone'],
+        'address': ', '.join(part for part in (order['address1'], order['address2'], order['city']) if part),
+        'pincode': order['zip'],
+        'sale_date': order['created_at'],
+        'items': items,
+    }])
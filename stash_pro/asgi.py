@@ -8,9 +8,44 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
 
 import os
+import sys
+from pathlib import Path
 
 from django.core.asgi import get_asgi_application
+from django.core.exceptions import ImproperlyConfigured
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stash_pro.settings')
+django_application = get_asgi_application()
+application = django_application
 
-application = get_asgi_application()
+# With MCP_MOUNT_PATH set (e.g. /mcp) this process also serves the MCP
+# server, its tools running against the ORM instead of calling the API.
+# The tools bypass Django's auth, so MCP_API_KEY must be set as well. The
+# MCP server's packages (fastmcp, starlette, ...) are not in the root
+# requirements: install mcp/requirements.txt too.
+MCP_MOUNT_PATH = os.getenv('MCP_MOUNT_PATH')
+if MCP_MOUNT_PATH:
+    MCP_DIR = Path(__file__).resolve().parent.parent / 'mcp'
+    sys.path.append(str(MCP_DIR))
+    os.environ.setdefault('MCP_BACKEND', 'orm')
+    try:
+        from starlette.applications import Starlette
+        from starlette.routing import Mount
+
+        import mcp_server
+    except ImportError as e:
+        raise ImproperlyConfigured(
+            f"MCP_MOUNT_PATH is set but the MCP server cannot be imported ({e}); "
+            f"install its dependencies with `pip install -r {MCP_DIR / 'requirements.txt'}`"
+        ) from e
+
+    mcp_application = mcp_server.asgi_app()
+    application = Starlette(
+        routes=[
+            Mount(MCP_MOUNT_PATH, app=mcp_application),
+            Mount('/', app=django_application),
+        ],
+        # Mounted apps get no lifespan events; run the MCP app's, which
+        # opens and closes its backend client
+        lifespan=lambda app: mcp_application.router.lifespan_context(mcp_application),
+    )
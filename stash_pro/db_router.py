@@ -0,0 +1,165 @@
+"""
+Read-replica routing.
+
+Reads go to the primary unless code opts in, either per view with
+ReplicaReadMixin or around a block with use_replica(). Writes always go to
+the primary. A user who just wrote is pinned to the primary for
+REPLICA_STICKY_SECONDS so they read their own writes; the marker lives in
+the shared cache (settings.CACHES), so it holds whichever worker serves the
+next request. If the replica alias is not configured or cannot be reached
+everything falls back to the primary, and no markers are kept. A failing
+cache never fails the request: reads fall back to the primary.
+"""
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+logger = logging.getLogger(__name__)
+
+# Alias reads are routed to in the current context; None means the primary
+_read_alias = contextvars.ContextVar('read_alias', default=None)
+# Per-request flag db_for_write sets so the middleware can pin the writer to
+# the primary; a mutable holder so it survives sync/async context copies
+_request_writes = contextvars.ContextVar('request_writes', default=None)
+
+# Seconds to keep using the primary after the replica failed to connect
+_REPLICA_RETRY_SECONDS = 30
+_replica_down_until = 0.0
+
+
+def replica_alias():
+    """The configured replica alias, or None when there is no replica."""
+    alias = getattr(settings, 'REPLICA_DATABASE_ALIAS', 'replica')
+    return alias if alias and alias in settings.DATABASES else None
+
+
+def _replica_available(alias):
+    global _replica_down_until
+    if time.monotonic() < _replica_down_until:
+        return False
+    try:
+        connections[alias].ensure_connection()
+    except DatabaseError:
+        logger.warning("Replica database '%s' is unreachable; reading from primary", alias)
+        _replica_down_until = time.monotonic() + _REPLICA_RETRY_SECONDS
+        return False
+    return True
+
+
+def _sticky_key(user_id):
+    return f'replica-sticky:{user_id}'
+
+
+def mark_recent_write(user):
+    """Pin a user's reads to the primary for REPLICA_STICKY_SECONDS; a no-op without a replica."""
+    if replica_alias() and user is not None and user.is_authenticated:
+        cache.set(_sticky_key(user.pk), True, getattr(settings, 'REPLICA_STICKY_SECONDS', 10))
+
+
+def has_recent_write(user):
+    if not replica_alias() or user is None or not user.is_authenticated:
+        return False
+    try:
+        return bool(cache.get(_sticky_key(user.pk)))
+    except Exception:
+        logger.warning("Could not read the replica stickiness marker; reading from primary", exc_info=True)
+        return True
+
+
+@contextmanager
+def use_replica(user=None):
+    """
+    Route reads inside the block to the replica, unless there is none, it is
+    down, or `user` wrote recently.
+    """
+    alias = replica_alias()
+    if alias and (has_recent_write(user) or not _replica_available(alias)):
+        alias = None
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """Route reads inside the block to the primary, e.g. to read-then-write."""
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    """Sends opted-in reads to the replica and everything else to the primary."""
+
+    def db_for_read(self, model, **hints):
+        if model is not None and model._meta.app_label == 'django_cache':
+            # The database cache must not read stale markers from the replica
+            return DEFAULT_DB_ALIAS
+        return _read_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        writes = _request_writes.get()
+        if writes is not None:
+            writes['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from the primary
+        return db != replica_alias()
+
+
+class ReplicaStickinessMiddleware:
+    """Pins a user to the primary after a request in which they wrote."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        writes = {'wrote': False}
+        token = _request_writes.set(writes)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_writes.reset(token)
+        if writes['wrote']:
+            # The write is committed; losing the marker only risks a stale read
+            try:
+                # DRF copies the authenticated user onto the Django request
+                mark_recent_write(getattr(request, 'user', None))
+            except Exception:
+                logger.warning("Could not store the replica stickiness marker", exc_info=True)
+        return response
+
+
+class ReplicaReadMixin:
+    """
+    Opt-in for DRF views: reads made while handling GET/HEAD/OPTIONS
+    requests go to the replica. Permission checks run first, on the primary.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            self._replica_reads = use_replica(request.user)
+            self._replica_reads.__enter__()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        replica_reads = getattr(self, '_replica_reads', None)
+        if replica_reads is not None:
+            self._replica_reads = None
+            replica_reads.__exit__(None, None, None)
+        return super().finalize_response(request, response, *args, **kwargs)
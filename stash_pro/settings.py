@@ -74,6 +74,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'stash_pro.db_router.ReplicaStickinessMiddleware',
 ]
 
 REST_FRAMEWORK = {
@@ -149,6 +150,41 @@ DATABASES = {
     }
 }
 
+# Optional read replica for analytics, list and export reads (see
+# stash_pro/db_router.py). Without DB_REPLICA_HOST every read uses default.
+if os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.getenv('DB_REPLICA_HOST'),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+    }
+
+DATABASE_ROUTERS = ['stash_pro.db_router.ReplicaRouter']
+REPLICA_DATABASE_ALIAS = 'replica'
+# After a write, the user's reads stay on the primary this long (replication lag)
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '10'))
+
+# With a replica the cache holds the read-your-writes markers, which every
+# worker must see: a user's next read can be served by another process.
+# REDIS_URL (e.g. redis://localhost:6379/0, needs the redis package) uses
+# Redis; otherwise a replica uses a table on the primary, created with
+# `python manage.py createcachetable`. Without a replica nothing needs
+# sharing and the default local-memory cache is kept.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+elif 'replica' in DATABASES:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'stash_cache',
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -0,0 +1,137 @@
+"""
+A local stand-in for the Shopify Admin REST API, served from a background
+thread so the shipping services can be exercised over real HTTP.
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+
+class FakeShopify:
+    """
+    Serves orders.json with status/updated_at_min filtering and Link-header
+    pagination, plus the fulfillment endpoints. Responses carry the call-limit
+    header; fail_next() queues error responses. Point SHOPIFY_STORE at `url`.
+    """
+
+    def __init__(self, page_size=2):
+        self.orders = []
+        self.page_size = page_size
+        self.requests = []
+        self.fulfillments = []
+        self.failures = []
+        self.call_limit = "1/40"
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, so the client's pooled connections are reused
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                fake.requests.append(self.path)
+                if fake._maybe_fail(self):
+                    return
+                parsed = urlparse(self.path)
+                if parsed.path.endswith('/orders.json'):
+                    return fake._orders_page(self, parse_qs(parsed.query))
+                if parsed.path.endswith('/fulfillment_orders.json'):
+                    order_id = int(parsed.path.split('/')[-2])
+                    return fake._json(self, {'fulfillment_orders': [{'id': order_id * 10}]})
+                if parsed.path.endswith('/fulfillments.json'):
+                    order_id = int(parsed.path.split('/')[-2])
+                    return fake._json(self, {'fulfillments': fake.order_fulfillments(order_id)})
+                fake._json(self, {'errors': 'Not Found'}, status=404)
+
+            def do_POST(self):
+                fake.requests.append(self.path)
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                if fake._maybe_fail(self):
+                    return
+                if urlparse(self.path).path.endswith('/fulfillments.json'):
+                    fulfillment = {'id': len(fake.fulfillments) + 1, **body.get('fulfillment', {})}
+                    fake.fulfillments.append(fulfillment)
+                    return fake._json(self, {'fulfillment': fulfillment}, status=201)
+                fake._json(self, {'errors': 'Not Found'}, status=404)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def add_order(self, order_id, updated_at, name=None, items=(("Canon AE-1", 1),), **extra):
+        order = {
+            'id': order_id,
+            'name': name or f"#{order_id}",
+            'created_at': updated_at,
+            'updated_at': updated_at,
+            'total_price': '5000.00',
+            'payment_gateway': 'manual',
+            'financial_status': 'paid',
+            'shipping_address': {'first_name': 'Test', 'last_name': 'Buyer', 'city': 'Pune'},
+            'line_items': [{'name': n, 'quantity': q} for n, q in items],
+            **extra,
+        }
+        self.orders = [o for o in self.orders if o['id'] != order_id] + [order]
+        return order
+
+    def order_fulfillments(self, order_id):
+        return [
+            f for f in self.fulfillments
+            if f.get('line_items_by_fulfillment_order', [{}])[0].get('fulfillment_order_id') == order_id * 10
+        ]
+
+    def fail_next(self, status, headers=None, times=1):
+        self.failures.extend([(status, headers or {})] * times)
+
+    def _maybe_fail(self, handler):
+        if not self.failures:
+            return False
+        status, headers = self.failures.pop(0)
+        handler.send_response(status)
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.send_header('Content-Length', '0')
+        handler.end_headers()
+        return True
+
+    def _json(self, handler, payload, status=200, headers=None):
+        body = json.dumps(payload).encode()
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(body)))
+        handler.send_header('X-Shopify-Shop-Api-Call-Limit', self.call_limit)
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def order_requests(self):
+        return [p for p in self.requests if '/orders.json' in p]
+
+    def _orders_page(self, handler, query):
+        orders = sorted(self.orders, key=lambda o: o['updated_at'])
+        if 'updated_at_min' in query:
+            orders = [o for o in orders if o['updated_at'] >= query['updated_at_min'][0]]
+        offset = int(query.get('page_info', ['0'])[0])
+        page = orders[offset:offset + self.page_size]
+
+        headers = {}
+        if offset + self.page_size < len(orders):
+            # Real page_info cursors encode the filters; the fake carries them in the URL
+            params = {'page_info': offset + self.page_size}
+            if 'updated_at_min' in query:
+                params['updated_at_min'] = query['updated_at_min'][0]
+            next_url = f"{self.url}/admin/api/2024-01/orders.json?{urlencode(params)}"
+            headers['Link'] = f'<{next_url}>; rel="next"'
+        self._json(handler, {'orders': page}, headers=headers)
@@ -0,0 +1,396 @@
+"""
+Analytics tests: monthly snapshots and the endpoints built on them.
+
+Run with:
+    SECRET_KEY=test-secret python manage.py test tests.test_analytics --settings=tests.test_settings
+"""
+import datetime
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now, make_aware
+from rest_framework import status
+
+from accounts.models import Organization, UserOrganization
+from analytics.jobs import MAX_ATTEMPTS, claim_next_job, run_pending_jobs, submit_report
+from analytics.models import MonthlySnapshot, ReportJob
+from analytics.snapshots import close_month, month_start
+from expense.models import Expenses
+from sales.models import Sale
+from tests.test_critical_paths import OrgAuthenticatedTestMixin
+
+
+def months_ago(n, day=10):
+    """Aware datetime on `day` of the month n months before the current one."""
+    month = month_start(now())
+    for _ in range(n):
+        month = (month - datetime.timedelta(days=1)).replace(day=1)
+    return make_aware(datetime.datetime(month.year, month.month, day, 12))
+
+
+class MonthlySnapshotTests(OrgAuthenticatedTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.old_sale = Sale.objects.create(
+            organization=self.org,
+            product=self.product,
+            quantity_sold=2,
+            sale_price=Decimal("6000.00"),
+            sale_date=months_ago(2),
+        )
+        Expenses.objects.create(
+            organization=self.org,
+            type=Expenses.ExpenseType.SHIPPING,
+            amount=Decimal("150.00"),
+            date=months_ago(2).date(),
+        )
+
+    def test_close_month_stores_totals(self):
+        snapshot = close_month(self.org, months_ago(2))
+        self.assertEqual(snapshot.revenue, Decimal("12000.00"))
+        self.assertEqual(snapshot.cost_of_goods_sold, Decimal("10000.00"))
+        self.assertEqual(snapshot.expenses, Decimal("150.00"))
+        self.assertEqual(Decimal(snapshot.expenses_by_type["shipping"]), Decimal("150.00"))
+        self.assertEqual(snapshot.sales_count, 1)
+
+    def test_open_month_cannot_be_closed(self):
+        with self.assertRaises(ValueError):
+            close_month(self.org, now())
+
+    def test_all_time_analytics_reads_snapshot(self):
+        close_month(self.org, months_ago(2))
+        # Bypasses signals, so only a live scan would see this change
+        Sale.objects.filter(id=self.old_sale.id).update(sale_price=Decimal("1.00"))
+
+        resp = self.client.get("/api/analytics/overall/")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["sales"], Decimal("12000.00"))
+        self.assertEqual(resp.data["expenses"], Decimal("150.00"))
+
+    def test_open_month_is_added_live(self):
+        close_month(self.org, months_ago(2))
+        Sale.objects.create(
+            organization=self.org,
+            product=self.product,
+            quantity_sold=1,
+            sale_price=Decimal("7000.00"),
+            sale_date=now(),
+        )
+        resp = self.client.get("/api/analytics/overall/")
+        self.assertEqual(resp.data["sales"], Decimal("19000.00"))
+        self.assertFalse(MonthlySnapshot.objects.get(organization=self.org).is_stale)
+
+    def test_back_dated_write_invalidates_snapshot(self):
+        close_month(self.org, months_ago(2))
+        Expenses.objects.create(
+            organization=self.org,
+            type=Expenses.ExpenseType.MISC,
+            amount=Decimal("50.00"),
+            date=months_ago(2, day=20).date(),
+        )
+        self.assertTrue(MonthlySnapshot.objects.get(organization=self.org).is_stale)
+
+        # Stale months are aggregated live; the read leaves the snapshot alone
+        resp = self.client.get("/api/analytics/overall/")
+        self.assertEqual(resp.data["expenses"], Decimal("200.00"))
+        self.assertTrue(MonthlySnapshot.objects.get(organization=self.org).is_stale)
+
+        call_command("run_report_jobs", "--once", stdout=StringIO())
+        snapshot = MonthlySnapshot.objects.get(organization=self.org)
+        self.assertFalse(snapshot.is_stale)
+        self.assertEqual(snapshot.expenses, Decimal("200.00"))
+
+    def test_product_price_change_invalidates_its_sale_months(self):
+        close_month(self.org, months_ago(2))
+        self.product.price = Decimal("4000.00")
+        self.product.save()
+        self.assertTrue(MonthlySnapshot.objects.get(organization=self.org).is_stale)
+
+        resp = self.client.get("/api/analytics/overall/")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["sales"], Decimal("12000.00"))
+
+    def test_shipping_status_change_keeps_snapshot(self):
+        close_month(self.org, months_ago(2))
+        self.old_sale.shipping_status = Sale.ShippingStatus.SHIPPED
+        self.old_sale.save()
+        self.assertFalse(MonthlySnapshot.objects.get(organization=self.org).is_stale)
+
+    def test_close_month_command_backfill(self):
+        out = StringIO()
+        call_command("close_month", "--org", self.org.slug, "--backfill", stdout=out)
+        months = list(MonthlySnapshot.objects.filter(organization=self.org).values_list("month", flat=True))
+        self.assertIn(month_start(months_ago(2)), months)
+        self.assertNotIn(month_start(now()), months)
+
+
+class PeriodComparisonTests(OrgAuthenticatedTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        for sale_date, price in ((now(), "6000.00"), (months_ago(1, day=1), "4000.00")):
+            Sale.objects.create(
+                organization=self.org,
+                product=self.product,
+                quantity_sold=1,
+                sale_price=Decimal(price),
+                sale_date=sale_date,
+            )
+
+    def test_overall_previous_period(self):
+        resp = self.client.get("/api/analytics/overall/?duration=current_month&compare=previous_period")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["sales"], Decimal("6000.00"))
+        comparison = resp.data["comparison"]
+        self.assertEqual(comparison["sales"], Decimal("4000.00"))
+        self.assertEqual(comparison["deltas"]["sales"]["change"], 2000.0)
+        self.assertEqual(comparison["deltas"]["sales"]["percent"], 50.0)
+
+    def test_comparison_does_not_add_queries(self):
+        with CaptureQueriesContext(connection) as plain:
+            self.client.get("/api/analytics/overall/?duration=current_month")
+        with CaptureQueriesContext(connection) as compared:
+            self.client.get("/api/analytics/overall/?duration=current_month&compare=previous_period")
+        self.assertEqual(len(plain), len(compared))
+
+    def test_compare_requires_window(self):
+        resp = self.client.get("/api/analytics/overall/?compare=previous_year")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_daily_sales_previous_period(self):
+        resp = self.client.get("/api/sales/daily_sales/?duration=current_month&compare=previous_period")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        comparison = resp.data["comparison"]
+        self.assertEqual(comparison["totals"]["current"]["total_amount"], 6000.0)
+        self.assertEqual(comparison["totals"]["previous"]["total_amount"], 4000.0)
+        self.assertEqual(comparison["daily_sales"][0]["total_sales"], 1)
+        self.assertEqual(len(resp.data["daily_sales"]), now().day)
+
+
+class GranularityTests(OrgAuthenticatedTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        for sale_date, price in ((months_ago(1, day=3), "4000.00"), (months_ago(1, day=20), "6000.00")):
+            Sale.objects.create(
+                organization=self.org,
+                product=self.product,
+                quantity_sold=1,
+                sale_price=Decimal(price),
+                sale_date=sale_date,
+            )
+
+    def test_monthly_buckets_are_zero_filled(self):
+        resp = self.client.get("/api/sales/daily_sales/?duration=current_year&granularity=month")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["granularity"], "month")
+        series = resp.data["daily_sales"]
+        self.assertEqual(len(series), now().month)
+        self.assertTrue(all(item["date"].endswith("-01") for item in series))
+        if months_ago(1).year == now().year:
+            last_month = months_ago(1, day=1).strftime("%Y-%m-%d")
+            entry = next(item for item in series if item["date"] == last_month)
+            self.assertEqual(entry["total_sales"], 2)
+            self.assertEqual(entry["total_amount"], 10000.0)
+
+    def test_all_time_fills_between_first_and_last_bucket(self):
+        resp = self.client.get("/api/sales/daily_sales/?granularity=week")
+        series = resp.data["daily_sales"]
+        self.assertEqual(sum(item["total_sales"] for item in series), 2)
+        self.assertGreater(len(series), 2)
+
+    def test_invalid_granularity(self):
+        resp = self.client.get("/api/sales/daily_sales/?granularity=hour")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        resp = self.client.get("/api/analytics/products/?granularity=hour")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_buckets_follow_org_timezone(self):
+        # 23:30 UTC on the last day of a month is already the next month in Tokyo
+        first = months_ago(1, day=1)
+        late = make_aware(datetime.datetime(first.year, first.month, 1, 23, 30)) - datetime.timedelta(days=1)
+        Sale.objects.all().delete()
+        Sale.objects.create(
+            organization=self.org, product=self.product, quantity_sold=1,
+            sale_price=Decimal("100.00"), sale_date=late,
+        )
+        resp = self.client.get("/api/sales/daily_sales/?granularity=month")
+        self.assertEqual(resp.data["daily_sales"][0]["date"], month_start(late).strftime("%Y-%m-%d"))
+
+        self.org.timezone = "Asia/Tokyo"
+        self.org.save()
+        resp = self.client.get("/api/sales/daily_sales/?granularity=month")
+        self.assertEqual(resp.data["daily_sales"][0]["date"], first.strftime("%Y-%m-01"))
+
+    def test_product_trend_quarter_labels(self):
+        resp = self.client.get("/api/analytics/products/?granularity=quarter")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        trend = resp.data["monthly_by_category"]
+        self.assertEqual(sum(row["units"] for row in trend), 2)
+        self.assertTrue(all("-Q" in row["period"] for row in trend))
+
+    def test_user_series_keeps_month_key(self):
+        resp = self.client.get("/api/analytics/users/")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        for user in resp.data:
+            for entry in user["monthly"]:
+                self.assertEqual(entry["month"], entry["period"])
+        resp = self.client.get("/api/analytics/users/?granularity=year")
+        self.assertTrue(all(e["month"] == f'{e["period"]}-01' for u in resp.data for e in u["monthly"]))
+
+    def test_product_trend_month_is_a_datetime(self):
+        resp = self.client.get("/api/analytics/products/")
+        trend = resp.data["monthly_by_category"]
+        self.assertTrue(trend)
+        for row in trend:
+            self.assertIsInstance(row["month"], datetime.datetime)
+            self.assertEqual(row["month"].strftime("%Y-%m"), row["period"])
+
+
+class ReportJobTests(OrgAuthenticatedTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        Sale.objects.create(
+            organization=self.org,
+            product=self.product,
+            quantity_sold=1,
+            sale_price=Decimal("6000.00"),
+            sale_date=now(),
+        )
+
+    def submit(self, kind, **params):
+        return self.client.post("/api/analytics/reports/", {"kind": kind, "params": params}, format="json")
+
+    def test_job_result_matches_synchronous_report(self):
+        resp = self.submit("overall", duration="current_month")
+        self.assertEqual(resp.status_code, status.HTTP_202_ACCEPTED)
+        job_id = resp.data["id"]
+
+        resp = self.client.get(f"/api/analytics/reports/{job_id}/result/")
+        self.assertEqual(resp.status_code, status.HTTP_409_CONFLICT)
+
+        call_command("run_report_jobs", "--once", stdout=StringIO())
+
+        resp = self.client.get(f"/api/analytics/reports/{job_id}/")
+        self.assertEqual(resp.data["status"], ReportJob.Status.DONE)
+        result = self.client.get(f"/api/analytics/reports/{job_id}/result/").json()
+        live = self.client.get("/api/analytics/overall/?duration=current_month").json()
+        self.assertEqual(result, live)
+
+    def test_in_flight_requests_are_deduplicated(self):
+        first = self.submit("products", granularity="quarter")
+        second = self.submit("products", granularity="quarter", ignored="x")
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data["id"], second.data["id"])
+
+        run_pending_jobs()
+        third = self.submit("products", granularity="quarter")
+        self.assertEqual(third.status_code, status.HTTP_202_ACCEPTED)
+        self.assertNotEqual(third.data["id"], first.data["id"])
+
+    def test_invalid_params_are_rejected_at_submit(self):
+        self.assertEqual(self.submit("users", granularity="hour").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.submit("bogus").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.submit("users", start_date="2026-13-01").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(ReportJob.objects.exists())
+
+    def test_viewer_cannot_read_overall_report(self):
+        overall_id = self.submit("overall").data["id"]
+        users_id = self.submit("users").data["id"]
+        run_pending_jobs()
+        UserOrganization.objects.filter(user=self.user).update(role=UserOrganization.Role.VIEWER)
+
+        for url in (f"/api/analytics/reports/{overall_id}/", f"/api/analytics/reports/{overall_id}/result/"):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        resp = self.client.get(f"/api/analytics/reports/{users_id}/result/")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_submit_retries_when_competing_job_already_finished(self):
+        create = ReportJob.objects.create
+        calls = []
+
+        def lose_first_race(**fields):
+            calls.append(fields)
+            if len(calls) == 1:
+                raise IntegrityError("duplicate in-flight report")
+            return create(**fields)
+
+        with mock.patch.object(ReportJob.objects, "create", side_effect=lose_first_race):
+            job, created = submit_report(self.org, self.user, "products", {})
+        self.assertTrue(created)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(job.status, ReportJob.Status.QUEUED)
+
+    def test_job_that_keeps_killing_its_worker_is_failed(self):
+        job, _ = submit_report(self.org, self.user, "products", {})
+        stale_after = datetime.timedelta(minutes=30)
+        long_ago = now() - datetime.timedelta(hours=1)
+        for _ in range(MAX_ATTEMPTS):
+            self.assertEqual(claim_next_job(stale_after).pk, job.pk)
+            # The worker dies mid-run
+            ReportJob.objects.filter(pk=job.pk).update(started_at=long_ago)
+
+        self.assertIsNone(claim_next_job(stale_after))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.Status.FAILED)
+        self.assertEqual(job.attempts, MAX_ATTEMPTS)
+        self.assertIn("attempts", job.error)
+
+    def test_jobs_are_scoped_to_org(self):
+        job = ReportJob.objects.create(kind="users", params={}, params_hash="x")
+        resp = self.client.get(f"/api/analytics/reports/{job.id}/")
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ExpenseSummaryTests(OrgAuthenticatedTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        other_org = Organization.objects.create(name="Other Org", slug="other-org")
+        for org, type_, amount, vendor, date in (
+            (self.org, Expenses.ExpenseType.SHIPPING, "150.00", "DHL", months_ago(2).date()),
+            (self.org, Expenses.ExpenseType.SHIPPING, "50.00", "FedEx", months_ago(2, day=20).date()),
+            (self.org, Expenses.ExpenseType.MISC, "25.00", "DHL", now().date()),
+            (other_org, Expenses.ExpenseType.SHIPPING, "999.00", "DHL", now().date()),
+        ):
+            Expenses.objects.create(organization=org, type=type_, amount=Decimal(amount), vendor=vendor, date=date)
+
+    def test_summary_is_org_scoped(self):
+        resp = self.client.get("/api/expenses/summary/")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["overall_total"], 225.0)
+        self.assertEqual(resp.data["total_count"], 3)
+        self.assertEqual(resp.data["summary_by_type"]["shipping"], {
+            "display_name": "Shipping", "total_amount": 200.0, "count": 2,
+        })
+        self.assertEqual(resp.data["summary_by_type"]["refund"]["count"], 0)
+
+    def test_summary_query_count_does_not_grow_with_types(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/api/expenses/summary/?group_by=month")
+        summary_queries = [q for q in queries if "expense_expenses" in q["sql"] or "monthlysnapshot" in q["sql"]]
+        self.assertEqual(len(summary_queries), 2)
+
+    def test_group_by_month_mixes_snapshots_and_live_rows(self):
+        close_month(self.org, months_ago(2))
+        # Bypasses signals, so only a live scan would see this change
+        Expenses.objects.filter(vendor="FedEx").update(amount=Decimal("1.00"))
+
+        resp = self.client.get("/api/expenses/summary/?group_by=month")
+        groups = {g["month"]: g for g in resp.data["groups"]}
+        closed = groups[months_ago(2).strftime("%Y-%m")]
+        self.assertEqual(closed["total_amount"], 200.0)
+        self.assertEqual(closed["summary_by_type"]["shipping"]["count"], 2)
+        self.assertEqual(groups[now().strftime("%Y-%m")]["total_amount"], 25.0)
+
+    def test_group_by_vendor(self):
+        resp = self.client.get("/api/expenses/summary/?group_by=vendor&type=shipping")
+        groups = {g["vendor"]: g for g in resp.data["groups"]}
+        self.assertEqual(set(groups), {"DHL", "FedEx"})
+        self.assertEqual(groups["DHL"]["total_amount"], 150.0)
+
+    def test_invalid_group_by(self):
+        resp = self.client.get("/api/expenses/summary/?group_by=day")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
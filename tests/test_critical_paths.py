@@ -13,6 +13,7 @@ from django.utils.timezone import now
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from accounts.models import Organization, UserOrganization
 from inventory.models import Product, Lot, Payment
 from sales.models import Sale
 from expense.models import Expenses
@@ -102,6 +103,21 @@ class AuthenticatedTestMixin:
         )
 
 
+class OrgAuthenticatedTestMixin(AuthenticatedTestMixin):
+    """AuthenticatedTestMixin with the user as owner of an organization that owns the test data."""
+
+    role = UserOrganization.Role.OWNER
+
+    def setUp(self):
+        super().setUp()
+        self.org = Organization.objects.create(name="Test Org", slug="test-org")
+        UserOrganization.objects.create(user=self.user, organization=self.org, role=self.role)
+        self.lot.organization = self.org
+        self.lot.save()
+        self.product.organization = self.org
+        self.product.save()
+
+
 # ---------------------------------------------------------------------------
 # 2. Sale creation tests
 # ---------------------------------------------------------------------------
@@ -0,0 +1,120 @@
+"""
+Read-replica routing tests. The test settings define a "replica" alias
+mirroring "default": a second connection to the test database. Routing to
+it is off by default; these tests turn it on and commit their data
+(TransactionTestCase) so the replica connection sees it, as a real replica
+would.
+
+Run with:
+    SECRET_KEY=test-secret python manage.py test tests.test_db_router --settings=tests.test_settings
+"""
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.cache.backends.db import DatabaseCache
+from django.db import DatabaseError, connections
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+
+from stash_pro.db_router import ReplicaRouter, has_recent_write, mark_recent_write, use_primary, use_replica
+from tests.test_critical_paths import OrgAuthenticatedTestMixin
+
+
+@override_settings(REPLICA_DATABASE_ALIAS="replica")
+class ReplicaRoutingTests(OrgAuthenticatedTestMixin, TransactionTestCase):
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def read_aliases(self, method, url, data=None):
+        """Aliases whose connections ran SELECTs while handling one request."""
+        with CaptureQueriesContext(connections["default"]) as primary, \
+                CaptureQueriesContext(connections["replica"]) as replica:
+            resp = getattr(self.client, method)(url, data, format="json")
+        aliases = {
+            alias for alias, queries in (("default", primary), ("replica", replica))
+            if any(q["sql"].lstrip().upper().startswith("SELECT") for q in queries)
+        }
+        return resp, aliases
+
+    def test_opted_in_list_reads_from_replica(self):
+        resp, aliases = self.read_aliases("get", "/api/inventory/products/")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertIn("replica", aliases)
+        self.assertEqual([p["id"] for p in resp.data], [self.product.id])
+
+    def test_views_without_opt_in_read_from_primary(self):
+        resp, aliases = self.read_aliases("get", "/api/auth/me/")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertNotIn("replica", aliases)
+
+    def test_writes_go_to_primary_and_pin_the_writer(self):
+        self.assertEqual(ReplicaRouter().db_for_write(None), "default")
+        resp, aliases = self.read_aliases(
+            "patch", f"/api/inventory/products/{self.product.id}/", {"name": "Canon A-1"},
+        )
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertNotIn("replica", aliases)
+
+        _, aliases = self.read_aliases("get", "/api/inventory/products/")
+        self.assertNotIn("replica", aliases)
+
+    def test_order_list_after_refresh_reads_from_primary(self):
+        resp, aliases = self.read_aliases("get", "/api/shipping/orders/")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertIn("replica", aliases)
+
+        with mock.patch("shipping.views.sync_shopify_orders") as sync:
+            resp, aliases = self.read_aliases("get", "/api/shipping/orders/?refresh=1")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        sync.assert_called_once()
+        self.assertNotIn("replica", aliases)
+
+    def test_stickiness_expires(self):
+        with override_settings(REPLICA_STICKY_SECONDS=0):
+            mark_recent_write(self.user)
+        _, aliases = self.read_aliases("get", "/api/inventory/products/")
+        self.assertIn("replica", aliases)
+
+    def test_no_markers_without_a_replica(self):
+        with override_settings(REPLICA_DATABASE_ALIAS=None):
+            mark_recent_write(self.user)
+            self.assertFalse(has_recent_write(self.user))
+        self.assertFalse(has_recent_write(self.user))
+
+    def test_cache_failure_does_not_fail_the_write(self):
+        with mock.patch("stash_pro.db_router.cache.set", side_effect=DatabaseError("no table")):
+            resp = self.client.patch(
+                f"/api/inventory/products/{self.product.id}/", {"name": "Canon A-1"}, format="json",
+            )
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.name, "Canon A-1")
+
+        with mock.patch("stash_pro.db_router.cache.get", side_effect=DatabaseError("no table")):
+            _, aliases = self.read_aliases("get", "/api/inventory/products/")
+        self.assertNotIn("replica", aliases)
+
+    def test_missing_replica_falls_back_to_primary(self):
+        with override_settings(REPLICA_DATABASE_ALIAS="reporting"):
+            resp, aliases = self.read_aliases("get", "/api/inventory/products/")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(aliases, {"default"})
+
+    def test_use_primary_overrides_use_replica(self):
+        router = ReplicaRouter()
+        with use_replica() as alias:
+            self.assertEqual(alias, "replica")
+            self.assertEqual(router.db_for_read(None), "replica")
+            with use_primary():
+                self.assertEqual(router.db_for_read(None), "default")
+        self.assertEqual(router.db_for_read(None), "default")
+
+    def test_database_cache_reads_stay_on_primary(self):
+        cache_model = DatabaseCache("stash_cache", {}).cache_model_class
+        with use_replica():
+            self.assertEqual(ReplicaRouter().db_for_read(cache_model), "default")
@@ -0,0 +1,104 @@
+"""
+Streaming CSV/XLSX exports of the product, sale and expense lists.
+
+Run with:
+    SECRET_KEY=test-secret python manage.py test tests.test_exports --settings=tests.test_settings
+"""
+import csv
+import datetime
+import io
+from decimal import Decimal
+
+import openpyxl
+from django.test import TestCase
+from rest_framework import status
+
+from accounts.models import Organization
+from expense.models import Expenses
+from sales.models import Sale
+from tests.test_critical_paths import OrgAuthenticatedTestMixin
+
+
+class ExportTests(OrgAuthenticatedTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.org.timezone = "Asia/Kolkata"
+        self.org.save()
+        sale_date = datetime.datetime(2026, 3, 20, 20, 0, tzinfo=datetime.timezone.utc)
+        for shipping_status in (Sale.ShippingStatus.SHIPPING_PENDING, Sale.ShippingStatus.SHIPPED):
+            Sale.objects.create(
+                organization=self.org, product=self.product, quantity_sold=1, sale_price=Decimal("6000.50"),
+                sale_date=sale_date, shipping_status=shipping_status, customer="Asha, Rao",
+            )
+        other_org = Organization.objects.create(name="Other", slug="other")
+        Sale.objects.create(
+            organization=other_org, product=self.product, quantity_sold=1, sale_price=1,
+            sale_date=sale_date, shipping_status=Sale.ShippingStatus.SHIPPED,
+        )
+
+    def export_rows(self, url, **params):
+        resp = self.client.get(url, params)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp.streaming)
+        self.assertIn("attachment;", resp["Content-Disposition"])
+        return list(csv.reader(io.StringIO(b"".join(resp.streaming_content).decode("utf-8-sig"))))
+
+    def test_csv_export_honours_filters_and_org_scope(self):
+        rows = self.export_rows("/api/sales/export/", shipping_status=Sale.ShippingStatus.SHIPPED)
+        header, (row,) = rows[0], rows[1:]
+        sale = dict(zip(header, row))
+        self.assertEqual(sale["Shipping status"], Sale.ShippingStatus.SHIPPED)
+        self.assertEqual(sale["Customer"], "Asha, Rao")
+        self.assertEqual(sale["Sale price"], "6000.50")
+        self.assertEqual(sale["Product"], self.product.name)
+        self.assertEqual(sale["Sale date"], "2026-03-21T01:30:00+05:30")  # Org's local time
+        self.assertEqual(sale["Refunded at"], "")
+
+    def test_csv_export_is_not_paginated(self):
+        Expenses.objects.bulk_create([
+            Expenses(organization=self.org, type=Expenses.ExpenseType.MISC, amount=i, date=datetime.date(2026, 3, 1))
+            for i in range(60)
+        ])
+        rows = self.export_rows("/api/expenses/export/", ordering="amount")
+        self.assertEqual(len(rows), 61)
+        self.assertEqual([row[3] for row in rows[1:3]], ["0.00", "1.00"])
+
+    def test_expense_export_uses_org_timezone(self):
+        expense = Expenses.objects.create(
+            organization=self.org, type=Expenses.ExpenseType.MISC, amount=10, date=datetime.date(2026, 3, 20),
+        )
+        Expenses.objects.filter(pk=expense.pk).update(
+            created_at=datetime.datetime(2026, 3, 20, 20, 0, tzinfo=datetime.timezone.utc),
+        )
+        header, row = self.export_rows("/api/expenses/export/")
+        self.assertEqual(dict(zip(header, row))["Created at"], "2026-03-21T01:30:00+05:30")
+
+    def test_xlsx_export(self):
+        resp = self.client.get("/api/inventory/products/export/", {"file_format": "xlsx", "search": "Canon"})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        sheet = openpyxl.load_workbook(io.BytesIO(b"".join(resp.streaming_content))).worksheets[0]
+        header, *rows = sheet.iter_rows(values_only=True)
+        self.assertEqual(len(rows), 1)
+        product = dict(zip(header, rows[0]))
+        self.assertEqual(product["Name"], self.product.name)
+        self.assertEqual(product["Lot"], self.lot.title)
+
+    def test_formula_text_is_neutralised(self):
+        Sale.objects.update(customer="=HYPERLINK(\"http://evil\")")
+        self.product.name = "@SUM(A1)"
+        self.product.save()
+
+        rows = self.export_rows("/api/sales/export/")
+        sale = dict(zip(rows[0], rows[1]))
+        self.assertEqual(sale["Customer"], "'=HYPERLINK(\"http://evil\")")
+        self.assertEqual(sale["Sale price"], "6000.50")
+
+        resp = self.client.get("/api/inventory/products/export/", {"file_format": "xlsx"})
+        sheet = openpyxl.load_workbook(io.BytesIO(b"".join(resp.streaming_content))).worksheets[0]
+        header, *rows = sheet.iter_rows(values_only=True)
+        self.assertEqual(dict(zip(header, rows[0]))["Name"], "'@SUM(A1)")
+
+    def test_unknown_format_is_rejected(self):
+        resp = self.client.get("/api/sales/export/", {"file_format": "pdf"})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("error", resp.data)
@@ -0,0 +1,157 @@
+"""
+import_fci_data: streaming, idempotent import of the FCI workbook.
+
+Run with:
+    SECRET_KEY=test-secret python manage.py test tests.test_fci_import --settings=tests.test_settings
+"""
+import datetime
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+import openpyxl
+from django.core.management import call_command
+from django.test import TestCase
+
+from accounts.models import Organization
+from expense.models import Expenses
+from inventory.models import Lot, Product
+from sales.models import Sale
+
+INVENTORY_HEADER = [
+    "Product ID", "Lot", "Type", "Buyer", "Name", "Date", "Source", "Buying Price",
+    "Remarks", "Selling Price", "", "", "Sold", "Status",
+]
+
+
+def inventory_row(product_id, lot, name, price, buyer="FCI", sold="No", status="Listed"):
+    return [
+        product_id, lot, "SLR", buyer, name, datetime.datetime(2026, 3, 5), "OLX", price,
+        "Clean", None, None, None, sold, status,
+    ]
+
+
+class FCIImportTests(TestCase):
+    def setUp(self):
+        self.org = Organization.objects.create(name="FCI", slug="fci")
+        self.inventory = [
+            inventory_row(1, 10, "Canon AE-1", 4000, sold="Yes"),
+            inventory_row(2, 10, "Pentax K1000", 3000, sold="Yes"),
+            inventory_row(3, 11, "Nikon FM2", 9000, buyer="Jayesh"),
+        ]
+        self.sales = [
+            ["#1201", datetime.datetime(2026, 3, 20, 10, 0), "#1201", "a@example.com", 9000, 1, 2],
+            ["#1202", datetime.datetime(2026, 3, 21, 10, 0), "#1202", "b@example.com", 12000, 3, None],
+        ]
+        self.expenses = [
+            [1, datetime.date(2026, 3, 22), "Misc", "Delhivery pickup", "Jayesh", 250],
+            [2, datetime.date(2026, 3, 22), "Misc", "Delhivery pickup", "Jayesh", 250],
+        ]
+
+    def write_workbook(self):
+        wb = openpyxl.Workbook()
+        sheets = (("Inventory", INVENTORY_HEADER, self.inventory), ("Sales", ["Order"], self.sales),
+                  ("Expenses", ["#"], self.expenses))
+        wb.remove(wb.active)
+        for title, header, rows in sheets:
+            ws = wb.create_sheet(title)
+            ws.append(header)
+            for row in rows:
+                ws.append(row)
+        fd, path = tempfile.mkstemp(suffix=".xlsx")
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        wb.save(path)
+        return path
+
+    def run_import(self, *args):
+        out = StringIO()
+        call_command("import_fci_data", self.write_workbook(), "--org", "fci", *args, stdout=out)
+        return out.getvalue()
+
+    def test_import_creates_rows_from_each_sheet(self):
+        out = self.run_import()
+        self.assertIn("lots: 2 created", out)
+        self.assertIn("sales: 3 created", out)
+
+        lot = Lot.objects.get(organization=self.org, external_id="10")
+        self.assertEqual(lot.total_price, Decimal("7000"))
+        self.assertEqual(lot.funded_by, Lot.FundingSource.ORG)
+        self.assertEqual(Lot.objects.get(external_id="11").funded_by_user.username, "jayesh")
+
+        canon = Product.objects.get(organization=self.org, external_id="1")
+        self.assertEqual(canon.lot, lot)
+        self.assertEqual(canon.available_quantity, 0)
+
+        first, second = Sale.objects.filter(shopify_order_name="#1201").order_by("shopify_order_id")
+        self.assertEqual((first.shopify_order_id, first.sale_price), ("#1201", Decimal("9000")))
+        self.assertEqual((second.shopify_order_id, second.sale_price), ("#1201-2", Decimal("0")))
+        user_funded = Sale.objects.get(shopify_order_id="#1202")
+        self.assertEqual(user_funded.user_payout, Decimal("9000"))
+        self.assertEqual(user_funded.org_revenue, Decimal("3000"))
+
+        self.assertEqual(Expenses.objects.filter(type=Expenses.ExpenseType.SHIPPING).count(), 2)
+
+    def test_rerun_only_writes_changes(self):
+        self.run_import()
+        self.inventory[2][7] = 9500
+        out = self.run_import()
+
+        self.assertIn("lots: 0 created, 1 updated, 1 unchanged", out)
+        self.assertIn("products: 0 created, 1 updated, 2 unchanged", out)
+        self.assertIn("sales: 0 created, 1 updated, 2 unchanged", out)
+        self.assertIn("expenses: 0 created, 0 updated, 2 unchanged", out)
+        self.assertEqual(Product.objects.count(), 3)
+        self.assertEqual(Sale.objects.get(shopify_order_id="#1202").cost_price, Decimal("9500"))
+
+    def test_dry_run_reports_without_saving(self):
+        out = self.run_import("--dry-run")
+        self.assertIn("products: 3 created", out)
+        self.assertIn("Dry run", out)
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(Sale.objects.exists())
+
+    def test_unknown_product_is_reported(self):
+        self.sales.append(["#1203", datetime.datetime(2026, 3, 22), "#1203", "c@example.com", 500, 99, None])
+        out = self.run_import()
+        self.assertIn("Sale #1203: product 99 not found", out)
+        self.assertEqual(Sale.objects.count(), 3)
+
+    def test_edited_expense_is_updated_in_place(self):
+        self.run_import()
+        self.expenses[0][5] = 300
+        self.expenses[0][3] = "Delhivery pickup (2 parcels)"
+        out = self.run_import()
+        self.assertIn("expenses: 0 created, 1 updated, 1 unchanged", out)
+        self.assertEqual(Expenses.objects.filter(organization=self.org).count(), 2)
+        self.assertEqual(Expenses.objects.get(organization=self.org, external_id="1").amount, Decimal("300"))
+
+    def test_first_run_adopts_rows_from_the_old_script(self):
+        # What import_fci_data.py left behind: the same rows, without external ids
+        lots = {
+            num: Lot.objects.create(organization=self.org, title=f"Lot #{num}", total_price=0,
+                                    bought_on=datetime.date(2026, 3, 5))
+            for num in (10, 11)
+        }
+        canon = Product.objects.create(organization=self.org, lot=lots[10], name="Canon AE-1", price=4000)
+        Product.objects.create(organization=self.org, lot=lots[10], name="Pentax K1000", price=3000)
+        Product.objects.create(organization=self.org, lot=lots[11], name="Nikon FM2", price=9000)
+        Sale.objects.create(organization=self.org, product=canon, quantity_sold=1, sale_price=9000,
+                            sale_date=datetime.datetime(2026, 3, 20, tzinfo=datetime.timezone.utc),
+                            shopify_order_id="#1201")
+        for _ in range(2):
+            Expenses.objects.create(organization=self.org, type=Expenses.ExpenseType.SHIPPING, amount=250,
+                                    description="Delhivery pickup", vendor="Jayesh", date=datetime.date(2026, 3, 22))
+
+        out = self.run_import()
+        self.assertIn("Matched 3 products", out)
+        self.assertIn("lots: 0 created", out)
+        self.assertIn("products: 0 created", out)
+        self.assertIn("expenses: 0 created", out)
+        self.assertEqual(Lot.objects.filter(organization=self.org).count(), 2)
+        self.assertEqual(Product.objects.filter(organization=self.org).count(), 3)
+        canon.refresh_from_db()
+        self.assertEqual((canon.external_id, canon.lot.external_id), ("1", "10"))
+        self.assertEqual(Sale.objects.get(shopify_order_id="#1201").product, canon)
+        self.assertFalse(Product.objects.filter(external_id__isnull=True).exists())
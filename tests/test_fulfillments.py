@@ -0,0 +1,147 @@
+"""
+Shopify fulfillment outbox: queued by FulfillOrderView, delivered by a worker.
+
+Run with:
+    SECRET_KEY=test-secret python manage.py test tests.test_fulfillments --settings=tests.test_settings
+"""
+import os
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils.timezone import now
+from rest_framework import status
+
+from sales.models import Sale
+from shipping.client import ShopifyClient
+from shipping.fulfillments import MAX_ATTEMPTS, claim_next_fulfillment, deliver, deliver_pending_fulfillments
+from shipping.models import FulfillmentRequest
+from tests.fake_shopify import FakeShopify
+from tests.test_critical_paths import OrgAuthenticatedTestMixin
+
+
+class FulfillmentOutboxTests(OrgAuthenticatedTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.shopify = FakeShopify()
+        self.shopify.__enter__()
+        self.addCleanup(self.shopify.__exit__, None, None, None)
+        env = mock.patch.dict(os.environ, {'SHOPIFY_STORE': self.shopify.url, 'SHOPIFY_ACCESS_TOKEN': 'token'})
+        env.start()
+        self.addCleanup(env.stop)
+        self.org.shopify_store = self.shopify.url
+        self.org.shopify_access_token = 'token'
+        self.org.save()
+        self.shopify_client = ShopifyClient(self.shopify.url, "token", backoff_base=0, sleep=lambda s: None)
+
+        self.sale = Sale.objects.create(
+            organization=self.org, product=self.product, quantity_sold=1, sale_price=6000,
+            sale_date=now(), shopify_order_id="1001",
+        )
+
+    def fulfill(self, tracking="TRACK1"):
+        return self.client.post(
+            "/api/shipping/fulfill/",
+            {"sale_id": self.sale.id, "shopify_order_id": "1001", "tracking_number": tracking},
+            format="json",
+        )
+
+    def test_request_is_queued_without_calling_shopify(self):
+        resp = self.fulfill()
+        self.assertEqual(resp.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(self.shopify.requests, [])
+
+        self.sale.refresh_from_db()
+        self.assertEqual(self.sale.shipping_status, Sale.ShippingStatus.SHIPPING_PLACED)
+        self.assertEqual(self.sale.tracking_number, "TRACK1")
+
+        job = self.client.get(f"/api/shipping/fulfill/{resp.data['job_id']}/").data
+        self.assertEqual(job["status"], FulfillmentRequest.Status.PENDING)
+
+        # Resubmitting returns the same job
+        again = self.fulfill()
+        self.assertEqual(again.status_code, status.HTTP_200_OK)
+        self.assertEqual(again.data["job_id"], resp.data["job_id"])
+
+    def test_worker_delivers_and_records_result(self):
+        job_id = self.fulfill().data["job_id"]
+        out = StringIO()
+        call_command("deliver_fulfillments", "--once", stdout=out)
+        self.assertIn("Attempted 1", out.getvalue())
+
+        job = FulfillmentRequest.objects.get(id=job_id)
+        self.assertEqual(job.status, FulfillmentRequest.Status.DELIVERED)
+        self.assertEqual(job.fulfillment_id, "1")
+        self.assertEqual(len(self.shopify.fulfillments), 1)
+
+    def test_transient_failure_is_retried_with_backoff(self):
+        self.fulfill()
+        self.shopify.fail_next(503, times=5)
+        with self.assertLogs("shipping.fulfillments", level="WARNING"):
+            deliver_pending_fulfillments(client=self.shopify_client)
+        job = FulfillmentRequest.objects.get()
+        self.assertEqual(job.status, FulfillmentRequest.Status.PENDING)
+        self.assertGreater(job.next_attempt_at, now())
+        # Not due yet
+        self.assertEqual(deliver_pending_fulfillments(client=self.shopify_client), 0)
+
+        FulfillmentRequest.objects.update(next_attempt_at=now() - timedelta(seconds=1))
+        deliver_pending_fulfillments(client=self.shopify_client)
+        job.refresh_from_db()
+        self.assertEqual(job.status, FulfillmentRequest.Status.DELIVERED)
+        self.assertEqual(job.attempts, 2)
+
+    def test_retry_after_lost_response_does_not_fulfill_twice(self):
+        self.fulfill()
+        job = claim_next_fulfillment()
+        deliver(job, client=self.shopify_client)
+        # Pretend the response never reached us and the job is retried
+        FulfillmentRequest.objects.filter(pk=job.pk).update(status=FulfillmentRequest.Status.PENDING)
+
+        deliver_pending_fulfillments(client=self.shopify_client)
+        job.refresh_from_db()
+        self.assertEqual(job.status, FulfillmentRequest.Status.DELIVERED)
+        self.assertEqual(len(self.shopify.fulfillments), 1)
+
+    def test_client_error_fails_permanently(self):
+        self.fulfill()
+        self.shopify.fail_next(422)
+        with self.assertLogs("shipping.fulfillments", level="ERROR"):
+            deliver_pending_fulfillments(client=self.shopify_client)
+        job = FulfillmentRequest.objects.get()
+        self.assertEqual(job.status, FulfillmentRequest.Status.FAILED)
+        self.assertLess(job.attempts, MAX_ATTEMPTS)
+
+        # Submitting again re-queues it
+        self.assertEqual(self.fulfill().data["status"], FulfillmentRequest.Status.PENDING)
+
+    def test_bulk_fulfill_sends_concurrently_and_reports_each_order(self):
+        sales = [self.sale] + [
+            Sale.objects.create(
+                organization=self.org, product=self.product, quantity_sold=1, sale_price=6000,
+                sale_date=now(), shopify_order_id=str(1001 + i),
+            )
+            for i in range(1, 12)
+        ]
+        orders = [
+            {"sale_id": sale.id, "shopify_order_id": sale.shopify_order_id, "tracking_number": f"AWB{sale.id}"}
+            for sale in sales
+        ]
+        orders.append({"sale_id": 999999, "shopify_order_id": "1", "tracking_number": "X"})
+
+        resp = self.client.post("/api/shipping/fulfill/bulk/", {"orders": orders}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["delivered"], 12)
+        self.assertEqual(resp.data["results"][-1]["error"], "Sale not found")
+        self.assertEqual(len(self.shopify.fulfillments), 12)
+        self.assertEqual(
+            Sale.objects.filter(shipping_status=Sale.ShippingStatus.SHIPPING_PLACED).count(), 12,
+        )
+        self.assertEqual(Sale.objects.get(id=sales[3].id).tracking_number, f"AWB{sales[3].id}")
+
+        # Repeating the request reports the delivered jobs without new calls
+        resp = self.client.post("/api/shipping/fulfill/bulk/", {"orders": orders[:3]}, format="json")
+        self.assertEqual(resp.data["delivered"], 3)
+        self.assertEqual(len(self.shopify.fulfillments), 12)
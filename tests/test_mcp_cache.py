@@ -0,0 +1,128 @@
+"""
+The MCP server's response cache: single-flight fetches and invalidation.
+
+Run with:
+    SECRET_KEY=test-secret python manage.py test tests.test_mcp_cache --settings=tests.test_settings
+"""
+import asyncio
+import sys
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+# The cache lives next to the MCP server, outside the project
+sys.path.append(str(Path(settings.BASE_DIR) / "mcp"))
+from response_cache import CachedBackend, TTLCache  # noqa: E402
+
+
+class GatedFetch:
+    """A fetch that counts its calls and blocks until released."""
+
+    def __init__(self, value="fresh"):
+        self.value = value
+        self.calls = 0
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        self.started.set()
+        await self.release.wait()
+        return self.value
+
+
+class TTLCacheTests(SimpleTestCase):
+    async def test_concurrent_identical_calls_share_one_fetch(self):
+        cache = TTLCache(ttl=60)
+        fetch = GatedFetch()
+        calls = asyncio.gather(*(cache.get("key", fetch) for _ in range(3)))
+        await fetch.started.wait()
+        fetch.release.set()
+
+        self.assertEqual(await calls, ["fresh"] * 3)
+        self.assertEqual(fetch.calls, 1)
+        self.assertEqual(cache.stats()["coalesced"], 2)
+        self.assertEqual(await cache.get("key", fetch), "fresh")
+        self.assertEqual(fetch.calls, 1)
+
+    async def test_invalidation_during_fetch_is_not_stored(self):
+        cache = TTLCache(ttl=60)
+        stale = GatedFetch("stale")
+        call = asyncio.ensure_future(cache.get("key", stale))
+        await stale.started.wait()
+        cache.invalidate(lambda key, value: True)
+        stale.release.set()
+        self.assertEqual(await call, "stale")
+
+        fresh = GatedFetch()
+        fresh.release.set()
+        self.assertEqual(await cache.get("key", fresh), "fresh")
+        self.assertEqual(fresh.calls, 1)
+
+    async def test_failed_fetch_is_not_cached(self):
+        cache = TTLCache(ttl=60)
+
+        async def failing():
+            raise RuntimeError("backend down")
+
+        with self.assertRaises(RuntimeError):
+            await cache.get("key", failing)
+        self.assertEqual(cache.stats()["in_flight"], 0)
+
+        fetch = GatedFetch()
+        fetch.release.set()
+        self.assertEqual(await cache.get("key", fetch), "fresh")
+        self.assertEqual(fetch.calls, 1)
+
+
+class FakeBackend:
+    """Backend returning canned lookups and counting calls per method."""
+
+    def __init__(self):
+        self.calls = Counter()
+
+    async def sales_by_email(self, email):
+        self.calls["sales_by_email", email] += 1
+        return [{"id": 1}] if email == "asha@example.com" else [{"id": 2}]
+
+    async def sale(self, order_id):
+        self.calls["sale", order_id] += 1
+        return {"id": order_id}
+
+    async def shipping_info(self, order_id):
+        self.calls["shipping_info", order_id] += 1
+        return {"sale": order_id}
+
+    async def unshipped(self, page, page_size):
+        self.calls["unshipped", page] += 1
+        return {"results": [{"id": 1}, {"id": 2}]}
+
+    async def update_shipping_status(self, order_id, shipping_status):
+        return {"id": order_id, "shipping_status": shipping_status}
+
+
+class CachedBackendTests(SimpleTestCase):
+    async def lookup_all(self, cached):
+        await cached.sale(1)
+        await cached.sale(2)
+        await cached.shipping_info(1)
+        await cached.unshipped(1, 100)
+        await cached.sales_by_email("asha@example.com")
+        await cached.sales_by_email("ravi@example.com")
+
+    async def test_status_update_drops_the_entries_it_changes(self):
+        backend = FakeBackend()
+        cached = CachedBackend(backend, TTLCache(ttl=60))
+        await self.lookup_all(cached)
+        await cached.update_shipping_status(1, "shipped")
+        await self.lookup_all(cached)
+
+        self.assertEqual(backend.calls["sale", 1], 2)
+        self.assertEqual(backend.calls["unshipped", 1], 2)
+        self.assertEqual(backend.calls["sales_by_email", "asha@example.com"], 2)
+        # Entries that cannot list order 1 are kept
+        self.assertEqual(backend.calls["sale", 2], 1)
+        self.assertEqual(backend.calls["sales_by_email", "ravi@example.com"], 1)
+        self.assertEqual(backend.calls["shipping_info", 1], 1)
@@ -0,0 +1,152 @@
+"""
+Column-mapped CSV/XLSX product imports.
+
+Run with:
+    SECRET_KEY=test-secret python manage.py test tests.test_product_import --settings=tests.test_settings
+"""
+import io
+import json
+from decimal import Decimal
+from unittest import mock
+
+import openpyxl
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError
+from django.test import TestCase
+from rest_framework import status
+
+from inventory.imports import ColumnMapping
+from inventory.models import Lot, Product
+from inventory.product_import import PRODUCT_IMPORT_FIELDS, import_products
+from tests.test_critical_paths import OrgAuthenticatedTestMixin
+
+MAPPING = {
+    "columns": {"SKU": "external_id", "Lot": "lot", "Item": "name", "Cost": "price", "Type": ["category", "sub_category"],
+                "Bought": "bought_at"},
+    "values": {"category": {"SLR": "Film Camera", "Lens": "Accessory", "*": "Accessory"}},
+    "defaults": {"delivery_status": "received"},
+}
+
+CSV = """SKU,Lot,Item,Cost,Type,Bought
+A1,L7,Canon AE-1,"4,000",SLR,2026-03-05
+A2,L7,Helios 44-2,1500,Lens,05/03/2026
+A3,L8,Mystery,lots,SLR,2026-03-06
+A4,L8,,100,SLR,2026-03-06
+A1,L7,Canon AE-1 again,4000,SLR,2026-03-05
+A5,L8,Pentax K1000,3000,Bogus,2026-03-06
+"""
+
+
+class ProductImportTests(OrgAuthenticatedTestMixin, TestCase):
+    def upload(self, content=CSV, name="lots.csv", mapping=MAPPING, **extra):
+        return self.client.post(
+            "/api/inventory/import/",
+            {"file": SimpleUploadedFile(name, content.encode()), "mapping": json.dumps(mapping), **extra},
+            format="multipart",
+        )
+
+    def test_csv_import_loads_valid_rows_and_reports_the_rest(self):
+        resp = self.upload()
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["rows"], 6)
+        self.assertEqual(resp.data["created"], 2)
+        self.assertEqual(resp.data["lots_created"], 1)
+        errors = {e["row"]: e["errors"] for e in resp.data["errors"]}
+        self.assertEqual(set(errors), {4, 5, 6, 7})
+        self.assertIn("price", errors[4])
+        self.assertIn("name", errors[5])
+        self.assertEqual(errors[6]["external_id"], "Duplicate of row 2")
+        self.assertIn("sub_category", errors[7])
+
+        canon = Product.objects.get(organization=self.org, external_id="A1")
+        self.assertEqual(canon.price, Decimal("4000"))
+        self.assertEqual(canon.category, Product.Category.FILM_CAMERA)
+        self.assertEqual(canon.sub_category, Product.SubCategory.SLR)
+        self.assertEqual(canon.delivery_status, Product.DeliveryStatus.RECEIVED)
+        self.assertEqual(canon.available_quantity, 1)
+        lot = Lot.objects.get(organization=self.org, external_id="L7")
+        self.assertEqual(canon.lot, lot)
+        self.assertEqual(lot.total_price, Decimal("5500"))
+
+    def test_values_the_model_refuses_are_row_errors(self):
+        mapping = {**MAPPING, "columns": {**MAPPING["columns"], "Qty": "stock"}}
+        content = (
+            "SKU,Lot,Item,Cost,Type,Bought,Qty\n"
+            "B1,L7,Canon AE-1,4000,SLR,2026-03-05,2\n"
+            "B2,L7,Helios 44-2,1500,Lens,2026-03-05,-1\n"
+            f"B3,L7,{'x' * 256},1500,Lens,2026-03-05,1\n"
+            f"{'S' * 65},L7,Zenit E,1500,SLR,2026-03-05,1\n"
+            f"B5,{'L' * 65},Zenit E,1500,SLR,2026-03-05,1\n"
+            "B6,L7,Zenit E,12.345,SLR,2026-03-05,1\n"
+            "B7,L7,Zenit E,123456789,SLR,2026-03-05,1\n"
+        )
+        resp = self.upload(content, mapping=mapping)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["created"], 1)
+        errors = {e["row"]: e["errors"] for e in resp.data["errors"]}
+        self.assertEqual(set(errors), {3, 4, 5, 6, 7, 8})
+        self.assertIn("stock", errors[3])
+        self.assertIn("name", errors[4])
+        self.assertIn("external_id", errors[5])
+        self.assertIn("lot", errors[6])
+        self.assertIn("decimal places", errors[7]["price"])
+        self.assertIn("before the decimal point", errors[8]["price"])
+
+    def test_database_error_is_a_bad_request(self):
+        with mock.patch("inventory.views.import_products", side_effect=DatabaseError("CHECK constraint failed")):
+            resp = self.upload()
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("error", resp.data)
+
+    def test_reimport_updates_only_changed_rows(self):
+        self.upload()
+        resp = self.upload(CSV.replace("Helios 44-2,1500", "Helios 44-2,1600"))
+        self.assertEqual((resp.data["created"], resp.data["updated"], resp.data["unchanged"]), (0, 1, 1))
+        self.assertEqual(Product.objects.filter(organization=self.org).count(), 3)  # Plus the fixture product
+        lot = Lot.objects.get(organization=self.org, external_id="L7")
+        self.assertEqual(lot.total_price, Decimal("5600"))
+
+        # A stock change moves available_quantity, and lot totals follow
+        canon = Product.objects.get(organization=self.org, external_id="A1")
+        canon.available_quantity = 0  # Sold
+        canon.save()
+        mapping = {**MAPPING, "columns": {**MAPPING["columns"], "Qty": "stock"}}
+        self.upload("SKU,Lot,Item,Cost,Type,Bought,Qty\n"
+                    "A1,L7,Canon AE-1,4000,SLR,2026-03-05,3\n"
+                    "A2,L7,Helios 44-2,900,Lens,2026-03-05,1\n", mapping=mapping)
+        canon.refresh_from_db()
+        self.assertEqual((canon.stock, canon.available_quantity), (3, 2))
+        lot.refresh_from_db()
+        self.assertEqual(lot.total_price, Decimal("12900"))
+
+    def test_dry_run_saves_nothing(self):
+        resp = self.upload(dry_run="true")
+        self.assertEqual(resp.data["created"], 2)
+        self.assertFalse(Product.objects.filter(external_id__isnull=False).exists())
+        self.assertFalse(Lot.objects.filter(external_id="L7").exists())
+
+    def test_bad_mapping_is_rejected(self):
+        resp = self.upload(mapping={"columns": {"Item": "name", "Cost": "colour"}})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        resp = self.upload(mapping={"columns": {"Item": "name", "Price": "price"}})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Price", resp.data["error"])
+
+    def test_xlsx_rows_are_parsed_on_the_process_pool(self):
+        wb = openpyxl.Workbook()
+        wb.active.append(["SKU", "Item", "Cost", "Type"])
+        for i in range(30):
+            wb.active.append([f"X{i}", f"Lens {i}", 100 + i, "Lens"])
+        wb.active.append(["X99", "Broken", "n/a", "Lens"])
+        data = io.BytesIO()
+        wb.save(data)
+        data.seek(0)
+        data.name = "supplier.xlsx"
+
+        mapping = ColumnMapping.from_dict(PRODUCT_IMPORT_FIELDS, {
+            "columns": {"SKU": "external_id", "Item": "name", "Cost": "price", "Type": "sub_category"},
+        })
+        report = import_products(self.org, data, mapping, lot=self.lot, parallel_min_rows=1)
+        self.assertEqual(report["created"], 30)
+        self.assertEqual(report["errors"], [{"row": 32, "errors": {"price": "'n/a' is not a number"}}])
+        self.assertEqual(Product.objects.filter(lot=self.lot, sub_category="Lens").count(), 30)
@@ -0,0 +1,74 @@
+"""
+In-memory Shopify line-item to product matching.
+
+Run with:
+    SECRET_KEY=test-secret python manage.py test tests.test_product_matching --settings=tests.test_settings
+"""
+from decimal import Decimal
+
+from django.test import SimpleTestCase, TestCase
+
+from accounts.models import Organization
+from inventory.models import Product
+from shipping.matching import ProductMatcher, clear_matcher_cache, get_matcher, normalize
+
+
+def product(id, name, price="100.00"):
+    return {"id": id, "name": name, "price": Decimal(price)}
+
+
+class ProductMatcherTests(SimpleTestCase):
+    def setUp(self):
+        self.matcher = ProductMatcher([
+            product(1, "Canon AE-1 Program"),
+            product(2, "Canon AE-1"),
+            product(3, "Nikon FM2"),
+            product(4, "Pentax K1000"),
+            product(5, "canon ae 1"),
+        ])
+
+    def test_normalize(self):
+        self.assertEqual(normalize("  Canon AE-1  (Black) "), "canon ae 1 black")
+        self.assertEqual(normalize("Rolleiflex Automat Café"), "rolleiflex automat cafe")
+
+    def test_exact_match_ignores_case_and_punctuation(self):
+        self.assertEqual(self.matcher.exact("CANON ae-1")["id"], 2)
+        self.assertIsNone(self.matcher.exact("Canon"))
+
+    def test_suggestions_are_ranked_with_scores(self):
+        suggestions = self.matcher.suggest("Canon AE-1 Program with 50mm")
+        ids = [p["id"] for p, _ in suggestions]
+        scores = [score for _, score in suggestions]
+        self.assertEqual(ids[0], 1)
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertNotIn(3, ids)
+
+    def test_exact_match_scores_highest(self):
+        (best, score), *_ = self.matcher.suggest("Nikon FM2")
+        self.assertEqual((best["id"], score), (3, 1.0))
+
+    def test_typo_still_matches_by_trigrams(self):
+        best, _ = self.matcher.suggest("Pentx K1000 body")[0]
+        self.assertEqual(best["id"], 4)
+
+    def test_top_k_and_unrelated_names(self):
+        self.assertEqual(len(self.matcher.suggest("Canon", k=2)), 2)
+        self.assertEqual(self.matcher.suggest("Tripod"), [])
+
+
+class GetMatcherTests(TestCase):
+    def setUp(self):
+        clear_matcher_cache()
+        self.org = Organization.objects.create(name="Org", slug="org")
+        self.product = Product.objects.create(
+            organization=self.org, name="Nikon FM2", price=100, available_quantity=1,
+        )
+
+    def test_index_is_reused_until_products_change(self):
+        matcher = get_matcher(self.org)
+        with self.assertNumQueries(1):
+            self.assertIs(get_matcher(self.org), matcher)
+
+        self.product.available_quantity = 0
+        self.product.save()
+        self.assertIsNone(get_matcher(self.org).exact("Nikon FM2"))
@@ -0,0 +1,177 @@
+"""
+Sale lookups used by the MCP server and dashboards.
+
+Run with:
+    SECRET_KEY=test-secret python manage.py test tests.test_sales_lookups --settings=tests.test_settings
+"""
+import sys
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from rest_framework import status
+
+from accounts.models import Organization
+from sales.models import Sale, ShippingInfo
+from tests.test_critical_paths import OrgAuthenticatedTestMixin
+
+# The MCP server's in-process backend lives next to it, outside the project
+sys.path.append(str(Path(settings.BASE_DIR) / "mcp"))
+import orm_backend  # noqa: E402
+
+
+class SaleLookupTestMixin(OrgAuthenticatedTestMixin):
+    def make_sale(self, email=None, org=None, **fields):
+        sale = Sale.objects.create(
+            organization=org or self.org, product=self.product, quantity_sold=1, sale_price=6000,
+            sale_date=fields.pop("sale_date", now()), shipping_status=Sale.ShippingStatus.SHIPPING_PENDING,
+            **fields,
+        )
+        if email:
+            ShippingInfo.objects.create(
+                sale=sale, customer_name="Asha Rao", customer_email=email, customer_phone="1",
+                customer_address="Somewhere", customer_pincode="560001",
+            )
+        return sale
+
+
+class SalesByEmailTests(SaleLookupTestMixin, TestCase):
+    def test_lookup_is_case_insensitive_and_org_scoped(self):
+        first = self.make_sale("Buyer@Example.com")
+        second = self.make_sale("buyer@example.com")
+        self.make_sale("someone@example.com")
+        other_org = Organization.objects.create(name="Other", slug="other")
+        self.make_sale("buyer@example.com", org=other_org)
+
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get("/api/sales/by_email/", {"email": "BUYER@example.com"})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["count"], 2)
+        self.assertEqual({o["id"] for o in resp.data["orders"]}, {first.id, second.id})
+        self.assertEqual(resp.data["orders"][0]["shipping_info"]["customer_name"], "Asha Rao")
+        self.assertEqual(resp.data["orders"][0]["product_details"]["name"], self.product.name)
+
+        sale_queries = [q for q in queries if '"sales_' in q["sql"]]
+        self.assertEqual(len(sale_queries), 1)
+
+    def test_email_is_required(self):
+        resp = self.client.get("/api/sales/by_email/")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class UnshippedSalesTests(SaleLookupTestMixin, TestCase):
+    def test_unshipped_is_org_scoped_paginated_and_oldest_first(self):
+        oldest = self.make_sale("a@example.com", sale_date=now() - timedelta(days=10))
+        newer = self.make_sale(sale_date=now() - timedelta(days=2))
+        for _ in range(3):
+            self.make_sale("b@example.com", sale_date=now() - timedelta(days=1))
+        shipped = self.make_sale()
+        shipped.shipping_status = Sale.ShippingStatus.SHIPPED
+        shipped.save()
+        other_org = Organization.objects.create(name="Other", slug="other")
+        self.make_sale(org=other_org)
+
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get("/api/sales/unshipped/", {"page_size": 2})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["count"], 5)
+        self.assertEqual(resp.data["total_unshipped_items"], 5)
+        self.assertIsNotNone(resp.data["next"])
+        self.assertEqual([s["id"] for s in resp.data["sales"]], [oldest.id, newer.id])
+        self.assertEqual(resp.data["sales"][0]["days_since_sale"], 10)
+        self.assertEqual(resp.data["sales"][0]["shipping_info"]["customer_email"], "a@example.com")
+        self.assertIsNone(resp.data["sales"][1]["shipping_info"])
+
+        # Count, total, one page of sales and their shipping info
+        sale_queries = [q for q in queries if '"sales_' in q["sql"]]
+        self.assertEqual(len(sale_queries), 4)
+
+
+class BulkShippingStatusTests(SaleLookupTestMixin, TestCase):
+    def bulk_update(self, sale_ids, shipping_status=Sale.ShippingStatus.SHIPPED):
+        return self.client.patch(
+            "/api/sales/bulk_update_shipping_status/",
+            {"sale_ids": sale_ids, "shipping_status": shipping_status}, format="json",
+        )
+
+    def test_updates_org_sales_in_one_statement(self):
+        sales = [self.make_sale() for _ in range(3)]
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.bulk_update([s.id for s in sales])
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["updated"], 3)
+        self.assertEqual(resp.data["not_found"], [])
+        self.assertEqual(len([q for q in queries if '"sales_sale"' in q["sql"]]), 1)
+        self.assertEqual(Sale.objects.filter(shipping_status=Sale.ShippingStatus.SHIPPED).count(), 3)
+
+    def test_other_org_and_missing_sales_are_not_found(self):
+        sale = self.make_sale()
+        other = self.make_sale(org=Organization.objects.create(name="Other", slug="other"))
+        resp = self.bulk_update([sale.id, other.id, 999999])
+        self.assertEqual(resp.data["updated"], 1)
+        self.assertEqual(resp.data["not_found"], [other.id, 999999])
+        other.refresh_from_db()
+        self.assertEqual(other.shipping_status, Sale.ShippingStatus.SHIPPING_PENDING)
+
+    def test_validation(self):
+        sale = self.make_sale()
+        self.assertEqual(self.bulk_update([sale.id], "SHIPPED").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.bulk_update([]).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.bulk_update(["x"]).status_code, status.HTTP_400_BAD_REQUEST)
+        sale.refresh_from_db()
+        self.assertEqual(sale.shipping_status, Sale.ShippingStatus.SHIPPING_PENDING)
+
+
+class OrmBackendTests(SaleLookupTestMixin, TestCase):
+    """The MCP server's in-process backend returns what the API does."""
+
+    def setUp(self):
+        super().setUp()
+        # TestCase keeps one connection inside a transaction
+        patcher = mock.patch.object(orm_backend, "close_old_connections")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_lookups_match_the_api(self):
+        sale = self.make_sale("buyer@example.com", sale_date=now() - timedelta(days=3))
+        self.make_sale("buyer@example.com")
+        self.make_sale()
+
+        api = self.client.get("/api/sales/by_email/", {"email": "buyer@example.com"}).data
+        self.assertEqual(orm_backend.sales_by_email("test-org", "buyer@example.com"), api["orders"])
+
+        self.assertEqual(orm_backend.sale("test-org", sale.id), self.client.get(f"/api/sales/{sale.id}/").data)
+        self.assertEqual(
+            orm_backend.shipping_info("test-org", sale.id),
+            self.client.get(f"/api/sales/shipping-info/{sale.id}/get_shipping_info/").data,
+        )
+
+        api = self.client.get("/api/sales/unshipped/", {"page_size": 2}).data
+        page = orm_backend.unshipped("test-org", 1, 2)
+        self.assertEqual(page["sales"], api["sales"])
+        self.assertEqual(page["count"], api["count"])
+        self.assertEqual(page["total_unshipped_items"], api["total_unshipped_items"])
+        self.assertTrue(page["next"])
+
+    def test_lookups_are_org_scoped(self):
+        other_org = Organization.objects.create(name="Other", slug="other")
+        sale = self.make_sale("buyer@example.com", org=other_org)
+        self.assertEqual(orm_backend.sales_by_email("test-org", "buyer@example.com"), [])
+        self.assertIsNone(orm_backend.sale("test-org", sale.id))
+        self.assertIsNone(orm_backend.update_shipping_status("test-org", sale.id, Sale.ShippingStatus.SHIPPED))
+
+    def test_update_shipping_status(self):
+        sale = self.make_sale()
+        data = orm_backend.update_shipping_status("test-org", sale.id, Sale.ShippingStatus.SHIPPED)
+        self.assertEqual(data["shipping_status"], Sale.ShippingStatus.SHIPPED)
+        sale.refresh_from_db()
+        self.assertEqual(sale.shipping_status, Sale.ShippingStatus.SHIPPED)
+
+        data = orm_backend.bulk_update_shipping_status("test-org", [sale.id, 999999], Sale.ShippingStatus.SHIPPING_PLACED)
+        self.assertEqual(data["updated"], 1)
+        self.assertEqual(data["not_found"], [999999])
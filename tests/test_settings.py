@@ -14,7 +14,22 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": ":memory:",
-    }
+    },
+    # Second connection to the same database standing in for the read
+    # replica; only tests/test_db_router.py routes reads to it
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": ":memory:",
+        "TEST": {"MIRROR": "default"},
+    },
+}
+# Read from the primary unless a test opts in, as a TestCase's uncommitted
+# data is not visible on the replica connection
+REPLICA_DATABASE_ALIAS = None
+
+# One test process, so a local cache is shared enough
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
 }
 
 # Speed up password hashing in tests
@@ -0,0 +1,194 @@
+"""
+Shopify client: retries, rate limiting and metrics against a local fake Shopify.
+
+Run with:
+    SECRET_KEY=test-secret python manage.py test tests.test_shopify_client --settings=tests.test_settings
+"""
+import os
+from io import StringIO
+from unittest import mock
+
+import requests
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from accounts.models import Organization, UserOrganization
+from shipping.client import ShopifyClient, ShopifyRateLimiter, get_org_client
+from shipping.models import ShopifyOrder
+from shipping.services import fulfill_shopify_order, iter_shopify_order_pages, sync_shopify_orders
+from tests.fake_shopify import FakeShopify
+from tests.test_critical_paths import OrgAuthenticatedTestMixin
+
+
+class ShopifyClientTests(SimpleTestCase):
+    def setUp(self):
+        self.shopify = FakeShopify(page_size=2)
+        self.shopify.__enter__()
+        self.addCleanup(self.shopify.__exit__, None, None, None)
+        for i in range(1, 4):
+            self.shopify.add_order(1000 + i, f"2026-01-0{i}T10:00:00+00:00")
+        self.sleeps = []
+        self.client = ShopifyClient(self.shopify.url, "token", sleep=self.sleeps.append)
+
+    def test_retry_after_is_honoured_on_429(self):
+        self.shopify.fail_next(429, {"Retry-After": "2.0"})
+        pages = list(iter_shopify_order_pages(client=self.client))
+        self.assertEqual([len(page) for page in pages], [2, 1])
+        self.assertEqual(self.sleeps, [2.0])
+        self.assertEqual(self.client.metrics.snapshot()["retries"], 1)
+
+    def test_server_errors_back_off_with_jitter(self):
+        self.shopify.fail_next(503, times=2)
+        self.client.get("orders.json")
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertTrue(0.25 <= self.sleeps[0] <= 0.5)
+        self.assertTrue(0.5 <= self.sleeps[1] <= 1.0)
+
+    def test_gives_up_after_max_retries(self):
+        self.shopify.fail_next(500, times=10)
+        with self.assertRaises(requests.HTTPError):
+            self.client.get("orders.json")
+        self.assertEqual(len(self.sleeps), self.client.max_retries)
+        self.assertEqual(self.client.metrics.snapshot()["errors"], 1)
+
+    def test_post_is_not_repeated_after_server_error(self):
+        self.shopify.fail_next(500)
+        with self.assertRaises(requests.HTTPError):
+            self.client.post("fulfillments.json", json={"fulfillment": {}})
+        self.assertEqual(self.shopify.fulfillments, [])
+        self.assertEqual(self.sleeps, [])
+
+    def test_fulfillment_uses_client(self):
+        fulfillment = fulfill_shopify_order(1001, "TRACK1", client=self.client)
+        self.assertEqual(fulfillment["tracking_info"]["number"], "TRACK1")
+        self.assertEqual(fulfillment["line_items_by_fulfillment_order"][0]["fulfillment_order_id"], 10010)
+        self.assertEqual(self.client.metrics.snapshot()["calls"], 2)
+
+    def test_call_limit_header_drives_limiter(self):
+        clock = [0.0]
+
+        def sleep(seconds):
+            self.sleeps.append(seconds)
+            clock[0] += seconds
+
+        self.client.limiter = ShopifyRateLimiter(clock=lambda: clock[0], sleep=sleep)
+        self.shopify.call_limit = "39/40"
+        self.client.get("orders.json")
+        self.assertEqual(self.sleeps, [])
+        self.client.get("orders.json")
+        # 39 of 40 used with 2 calls of headroom: wait for two calls to leak out
+        self.assertEqual(self.sleeps, [1.0])
+        self.assertEqual(self.client.metrics.snapshot()["throttled_seconds"], 1.0)
+
+
+class ShopifyRateLimiterTests(SimpleTestCase):
+    def test_bucket_drains_over_time(self):
+        clock = [0.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            clock[0] += seconds
+
+        limiter = ShopifyRateLimiter(capacity=4, leak_rate=2.0, headroom=0, clock=lambda: clock[0], sleep=sleep)
+        for _ in range(4):
+            self.assertEqual(limiter.acquire(), 0.0)
+        self.assertEqual(limiter.acquire(), 0.5)
+        clock[0] += 10
+        self.assertEqual(limiter.acquire(), 0.0)
+
+
+class OrgClientTests(TestCase):
+    def setUp(self):
+        self.store_a = FakeShopify()
+        self.store_b = FakeShopify()
+        for store in (self.store_a, self.store_b):
+            store.__enter__()
+            self.addCleanup(store.__exit__, None, None, None)
+        self.store_a.add_order(1, "2026-01-01T10:00:00+00:00")
+        self.store_b.add_order(2, "2026-01-01T10:00:00+00:00")
+        self.org_a = Organization.objects.create(
+            name="A", slug="a", shopify_store=self.store_a.url, shopify_access_token="token-a",
+        )
+        self.org_b = Organization.objects.create(
+            name="B", slug="b", shopify_store=self.store_b.url, shopify_access_token="token-b",
+        )
+
+    def test_each_org_syncs_from_its_own_store(self):
+        sync_shopify_orders(self.org_a)
+        sync_shopify_orders(self.org_b)
+        self.assertEqual(len(self.store_a.order_requests()), 1)
+        self.assertEqual(len(self.store_b.order_requests()), 1)
+        self.assertEqual(
+            list(ShopifyOrder.objects.order_by("organization_id").values_list("shopify_order_id", flat=True)),
+            ["1", "2"],
+        )
+        self.assertIsNot(get_org_client(self.org_a), get_org_client(self.org_b))
+        self.assertIs(get_org_client(self.org_a), get_org_client(self.org_a))
+
+    def test_credential_change_replaces_client(self):
+        client = get_org_client(self.org_a)
+        self.org_a.timezone = "Asia/Kolkata"
+        self.org_a.save()
+        self.assertIs(get_org_client(self.org_a), client)
+
+        self.org_a.shopify_access_token = "rotated"
+        self.org_a.save()
+        new_client = get_org_client(self.org_a)
+        self.assertIsNot(new_client, client)
+        self.assertEqual(new_client.session.headers["X-Shopify-Access-Token"], "rotated")
+
+    def test_org_without_credentials_never_gets_the_environment_store(self):
+        org = Organization.objects.create(name="C", slug="c")
+        env = {"SHOPIFY_STORE": self.store_b.url, "SHOPIFY_ACCESS_TOKEN": "token-b", "SHOPIFY_STORE_ORG": ""}
+        with mock.patch.dict(os.environ, env):
+            with self.assertRaises(ValueError):
+                get_org_client(org)
+            self.assertIs(get_org_client(None), get_org_client(self.org_b))
+
+    def test_store_org_opts_into_the_environment_store(self):
+        org = Organization.objects.create(name="C", slug="c")
+        env = {"SHOPIFY_STORE": self.store_b.url, "SHOPIFY_ACCESS_TOKEN": "token-b", "SHOPIFY_STORE_ORG": "c"}
+        with mock.patch.dict(os.environ, env):
+            self.assertIs(get_org_client(org), get_org_client(self.org_b))
+        with mock.patch.dict(os.environ, {**env, "SHOPIFY_STORE": "", "SHOPIFY_ACCESS_TOKEN": ""}):
+            with self.assertRaises(ValueError):
+                get_org_client(org)
+
+    def test_sync_command_skips_orgs_without_credentials(self):
+        Organization.objects.create(name="C", slug="c")
+        out = StringIO()
+        env = {"SHOPIFY_STORE": self.store_b.url, "SHOPIFY_ACCESS_TOKEN": "token-b", "SHOPIFY_STORE_ORG": ""}
+        with mock.patch.dict(os.environ, env):
+            call_command("sync_shopify_orders", stdout=out)
+        self.assertIn("c: skipped, no Shopify credentials", out.getvalue())
+        self.assertIn("a: fetched 1 order(s)", out.getvalue())
+        self.assertEqual(ShopifyOrder.objects.filter(organization__slug="c").count(), 0)
+
+
+@mock.patch.dict(os.environ, {"SHOPIFY_STORE": "env-store.myshopify.com", "SHOPIFY_CLIENT_ID": "client"})
+class ShopifyOAuthInitTests(OrgAuthenticatedTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.org.shopify_store = "org-store.myshopify.com"
+        self.org.save()
+
+    def test_owner_installs_for_their_org(self):
+        resp = self.client.get("/api/shipping/auth/")
+        self.assertTrue(resp["Location"].startswith("https://org-store.myshopify.com/"))
+
+    def test_anonymous_request_cannot_pick_an_org(self):
+        self.client.credentials()
+        resp = self.client.get("/api/shipping/auth/", {"org": self.org.slug})
+        self.assertTrue(resp["Location"].startswith("https://env-store.myshopify.com/"))
+
+    def test_org_without_store_does_not_get_the_environment_store(self):
+        self.org.shopify_store = ""
+        self.org.save()
+        resp = self.client.get("/api/shipping/auth/")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_non_owner_is_refused(self):
+        UserOrganization.objects.filter(user=self.user).update(role=UserOrganization.Role.VIEWER)
+        resp = self.client.get("/api/shipping/auth/")
+        self.assertEqual(resp.status_code, 403)
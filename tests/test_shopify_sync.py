@@ -0,0 +1,249 @@
+"""
+Incremental Shopify order sync, exercised against a local fake Shopify.
+
+Run with:
+    SECRET_KEY=test-secret python manage.py test tests.test_shopify_sync --settings=tests.test_settings
+"""
+import datetime
+import os
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+import requests
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from rest_framework import status
+
+from analytics.models import MonthlySnapshot
+from inventory.models import Lot
+from sales.models import Sale, ShippingInfo
+from shipping.client import ShopifyClient
+from shipping.matching import clear_matcher_cache
+from shipping.models import ShopifyOrder, ShopifySyncState
+from shipping.services import sync_shopify_orders
+from tests.fake_shopify import FakeShopify
+from tests.test_critical_paths import OrgAuthenticatedTestMixin
+
+
+class ShopifySyncTests(OrgAuthenticatedTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        clear_matcher_cache()
+        self.shopify = FakeShopify(page_size=2)
+        self.shopify.__enter__()
+        self.addCleanup(self.shopify.__exit__, None, None, None)
+        env = mock.patch.dict(os.environ, {'SHOPIFY_STORE': self.shopify.url, 'SHOPIFY_ACCESS_TOKEN': 'token'})
+        env.start()
+        self.addCleanup(env.stop)
+        self.org.shopify_store = self.shopify.url
+        self.org.shopify_access_token = 'token'
+        self.org.save()
+
+        for i in range(1, 6):
+            self.shopify.add_order(1000 + i, f"2026-01-0{i}T10:00:00+00:00")
+
+    def sync(self, full=False):
+        resp = self.client.get("/api/shipping/sync/" + ("?full=1" if full else ""))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return resp
+
+    def test_second_sync_only_fetches_changes(self):
+        resp = self.sync()
+        self.assertEqual(resp.data["fetched_count"], 5)
+        self.assertEqual(resp.data["pending_count"], 5)
+        self.assertEqual(len(self.shopify.order_requests()), 3)
+
+        self.shopify.requests.clear()
+        self.shopify.add_order(1006, "2026-01-07T10:00:00+00:00")
+        resp = self.sync()
+        # Only the cursor overlap (the last order) and the new one come back
+        self.assertEqual(resp.data["fetched_count"], 2)
+        self.assertEqual(len(self.shopify.order_requests()), 1)
+        self.assertIn("updated_at_min", self.shopify.order_requests()[0])
+        self.assertEqual(resp.data["pending_count"], 6)
+
+        state = ShopifySyncState.objects.get(organization=self.org)
+        self.assertEqual(state.updated_at_min.isoformat(), "2026-01-07T10:00:00+00:00")
+
+    def test_pending_orders_survive_incremental_syncs(self):
+        self.sync()
+        Sale.objects.create(
+            organization=self.org, product=self.product, quantity_sold=1,
+            sale_price="5000.00", sale_date=now(), shopify_order_id="1001",
+        )
+        resp = self.sync()
+        pending_ids = {o["shopify_order_id"] for o in resp.data["pending_orders"]}
+        self.assertEqual(pending_ids, {"1002", "1003", "1004", "1005"})
+
+    def test_updated_order_is_refreshed(self):
+        self.sync()
+        self.shopify.add_order(1002, "2026-01-08T10:00:00+00:00", name="#1002-edited")
+        self.sync()
+        self.assertEqual(ShopifyOrder.objects.get(shopify_order_id="1002").name, "#1002-edited")
+        self.assertEqual(ShopifyOrder.objects.filter(organization=self.org).count(), 5)
+
+    def test_full_resync_ignores_cursor(self):
+        self.sync()
+        self.shopify.requests.clear()
+        resp = self.sync(full=True)
+        self.assertEqual(resp.data["fetched_count"], 5)
+        self.assertNotIn("updated_at_min", self.shopify.order_requests()[0])
+        self.assertIsNotNone(ShopifySyncState.objects.get(organization=self.org).last_full_sync_at)
+
+    def test_sync_command(self):
+        out = StringIO()
+        call_command("sync_shopify_orders", "--org", self.org.slug, stdout=out)
+        self.assertIn("fetched 5", out.getvalue())
+        self.assertEqual(self.client.get("/api/shipping/orders/").data["count"], 5)
+
+    def test_orders_are_listed_from_the_local_copy(self):
+        self.shopify.add_order(1006, "2026-02-01T10:00:00+00:00", financial_status="pending")
+        self.shopify.add_order(1007, "2026-02-02T10:00:00+00:00", payment_gateway="razorpay")
+        sync_shopify_orders(self.org)
+        self.shopify.requests.clear()
+
+        resp = self.client.get("/api/shipping/orders/?page_size=3")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["count"], 7)
+        self.assertEqual([o["id"] for o in resp.data["results"]], [1007, 1006, 1005])
+        self.assertIsNotNone(resp.data["next"])
+        self.assertIsNotNone(resp.data["last_synced_at"])
+        self.assertEqual(self.shopify.order_requests(), [])
+
+        def ids(query):
+            return [o["id"] for o in self.client.get("/api/shipping/orders/?" + query).data["results"]]
+
+        self.assertEqual(ids("financial_status=pending"), [1006])
+        self.assertEqual(ids("is_cod=false"), [1007])
+        self.assertEqual(ids("start_date=2026-01-04&end_date=2026-02-01"), [1006, 1005, 1004])
+
+    def test_orders_refresh_syncs_first(self):
+        resp = self.client.get("/api/shipping/orders/?refresh=1")
+        self.assertEqual(resp.data["count"], 5)
+        self.assertEqual(len(self.shopify.order_requests()), 3)
+
+    def test_interrupted_sync_keeps_stored_pages(self):
+        client = ShopifyClient(self.shopify.url, "token", max_retries=0)
+        # First page succeeds, the second fails
+        self.shopify.failures = []
+        original = self.shopify._maybe_fail
+
+        def fail_after_first_page(handler):
+            if len(self.shopify.order_requests()) > 1:
+                self.shopify.fail_next(500)
+            return original(handler)
+
+        self.shopify._maybe_fail = fail_after_first_page
+        with self.assertRaises(requests.HTTPError):
+            sync_shopify_orders(self.org, client=client)
+
+        self.assertEqual(ShopifyOrder.objects.filter(organization=self.org).count(), 2)
+        state = ShopifySyncState.objects.get(organization=self.org)
+        self.assertEqual(state.updated_at_min.isoformat(), "2026-01-02T10:00:00+00:00")
+
+    def test_product_matching_queries_do_not_grow_with_orders(self):
+        self.product.available_quantity = 1
+        self.product.save()
+        for i in range(6, 10):
+            self.shopify.add_order(1000 + i, f"2026-01-0{i}T10:00:00+00:00")
+        self.sync()
+
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.sync()
+        product_queries = [q for q in queries if 'FROM "inventory_product"' in q["sql"]]
+        # The matching index from the first sync is reused; only its version is checked
+        self.assertEqual(len(product_queries), 1)
+        item = resp.data["pending_orders"][0]["items"][0]
+        self.assertEqual(item["suggested_product"]["id"], self.product.id)
+        self.assertEqual(item["suggestions"][0]["id"], self.product.id)
+        self.assertEqual(item["suggestions"][0]["score"], 1.0)
+
+
+class ShopifyConfirmTests(OrgAuthenticatedTestMixin, TestCase):
+    def confirm(self, orders):
+        return self.client.post("/api/shipping/sync/", {"orders": orders}, format="json")
+
+    def order(self, order_id, items, **extra):
+        return {
+            "shopify_order_id": str(order_id),
+            "order_name": f"#{order_id}",
+            "customer": "buyer@example.com",
+            "customer_name": "Buyer",
+            "sale_date": "2026-04-01T12:00:00",
+            "items": items,
+            **extra,
+        }
+
+    def test_confirm_creates_sales_in_constant_queries(self):
+        self.lot.funded_by = Lot.FundingSource.USER
+        self.lot.funded_by_user = self.user
+        self.lot.save()
+        self.product.available_quantity = 500
+        self.product.save()
+        orders = [
+            self.order(2000 + i, [{"product_id": self.product.id, "sale_price": 6000, "quantity": 1},
+                                  {"product_id": None, "sale_price": 100, "quantity": 1}])
+            for i in range(50)
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.confirm(orders)
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(resp.data["created_sales"], 100)
+        self.assertLess(len(queries), 20)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.available_quantity, 450)
+        sale = Sale.objects.get(shopify_order_id="2000")
+        self.assertEqual(sale.funded_by_user, self.user)
+        self.assertEqual(sale.user_payout, Decimal("5000.00"))
+        self.assertEqual(sale.org_revenue, Decimal("1000.00"))
+        self.assertTrue(Sale.objects.filter(shopify_order_id="2000-2", product__isnull=True).exists())
+        self.assertEqual(ShippingInfo.objects.filter(sale__organization=self.org).count(), 100)
+
+    def test_confirm_skips_existing_orders_and_reports_bad_items(self):
+        self.confirm([self.order(3000, [{"product_id": self.product.id, "sale_price": 6000, "quantity": 2}])])
+        resp = self.confirm([
+            self.order(3000, [{"product_id": self.product.id, "sale_price": 6000}]),
+            self.order(3001, [{"product_id": 999999, "sale_price": 6000}]),
+            self.order(3002, [{"product_id": self.product.id, "sale_price": 6000, "quantity": 9}]),
+        ])
+        self.assertEqual(resp.data["created_sales"], 1)
+        self.assertEqual(resp.data["skipped"], 1)
+        self.assertEqual(len(resp.data["errors"]), 1)
+        self.product.refresh_from_db()
+        # Stock never goes below zero
+        self.assertEqual(self.product.available_quantity, 0)
+
+    def test_confirm_reports_invalid_items_and_keeps_the_rest(self):
+        self.product.available_quantity = 10
+        self.product.save()
+        resp = self.confirm([
+            self.order(5000, [{"product_id": str(self.product.id), "sale_price": "6000", "quantity": "2"}]),
+            self.order(5001, [{"product_id": self.product.id, "sale_price": 6000, "quantity": "two"}]),
+            self.order(5002, [{"product_id": self.product.id, "sale_price": "n/a"}]),
+            self.order(5003, [{"product_id": self.product.id, "sale_price": 6000, "quantity": 0}]),
+            self.order(5004, [{"product_id": "abc", "sale_price": 6000}]),
+        ])
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(resp.data["created_sales"], 1)
+        self.assertEqual(len(resp.data["errors"]), 4)
+        self.assertIn("quantity", resp.data["errors"][0])
+        self.assertIn("sale_price", resp.data["errors"][1])
+        self.assertIn("product_id", resp.data["errors"][3])
+        sale = Sale.objects.get(shopify_order_id="5000")
+        self.assertEqual((sale.product, sale.quantity_sold), (self.product, 2))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.available_quantity, 8)
+
+    def test_confirm_marks_closed_month_stale(self):
+        snapshot = MonthlySnapshot.objects.create(
+            organization=self.org, month=datetime.date(2026, 4, 1), is_stale=False, closed_at=now(),
+        )
+        self.confirm([self.order(4000, [{"product_id": self.product.id, "sale_price": 6000}])])
+        snapshot.refresh_from_db()
+        self.assertTrue(snapshot.is_stale)
@@ -0,0 +1,116 @@
+"""
+Shopify order webhooks: HMAC-verified receiver and inbox processing.
+
+Run with:
+    SECRET_KEY=test-secret python manage.py test tests.test_shopify_webhooks --settings=tests.test_settings
+"""
+import base64
+import hashlib
+import hmac
+import json
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils.timezone import now
+from rest_framework import status
+
+from sales.models import Sale
+from shipping.matching import clear_matcher_cache
+from shipping.models import ShopifyOrder, ShopifyWebhookEvent
+from shipping.webhooks import MAX_ATTEMPTS, process_pending_events, retry_delay
+from tests.test_critical_paths import OrgAuthenticatedTestMixin
+
+SECRET = "whsec-test"
+
+
+def order_payload(order_id, updated_at="2026-03-01T10:00:00+00:00", items=(("Canon AE-1", "6000.00"),)):
+    return {
+        "id": order_id,
+        "name": f"#{order_id}",
+        "email": "buyer@example.com",
+        "created_at": "2026-03-01T09:00:00+00:00",
+        "updated_at": updated_at,
+        "total_price": "6000.00",
+        "financial_status": "paid",
+        "shipping_address": {"first_name": "Asha", "last_name": "Rao", "zip": "560001", "city": "Bengaluru"},
+        "line_items": [{"name": name, "quantity": 1, "price": price} for name, price in items],
+    }
+
+
+class ShopifyWebhookTests(OrgAuthenticatedTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        clear_matcher_cache()
+        self.org.shopify_webhook_secret = SECRET
+        self.org.save()
+
+    def deliver(self, payload, topic="orders/create", webhook_id="", secret=SECRET):
+        body = json.dumps(payload).encode()
+        signature = base64.b64encode(hmac.new(secret.encode(), body, hashlib.sha256).digest()).decode()
+        return self.client.post(
+            f"/api/shipping/webhooks/{self.org.slug}/orders/", body, content_type="application/json",
+            HTTP_X_SHOPIFY_HMAC_SHA256=signature, HTTP_X_SHOPIFY_TOPIC=topic,
+            HTTP_X_SHOPIFY_WEBHOOK_ID=webhook_id,
+        )
+
+    def test_bad_signature_is_rejected(self):
+        resp = self.deliver(order_payload(1), secret="wrong")
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertFalse(ShopifyWebhookEvent.objects.exists())
+
+    def test_delivery_is_stored_once_and_not_processed_inline(self):
+        self.assertEqual(self.deliver(order_payload(1), webhook_id="w1").data["status"], "received")
+        self.assertEqual(self.deliver(order_payload(1), webhook_id="w1").data["status"], "duplicate")
+        self.assertEqual(self.deliver(order_payload(1), topic="orders/paid").data["status"], "ignored")
+        self.assertEqual(ShopifyWebhookEvent.objects.count(), 1)
+        self.assertFalse(Sale.objects.exists())
+
+    def test_processing_creates_matched_and_unmatched_sales(self):
+        self.deliver(order_payload(1, items=(("canon ae-1", "6000.00"), ("Mystery lens", "900.00"))))
+        self.assertEqual(process_pending_events(), 1)
+
+        matched = Sale.objects.get(shopify_order_id="1")
+        self.assertEqual(matched.product, self.product)
+        self.assertEqual(matched.sale_price, Decimal("6000.00"))
+        self.assertEqual(matched.shipping_status, Sale.ShippingStatus.SHIPPING_PENDING)
+        self.assertIsNone(Sale.objects.get(shopify_order_id="1-2").product)
+        self.assertTrue(ShopifyOrder.objects.filter(organization=self.org, shopify_order_id="1").exists())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.available_quantity, 4)
+        self.assertEqual(
+            ShopifyWebhookEvent.objects.get().status, ShopifyWebhookEvent.Status.PROCESSED,
+        )
+
+    def test_newest_event_per_order_wins(self):
+        self.deliver(order_payload(1, updated_at="2026-03-01T12:00:00+00:00"), topic="orders/updated")
+        self.deliver(order_payload(1, updated_at="2026-03-01T10:00:00+00:00"))
+        out = StringIO()
+        call_command("process_shopify_webhooks", "--once", stdout=out)
+        self.assertIn("Processed 2", out.getvalue())
+
+        self.assertEqual(Sale.objects.filter(shopify_order_id="1").count(), 1)
+        stored = ShopifyOrder.objects.get(organization=self.org, shopify_order_id="1")
+        self.assertEqual(stored.shopify_updated_at.hour, 12)
+        statuses = sorted(ShopifyWebhookEvent.objects.values_list("status", flat=True))
+        self.assertEqual(statuses, ["processed", "superseded"])
+
+    def test_failing_event_is_retried_then_parked(self):
+        payload = order_payload(1)
+        del payload["name"]
+        self.deliver(payload)
+        with self.assertLogs("shipping.webhooks", level="ERROR"):
+            for attempt in range(1, MAX_ATTEMPTS + 1):
+                self.assertEqual(process_pending_events(), 1)
+                event = ShopifyWebhookEvent.objects.get()
+                if attempt < MAX_ATTEMPTS:
+                    # Backs off instead of being picked up again straight away
+                    self.assertGreater(event.next_attempt_at, now() + retry_delay(attempt) - timedelta(seconds=5))
+                    self.assertEqual(process_pending_events(), 0)
+                    ShopifyWebhookEvent.objects.update(next_attempt_at=now())
+        event = ShopifyWebhookEvent.objects.get()
+        self.assertEqual(event.status, ShopifyWebhookEvent.Status.FAILED)
+        self.assertEqual(event.attempts, MAX_ATTEMPTS)
+        self.assertEqual(process_pending_events(), 0)